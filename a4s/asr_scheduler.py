@@ -0,0 +1,238 @@
+# a4s/asr_scheduler.py
+# 跨会话动态批处理：把各会话同时就绪的语音段合并为一个 padding 批次送入 SenseVoiceSmall.inference
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from loguru import logger
+
+
+class LengthBucketer:
+    """按长度分桶组批，限制批内 padding 浪费
+
+    一个批次按最长的语音段补齐，其余段的补齐部分全是无效计算。plan() 先按长度排序，
+    再把长度相邻的段依次放入当前批，遇到以下情况另起一批：
+    - 批已满（max_batch_size）
+    - 新段与批内首段落在不同的长度桶（bucket_edges 为各桶上界，单位与长度一致）
+    - 放入后 padding 浪费 1 - 实际长度和 / (最长 × 段数) 超过 max_padding_waste
+    run() 按计划分批执行并把结果恢复为输入顺序；stats() 按桶给出 padding 效率，用于调整桶边界。
+    """
+
+    def __init__(self, bucket_edges=(), max_padding_waste=0.3, max_batch_size=8):
+        self.bucket_edges = sorted(bucket_edges)
+        self.max_padding_waste = max_padding_waste
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self.useful = Counter()    # 桶 → 实际长度累计
+        self.padded = Counter()    # 桶 → 补齐后长度累计
+        self.batches = Counter()   # 桶 → 批次数
+        self.segments = Counter()  # 桶 → 段数
+
+    def bucket(self, length):
+        for i, edge in enumerate(self.bucket_edges):
+            if length <= edge:
+                return i
+        return len(self.bucket_edges)
+
+    def bucket_label(self, index):
+        lower = self.bucket_edges[index - 1] if index > 0 else 0
+        upper = self.bucket_edges[index] if index < len(self.bucket_edges) else "inf"
+        return f"({lower}, {upper}]"
+
+    def plan(self, lengths):
+        """返回批次列表，每个批次是输入下标的列表"""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batches, current, total = [], [], 0
+        for i in order:
+            if current:
+                longest = lengths[i]  # 已排序，新段就是最长的
+                waste = 1 - (total + lengths[i]) / (longest * (len(current) + 1)) if longest > 0 else 0.0
+                if (len(current) >= self.max_batch_size
+                        or self.bucket(lengths[i]) != self.bucket(lengths[current[0]])
+                        or waste > self.max_padding_waste):
+                    batches.append(current)
+                    current, total = [], 0
+            current.append(i)
+            total += lengths[i]
+        if current:
+            batches.append(current)
+        return batches
+
+    def record(self, lengths):
+        """记录一个已执行批次的长度，用于 padding 效率统计"""
+        if not lengths:
+            return
+        bucket = self.bucket(max(lengths))
+        with self._lock:
+            self.useful[bucket] += sum(lengths)
+            self.padded[bucket] += max(lengths) * len(lengths)
+            self.batches[bucket] += 1
+            self.segments[bucket] += len(lengths)
+
+    def run(self, items, batch_fn, length_fn=len):
+        """按 plan() 分批调用 batch_fn(子列表)，返回与 items 顺序一致的结果列表"""
+        lengths = [length_fn(item) for item in items]
+        results = [None] * len(items)
+        for batch in self.plan(lengths):
+            outputs = batch_fn([items[i] for i in batch])
+            self.record([lengths[i] for i in batch])
+            for i, output in zip(batch, outputs):
+                results[i] = output
+        return results
+
+    def stats(self):
+        with self._lock:
+            useful, padded = sum(self.useful.values()), sum(self.padded.values())
+            return {
+                "padding_efficiency": round(useful / padded, 4) if padded else 1.0,
+                "buckets": {
+                    self.bucket_label(b): {
+                        "batches": self.batches[b],
+                        "segments": self.segments[b],
+                        "avg_batch_size": round(self.segments[b] / self.batches[b], 2),
+                        "padding_efficiency": round(self.useful[b] / self.padded[b], 4) if self.padded[b] else 1.0,
+                    }
+                    for b in sorted(self.batches)
+                },
+            }
+
+
+class _AsrRequest:
+    __slots__ = ("audio", "group", "future", "enqueue_time")
+
+    def __init__(self, audio, group):
+        self.audio = audio
+        self.group = group
+        self.future = Future()
+        self.enqueue_time = time.perf_counter()
+
+
+class AsrBatchScheduler:
+    """ASR 动态批处理调度器
+
+    所有会话的 ASR 请求进入同一个队列，由单个工作线程收集成批：
+    - 批次达到 max_batch_size，或第一个请求已等待 max_wait_ms，立即执行
+    - 已收集的请求数达到当前活跃流数量时也立即执行（每个流同一时刻最多一个待识别段，
+      继续等待不会再有新请求），因此只有一路流时不会引入额外延迟
+    - language / use_itn 是整批共享的推理参数，不同取值的请求分组后分别执行
+
+    batch_fn(audios, lang, use_itn) 需返回与 audios 等长的结果列表。
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=30, active_streams=None, log_every=100):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.active_streams = active_streams
+        self.log_every = log_every
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+
+        self._lock = threading.Lock()
+        self.batch_sizes = Counter()   # 批大小 -> 次数
+        self.total_segments = 0
+        self.total_batches = 0
+        self.total_wait = 0.0          # 请求在队列中的累计等待时间（秒）
+        self.total_infer = 0.0         # 推理累计耗时（秒）
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="asr-batch", daemon=True)
+            self._thread.start()
+            logger.info(f"[asr-batch] 调度器启动: max_batch_size={self.max_batch_size}, max_wait={self.max_wait * 1000:.0f}ms")
+        return self
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+
+    def submit_nowait(self, audio, lang, use_itn=False):
+        """提交一个语音段，返回 concurrent.futures.Future"""
+        request = _AsrRequest(audio, (lang.strip(), use_itn))
+        self._queue.put(request)
+        return request.future
+
+    async def submit(self, audio, lang, use_itn=False):
+        """提交一个语音段并等待识别结果（格式与 asr() 相同）"""
+        return await asyncio.wrap_future(self.submit_nowait(audio, lang, use_itn))
+
+    def _flush_target(self):
+        if self.active_streams is None:
+            return self.max_batch_size
+        try:
+            return max(1, min(self.max_batch_size, int(self.active_streams())))
+        except Exception:
+            return self.max_batch_size
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = first.enqueue_time + self.max_wait
+        target = self._flush_target()
+        while len(batch) < target:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._running = False
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.group, []).append(request)
+            for (lang, use_itn), requests in groups.items():
+                self._execute(requests, lang, use_itn)
+
+    def _execute(self, requests, lang, use_itn):
+        start = time.perf_counter()
+        try:
+            results = self.batch_fn([r.audio for r in requests], lang, use_itn)
+        except Exception as e:
+            logger.error(f"[asr-batch] 批量识别失败 (batch={len(requests)}): {e}")
+            for r in requests:
+                r.future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+        for r, result in zip(requests, results):
+            r.future.set_result(result)
+
+        with self._lock:
+            self.batch_sizes[len(requests)] += 1
+            self.total_batches += 1
+            self.total_segments += len(requests)
+            self.total_wait += sum(start - r.enqueue_time for r in requests)
+            self.total_infer += elapsed
+        logger.debug(f"[asr-batch] batch={len(requests)}, lang={lang}, elapsed: {elapsed * 1000:.2f} ms")
+        if self.total_batches % self.log_every == 0:
+            logger.info(f"[asr-batch] 统计: {self.stats()}")
+
+    def stats(self):
+        """批处理统计：批大小分布、平均批大小、平均排队和推理耗时"""
+        with self._lock:
+            batches = self.total_batches or 1
+            segments = self.total_segments or 1
+            return {
+                "batches": self.total_batches,
+                "segments": self.total_segments,
+                "batch_size_distribution": dict(sorted(self.batch_sizes.items())),
+                "avg_batch_size": self.total_segments / batches,
+                "avg_queue_wait_ms": self.total_wait / segments * 1000,
+                "avg_batch_infer_ms": self.total_infer / batches * 1000,
+                "pending": self._queue.qsize(),
+            }
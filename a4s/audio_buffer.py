@@ -0,0 +1,126 @@
+# a4s/audio_buffer.py
+# 上传音频的预分配环形缓冲区：替代 audio_uploader 中的 buffer += data / np.append 累积方式
+import numpy as np
+from loguru import logger
+
+
+class AudioRingBuffer:
+    """按绝对采样序号寻址的环形音频缓冲区
+
+    - 内部预分配 int16 原始样本和 float32 归一化样本两份存储，写入时只转换新到的样本
+    - 两份存储都采用“镜像”布局（长度为 2 * capacity，每个样本同时写在 i 和 i + capacity），
+      因此任意长度不超过 capacity 的区间都是一段连续内存，可以直接返回零拷贝视图
+    - 读写位置都是从流开始计数的绝对采样序号，VAD 返回的毫秒时间戳可以直接换算，不再需要 offset 修正
+
+    注意：返回的视图指向缓冲区内部存储，写入量超过 capacity 后对应位置会被覆盖，
+    跨线程/长时间持有时请自行 copy()。
+    """
+
+    def __init__(self, capacity_samples):
+        if capacity_samples <= 0:
+            raise ValueError("capacity_samples 必须大于 0")
+        self.capacity = int(capacity_samples)
+        self._pcm = np.zeros(self.capacity * 2, dtype=np.int16)
+        self._f32 = np.zeros(self.capacity * 2, dtype=np.float32)
+        self._pending = b""     # 上一帧遗留的半个样本（奇数字节）
+        self.base = 0           # 仍然保留的最早样本的绝对序号
+        self.write_pos = 0      # 已写入样本总数（下一个样本的绝对序号）
+        self.read_pos = 0       # 下一次 read_chunk 的起始绝对序号（送入 VAD 的位置）
+        self.dropped = 0        # 因容量不足而丢弃的样本数
+
+    def __len__(self):
+        return self.write_pos - self.base
+
+    def available(self):
+        """尚未被 read_chunk 读取的样本数"""
+        return self.write_pos - self.read_pos
+
+    def write(self, data):
+        """写入 int16 PCM 字节流，返回本次写入的样本数"""
+        if self._pending:
+            data = self._pending + data
+            self._pending = b""
+        if len(data) % 2:
+            self._pending = data[-1:]
+            data = data[:-1]
+        if not data:
+            return 0
+        return self.write_samples(np.frombuffer(data, dtype=np.int16))
+
+    def write_samples(self, samples):
+        """写入 int16 样本数组，返回本次写入的样本数"""
+        n = len(samples)
+        if n == 0:
+            return 0
+        if n > self.capacity:
+            # 单次写入超过容量时只保留最后 capacity 个样本
+            skipped = n - self.capacity
+            samples = samples[skipped:]
+            self.write_pos += skipped
+            n = self.capacity
+
+        overflow = self.write_pos + n - self.base - self.capacity
+        if overflow > 0:
+            self._drop(overflow)
+
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._store(start, samples[:first])
+        if first < n:
+            self._store(0, samples[first:])
+        self.write_pos += n
+        return n
+
+    def _store(self, idx, samples):
+        end = idx + len(samples)
+        f32 = samples.astype(np.float32) / 32767.0
+        self._pcm[idx:end] = samples
+        self._pcm[idx + self.capacity:end + self.capacity] = samples
+        self._f32[idx:end] = f32
+        self._f32[idx + self.capacity:end + self.capacity] = f32
+
+    def _drop(self, count):
+        self.base += count
+        self.dropped += count
+        if self.read_pos < self.base:
+            self.read_pos = self.base
+        logger.warning(f"[ring] 缓冲区已满，丢弃最早的 {count} 个样本 (累计 {self.dropped})")
+
+    def view(self, start, end):
+        """返回绝对区间 [start, end) 的 float32 零拷贝视图（超出保留范围的部分会被截掉）"""
+        start = max(start, self.base)
+        end = min(end, self.write_pos)
+        if end <= start:
+            return self._f32[:0]
+        idx = start % self.capacity
+        return self._f32[idx:idx + (end - start)]
+
+    def view_int16(self, start, end):
+        """返回绝对区间 [start, end) 的 int16 零拷贝视图"""
+        start = max(start, self.base)
+        end = min(end, self.write_pos)
+        if end <= start:
+            return self._pcm[:0]
+        idx = start % self.capacity
+        return self._pcm[idx:idx + (end - start)]
+
+    def read_chunk(self, size):
+        """读取下一个固定长度的块（float32 视图），数据不足时返回 None"""
+        if self.available() < size:
+            return None
+        chunk = self.view(self.read_pos, self.read_pos + size)
+        self.read_pos += size
+        return chunk
+
+    def discard_before(self, pos):
+        """释放绝对序号 pos 之前的样本（例如一个 VAD 段识别完成后）"""
+        pos = min(pos, self.write_pos)
+        if pos > self.base:
+            self.base = pos
+            if self.read_pos < self.base:
+                self.read_pos = self.base
+
+    def reset(self):
+        self._pending = b""
+        self.base = self.write_pos = self.read_pos = 0
+        self.dropped = 0
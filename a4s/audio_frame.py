@@ -0,0 +1,171 @@
+# a4s/audio_frame.py
+# /ws/upload 的二进制音频帧格式：定长帧头 + 音频负载（int16 PCM，或按 ?codec= 协商的压缩编码）
+# 采集端（python/audio_capture_websocket.py、python/enhanced_dual_audio_service.py）通过 python/audio_frame_client.py 按同一格式打包，修改时需同步
+import io
+import struct
+import numpy as np
+from loguru import logger
+
+MAGIC = b"A4SF"
+VERSION = 1
+
+# 帧头（小端，28 字节）:
+#   magic 4s | version B | flags B | channels H | seq I | sample_index Q | sample_rate I | record_samples I
+# - seq:            帧序号，每帧 +1
+# - sample_index:   本帧第一个样本在采集流中的序号（按 sample_rate 计），由采集端的样本计数得到，与网络到达时间无关
+# - record_samples: 本帧开始时采集端已录制的样本数（按 sample_rate 计，不含暂停），未在录音时为 NO_RECORD
+HEADER = struct.Struct("<4sBBHIQII")
+HEADER_SIZE = HEADER.size
+
+FLAG_RECORDING = 0x01   # 采集端正在录音且未暂停
+NO_RECORD = 0xFFFFFFFF
+
+# 负载编码，连接时通过 ?codec= 协商，整个连接不变
+# flac: 每帧负载是一段独立完整的 FLAC 数据（libsndfile 编解码），可逐帧解码，丢帧不影响后续帧
+SUPPORTED_CODECS = ("pcm", "flac")
+
+
+class FrameError(ValueError):
+    """帧格式错误"""
+
+
+def encode_payload(codec, pcm, sample_rate=16000):
+    """把 int16 样本编码为一帧负载"""
+    if codec == "pcm":
+        return pcm.astype(np.int16, copy=False).tobytes()
+    if codec == "flac":
+        import soundfile as sf
+        buf = io.BytesIO()
+        sf.write(buf, pcm, sample_rate, format="FLAC", subtype="PCM_16")
+        return buf.getvalue()
+    raise FrameError(f"不支持的编码: {codec}")
+
+
+def decode_payload(codec, payload, channels=1):
+    """把一帧负载解码为单声道 int16 样本；pcm 直接返回原消息的视图（不拷贝）"""
+    if codec == "pcm":
+        pcm = np.frombuffer(payload, dtype=np.int16)
+        if channels > 1:
+            pcm = pcm[:len(pcm) - len(pcm) % channels].reshape(-1, channels)
+    elif codec == "flac":
+        import soundfile as sf
+        try:
+            pcm, _ = sf.read(io.BytesIO(payload), dtype="int16")
+        except Exception as e:
+            raise FrameError(f"FLAC 解码失败: {e}") from e
+    else:
+        raise FrameError(f"不支持的编码: {codec}")
+    if pcm.ndim > 1:
+        pcm = pcm.mean(axis=1).astype(np.int16)
+    return pcm
+
+
+class AudioFrame:
+    __slots__ = ("version", "flags", "channels", "seq", "sample_index", "sample_rate", "record_samples",
+                 "payload", "codec")
+
+    def __init__(self, version, flags, channels, seq, sample_index, sample_rate, record_samples, payload,
+                 codec="pcm"):
+        self.version = version
+        self.flags = flags
+        self.channels = channels
+        self.seq = seq
+        self.sample_index = sample_index
+        self.sample_rate = sample_rate
+        self.record_samples = None if record_samples == NO_RECORD else record_samples
+        self.payload = payload
+        self.codec = codec
+
+    @property
+    def recording(self):
+        return bool(self.flags & FLAG_RECORDING)
+
+    def samples(self):
+        """解码后的单声道 int16 样本；pcm 单声道时是原消息的视图（不拷贝）"""
+        return decode_payload(self.codec, self.payload, self.channels)
+
+
+def is_framed(data):
+    return len(data) >= HEADER_SIZE and data[:4] == MAGIC
+
+
+def parse_frame(data, codec="pcm"):
+    """解析一帧；负载是原消息的 memoryview，不拷贝"""
+    if len(data) < HEADER_SIZE:
+        raise FrameError(f"帧长度不足: {len(data)} < {HEADER_SIZE}")
+    magic, version, flags, channels, seq, sample_index, sample_rate, record_samples = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameError(f"帧头 magic 不匹配: {magic!r}")
+    if version != VERSION:
+        raise FrameError(f"不支持的帧版本: {version}")
+    payload = memoryview(data)[HEADER_SIZE:]
+    if channels < 1 or (codec == "pcm" and len(payload) % (2 * channels)):
+        raise FrameError(f"负载长度 {len(payload)} 与声道数 {channels} 不匹配")
+    return AudioFrame(version, flags, channels, seq, sample_index, sample_rate, record_samples, payload, codec)
+
+
+def pack_frame(seq, sample_index, pcm, sample_rate=16000, channels=1, flags=0, record_samples=None, codec="pcm"):
+    """打包一帧（采集端和基准测试使用）"""
+    if isinstance(pcm, np.ndarray):
+        pcm = encode_payload(codec, pcm, sample_rate)
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, channels, seq & 0xFFFFFFFF, sample_index, sample_rate,
+        NO_RECORD if record_samples is None else record_samples,
+    )
+    return header + pcm
+
+
+class FrameSequencer:
+    """按帧头检查音频流的连续性
+
+    accept(frame, num_samples) 返回本帧之前需要补齐的静音样本数：
+    - 0：与上一帧首尾相接
+    - > 0：采集端丢帧（例如发送队列溢出），缺口补静音，保证环形缓冲区位置与采集样本序号一致
+    - None：重复或乱序到达的旧帧（其位置已经处理过），应丢弃
+    """
+
+    def __init__(self, sample_rate=16000):
+        self.sample_rate = sample_rate
+        self.next_seq = None
+        self.next_sample = None
+        self.frames = 0
+        self.lost_frames = 0      # 序号缺口累计
+        self.gap_samples = 0      # 补齐的静音样本累计
+        self.late_frames = 0      # 丢弃的重复/乱序帧
+        self.bad_frames = 0       # 格式错误或参数不支持的帧
+
+    def accept(self, frame, num_samples):
+        if frame.sample_rate != self.sample_rate:
+            self.bad_frames += 1
+            if self.bad_frames == 1:
+                logger.error(f"[frame] 不支持的采样率 {frame.sample_rate}Hz（需要 {self.sample_rate}Hz），帧被丢弃")
+            return None
+        if self.next_sample is None:
+            self.next_seq, self.next_sample = frame.seq, frame.sample_index
+        if frame.sample_index < self.next_sample:
+            self.late_frames += 1
+            logger.warning(f"[frame] 丢弃重复/乱序帧: seq={frame.seq}, sample_index={frame.sample_index} < {self.next_sample}")
+            return None
+
+        if frame.seq != self.next_seq:
+            lost = (frame.seq - self.next_seq) & 0xFFFFFFFF
+            self.lost_frames += lost
+            logger.warning(f"[frame] 帧序号不连续: 期望 {self.next_seq}, 收到 {frame.seq} (丢失 {lost} 帧)")
+        gap = frame.sample_index - self.next_sample
+        if gap:
+            self.gap_samples += gap
+            logger.warning(f"[frame] 采集样本缺口 {gap / self.sample_rate:.3f}s，补静音")
+
+        self.frames += 1
+        self.next_seq = (frame.seq + 1) & 0xFFFFFFFF
+        self.next_sample = frame.sample_index + num_samples
+        return gap
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "lost_frames": self.lost_frames,
+            "gap_seconds": round(self.gap_samples / self.sample_rate, 3),
+            "late_frames": self.late_frames,
+            "bad_frames": self.bad_frames,
+        }
@@ -0,0 +1,702 @@
+# a4s/benchmark.py
+# 后端性能基准：python benchmark.py <子命令> [参数]
+# 会加载与 server_wss_split.py 相同的模型（导入服务模块），请在 a4s 目录下运行
+import argparse
+import os
+import re
+import time
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+# 随仓库附带的带标注真实语音（见 fixtures/asr/README.md），CER 类对比默认使用
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "asr")
+
+
+def load_segments(wav=None, lengths=(1.5, 3.0, 6.0), count=1, seed=0):
+    """准备测试音频段：指定 wav 时按长度从中截取，否则生成合成语音状信号"""
+    rng = np.random.default_rng(seed)
+    source = None
+    if wav:
+        source, fs = sf.read(wav, dtype="float32")
+        if source.ndim > 1:
+            source = source.mean(axis=1)
+        if fs != SAMPLE_RATE:
+            import librosa
+            source = librosa.resample(source, orig_sr=fs, target_sr=SAMPLE_RATE)
+    segments = []
+    for _ in range(count):
+        for seconds in lengths:
+            n = int(seconds * SAMPLE_RATE)
+            if source is not None and len(source) > 0:
+                start = int(rng.integers(0, max(1, len(source) - n)))
+                seg = source[start:start + n]
+                if len(seg) < n:
+                    seg = np.pad(seg, (0, n - len(seg)))
+            else:
+                t = np.arange(n) / SAMPLE_RATE
+                envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+                seg = 0.1 * envelope * np.sin(2 * np.pi * (150 + 50 * np.sin(2 * np.pi * t)) * t)
+                seg = seg + 0.01 * rng.standard_normal(n)
+            segments.append(seg.astype(np.float32))
+    return segments
+
+
+def load_fixtures(path):
+    """读取识别准确率测试集：目录中的 *.wav 与同名 *.txt（参考文本），返回 [(音频, 参考文本 | None)]"""
+    import glob
+    fixtures = []
+    for wav in sorted(glob.glob(os.path.join(path, "*.wav"))):
+        audio, fs = sf.read(wav, dtype="float32")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if fs != SAMPLE_RATE:
+            import librosa
+            audio = librosa.resample(audio, orig_sr=fs, target_sr=SAMPLE_RATE)
+        ref = None
+        txt = os.path.splitext(wav)[0] + ".txt"
+        if os.path.exists(txt):
+            with open(txt, encoding="utf-8") as f:
+                ref = f.read().strip()
+        fixtures.append((audio, ref))
+    return fixtures
+
+
+def load_labelled_fixtures(path):
+    """读取测试集并要求每段都有参考文本；缺失时直接报错退出，不用合成信号代替（非语音上的 CER 没有意义）"""
+    fixtures = load_fixtures(path) if os.path.isdir(path) else []
+    if not fixtures:
+        raise SystemExit(f"测试集 {path} 不存在或没有 wav 文件（默认测试集见 fixtures/asr/）")
+    missing = [i for i, (_, ref) in enumerate(fixtures) if ref is None]
+    if missing:
+        raise SystemExit(f"测试集 {path} 中有 {len(missing)} 个 wav 缺少同名 .txt 参考文本")
+    return fixtures
+
+
+def cer(ref, hyp):
+    """字符错误率：忽略大小写、标点和空白后按字符计算编辑距离 / 参考长度"""
+    ref, hyp = (re.sub(r"[\W_]+", "", s.lower()) for s in (ref, hyp))
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def rss_mb():
+    """当前进程常驻内存（MB），读取 /proc，其他平台回退到 ru_maxrss"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timeit(fn, repeat=5, warmup=1):
+    """返回 fn 多次执行的耗时列表（毫秒）"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summarize(name, times):
+    times = np.asarray(times)
+    print(f"{name:<40} mean={times.mean():8.2f}ms  p50={np.percentile(times, 50):8.2f}ms  "
+          f"p95={np.percentile(times, 95):8.2f}ms")
+
+
+def bench_asr_batch(args):
+    """N 路并发流：逐段识别 vs 跨会话批处理的总吞吐"""
+    import server_wss_split as server
+    segments = load_segments(args.wav, lengths=(args.seconds,), count=args.streams)
+    audio_seconds = len(segments) * args.seconds
+
+    def sequential():
+        for seg in segments:
+            server.asr_batch([seg], "auto", True)
+
+    def batched():
+        for i in range(0, len(segments), args.batch):
+            server.asr_batch(segments[i:i + args.batch], "auto", True)
+
+    seq = timeit(sequential, args.repeat)
+    bat = timeit(batched, args.repeat)
+    summarize(f"sequential ({len(segments)} x batch=1)", seq)
+    summarize(f"batched (batch={args.batch})", bat)
+    print(f"throughput: sequential {audio_seconds / (np.mean(seq) / 1000):.1f}x realtime, "
+          f"batched {audio_seconds / (np.mean(bat) / 1000):.1f}x realtime")
+
+
+def bench_asr_vad(args):
+    """已切分语音段：直接识别（asr_segment）vs 经 AutoModel 内置 VAD 再识别（asr），以及内置 VAD 的内存占用"""
+    import server_wss_split as server
+    segments = load_segments(args.wav, lengths=tuple(args.seconds))
+
+    for seg in segments:
+        seconds = len(seg) / SAMPLE_RATE
+        summarize(f"asr_segment ({seconds:.1f}s, no VAD)", timeit(lambda: server.asr_segment(seg, "auto", True), args.repeat))
+
+    rss_before = rss_mb()
+    server.ensure_file_vad()
+    rss_after = rss_mb()
+    for seg in segments:
+        seconds = len(seg) / SAMPLE_RATE
+        summarize(f"asr ({seconds:.1f}s, embedded VAD)", timeit(lambda: server.asr(seg, "auto", {}, True), args.repeat))
+    print(f"RSS: {rss_before:.1f} MB without embedded VAD, {rss_after:.1f} MB with it "
+          f"(saved {rss_after - rss_before:.1f} MB)")
+
+
+def bench_asr_runner(args):
+    """单段识别耗时拆分：AutoModel.generate / SenseVoiceSmall.inference / SenseVoiceRunner"""
+    import torch
+    import server_wss_split as server
+    model = server.model_asr
+    kwargs = {**model.kwargs, "language": "auto", "use_itn": True}
+
+    for seg in load_segments(args.wav, lengths=tuple(args.seconds)):
+        seconds = len(seg) / SAMPLE_RATE
+        metas = []
+
+        def generate():
+            model.generate(input=seg, language="auto", use_itn=True, disable_pbar=True)
+
+        def inference():
+            with torch.no_grad():
+                metas.append(model.model.inference(data_in=[seg], key=["segment_0"], **kwargs)[1])
+
+        def runner():
+            metas.append(server.asr_runner([seg], **kwargs)[1])
+
+        expected = server.asr_runner([seg], **kwargs)[0][0]["text"]
+        with torch.no_grad():
+            actual = model.model.inference(data_in=[seg], key=["segment_0"], **kwargs)[0][0]["text"]
+        assert expected == actual, f"识别结果不一致: {expected!r} != {actual!r}"
+
+        summarize(f"AutoModel.generate ({seconds:.1f}s)", timeit(generate, args.repeat))
+        for name, fn in (("SenseVoiceSmall.inference", inference), ("SenseVoiceRunner", runner)):
+            metas.clear()
+            summarize(f"{name} ({seconds:.1f}s)", timeit(fn, args.repeat))
+            stages = {}
+            for meta in metas:
+                for stage, value in meta.items():
+                    if stage != "batch_data_time":
+                        stages.setdefault(stage, []).append(float(value) * 1000)
+            print("  " + ", ".join(f"{stage}={np.mean(v):.2f}ms" for stage, v in stages.items()))
+
+
+def bench_fbank(args):
+    """语音段结束后关键路径上的特征提取：整段 frontend 与 IncrementalFbank 缓存取帧对比"""
+    import torch
+    import server_wss_split as server
+    from audio_buffer import AudioRingBuffer
+    from frontend import IncrementalFbank
+    frontend = server.model_asr.kwargs["frontend"]
+    chunk = int(server.config.chunk_size_ms * SAMPLE_RATE / 1000)
+
+    for seg in load_segments(args.wav, lengths=tuple(args.seconds)):
+        seconds = len(seg) / SAMPLE_RATE
+        ring = AudioRingBuffer(len(seg) + chunk)
+        fbank = IncrementalFbank(frontend, ring)
+        advance_times = []
+        for i in range(0, len(seg), chunk):
+            ring.write_samples((seg[i:i + chunk] * 32767).astype(np.int16))
+            start = time.perf_counter()
+            fbank.advance()
+            advance_times.append((time.perf_counter() - start) * 1000)
+        audio = ring.view(0, len(seg)).copy()
+        wav = torch.from_numpy(audio)[None, :]
+
+        expected, _ = frontend(wav, [wav.size(1)])
+        actual = fbank.features(0, len(seg))
+        diff = (expected[0] - actual).abs().max().item()
+        assert diff < 1e-4, f"增量特征与整段提取不一致: max diff {diff}"
+
+        summarize(f"frontend, whole segment ({seconds:.1f}s)", timeit(lambda: frontend(wav, [wav.size(1)]), args.repeat))
+        summarize(f"IncrementalFbank.features ({seconds:.1f}s)", timeit(lambda: fbank.features(0, len(seg)), args.repeat))
+        print(f"  advance() per {server.config.chunk_size_ms}ms chunk (off the critical path): "
+              f"{np.mean(advance_times):.2f}ms")
+
+
+def bench_prompt(args):
+    """每次调用的固定开销：prompt query 与位置编码表缓存前后对比，以及短语音段的整体耗时"""
+    import torch
+    import server_wss_split as server
+    model = server.model_asr.model
+    device = server.model_asr.kwargs["device"]
+    kwargs = {**server.model_asr.kwargs, "language": "auto", "use_itn": True}
+    lid, textnorm_id = model.lid_dict["auto"], model.textnorm_dict["withitn"]
+    pos_enc = model.encoder.embed
+    dim = model.embed.embedding_dim  # 位置编码加在 LFR 特征（编码器输入）上
+    repeat = args.repeat * 20
+
+    with torch.no_grad():
+        summarize("prompt query (rebuilt)", timeit(lambda: model.build_prompt_query(lid, textnorm_id, device), repeat))
+        summarize("prompt query (cached)", timeit(lambda: model.prompt_query("auto", True, device), repeat))
+        for seconds in args.seconds:
+            frames = int(seconds * 1000 / 60) + 4  # LFR 帧移 60ms，加上 4 帧 prompt
+            positions = torch.arange(1, frames + 1, device=device)[None, :]
+            summarize(f"position encoding {frames} frames (rebuilt)",
+                      timeit(lambda: pos_enc.encode(positions, dim, torch.float32), repeat))
+            summarize(f"position encoding {frames} frames (cached)",
+                      timeit(lambda: pos_enc.table(frames, dim, torch.float32, positions.device), repeat))
+
+    for seg in load_segments(args.wav, lengths=tuple(args.seconds)):
+        summarize(f"SenseVoiceRunner ({len(seg) / SAMPLE_RATE:.1f}s)",
+                  timeit(lambda: server.asr_runner([seg], **kwargs), args.repeat))
+
+
+def bench_onnx(args):
+    """ONNX Runtime 后端与 PyTorch eager 的一致性检查（测试集真实语音）和单段延迟对比"""
+    import server_wss_split as server
+    from onnx_backend import default_onnx_path, export_encoder_ctc, load_onnx_backend
+    model = server.model_asr.model
+    kwargs = {**server.model_asr.kwargs, "language": "auto", "use_itn": True}
+    path = args.onnx or server.config.onnx_model_path or default_onnx_path(server.asr_model_path)
+    if args.export:
+        export_encoder_ctc(model, path)
+    rss_before = rss_mb()
+    backend = load_onnx_backend(model, server.asr_model_path, path)
+    print(f"RSS: +{rss_mb() - rss_before:.1f} MB for the onnxruntime session")
+
+    # 一致性检查用真实语音：合成信号上两个后端都只输出空文本或噪声标记，不一致时也看不出来
+    fixtures = [audio for audio, _ in load_labelled_fixtures(args.fixtures)]
+    model.encode_backend = None
+    expected = [server.asr_runner([audio], **kwargs)[0][0] for audio in fixtures]
+    model.encode_backend = backend
+    try:
+        actual = [server.asr_runner([audio], **kwargs)[0][0] for audio in fixtures]
+        batched = server.asr_runner(fixtures, **kwargs)[0]
+    finally:
+        model.encode_backend = None
+    for audio, e, a, b in zip(fixtures, expected, actual, batched):
+        diff = max(abs(e["avg_logprob"] - a["avg_logprob"]), abs(e["avg_logprob"] - b["avg_logprob"]))
+        print(f"{len(audio) / SAMPLE_RATE:.1f}s: text {'==' if e['text'] == a['text'] == b['text'] else '!='}, "
+              f"|avg_logprob diff| = {diff:.2e}")
+        assert e["text"] == a["text"] == b["text"], f"识别结果不一致: {e['text']!r} / {a['text']!r} / {b['text']!r}"
+        assert diff < 1e-3, f"avg_logprob 偏差过大: {diff}"
+
+    for seg in load_segments(args.wav, lengths=tuple(args.seconds)):
+        seconds = len(seg) / SAMPLE_RATE
+        for name, encode_backend in (("torch", None), ("onnxruntime", backend)):
+            model.encode_backend = encode_backend
+            summarize(f"{name} ({seconds:.1f}s)", timeit(lambda: server.asr_runner([seg], **kwargs), args.repeat))
+    model.encode_backend = None
+
+
+def bench_quantize(args):
+    """int8 动态量化前后的识别准确率（CER）、单段延迟和内存对比"""
+    import server_wss_split as server
+    from quantization import linear_weight_bytes, quantize_encoder
+    model = server.model_asr.model
+    kwargs = {**server.model_asr.kwargs, "language": "auto", "use_itn": True}
+    fixtures = load_labelled_fixtures(args.fixtures)
+
+    def transcribe():
+        return [server.strip_asr_tags(server.asr_runner([audio], **kwargs)[0][0]["text"]) for audio, _ in fixtures]
+
+    def latency(name):
+        for seconds in args.seconds:
+            seg = load_segments(args.wav, lengths=(seconds,))[0]
+            summarize(f"{name} ({seconds:.1f}s)", timeit(lambda: server.asr_runner([seg], **kwargs), args.repeat))
+
+    fp32_text = transcribe()
+    latency("fp32")
+    fp32_rss, fp32_bytes = rss_mb(), linear_weight_bytes(model.encoder)
+    quantize_encoder(model)
+    int8_text = transcribe()
+    latency("int8")
+    int8_rss, int8_bytes = rss_mb(), linear_weight_bytes(model.encoder)
+
+    refs = [ref for _, ref in fixtures]
+    for name, texts in (("fp32", fp32_text), ("int8", int8_text)):
+        print(f"CER {name} vs reference: {np.mean([cer(r, h) for r, h in zip(refs, texts)]):.4f}")
+    print(f"CER int8 vs fp32 output: {np.mean([cer(r, h) for r, h in zip(fp32_text, int8_text)]):.4f} "
+          f"({len(fixtures)} segments)")
+    print(f"Linear weights: {fp32_bytes / 2**20:.1f} MB → {int8_bytes / 2**20:.1f} MB; "
+          f"RSS {fp32_rss:.1f} MB → {int8_rss:.1f} MB (freed fp32 pages may stay with the allocator)")
+
+
+def bench_compiled(args):
+    """编译模式（torch.compile / TorchScript）各长度桶相对 eager 的加速比与结果一致性"""
+    import torch
+    import server_wss_split as server
+    from compiled_encoder import CompiledEncoderBackend
+    model = server.model_asr.model
+    model.encode_backend = None
+    backend = CompiledEncoderBackend(model, buckets=args.buckets, mode=args.mode)
+    backend.warmup((1,))
+    dim = model.embed.embedding_dim
+
+    for bucket in backend.buckets:
+        # 取桶内偏长的输入：包含补齐开销，接近实际使用
+        frames = max(1, bucket * 3 // 4)
+        speech = torch.randn(1, frames, dim)
+        lengths = torch.tensor([frames], dtype=torch.int32)
+        with torch.no_grad():
+            expected, _ = backend.wrapper(speech.clone(), lengths)
+            if backend.build(bucket, 1) is None:
+                print(f"bucket {bucket}: 编译失败，跳过")
+                continue
+            actual, _ = backend(speech.clone(), lengths)
+            eager = timeit(lambda: backend.wrapper(speech.clone(), lengths), args.repeat)
+            compiled = timeit(lambda: backend(speech.clone(), lengths), args.repeat)
+        diff = (expected - actual).abs().max().item()
+        summarize(f"eager ({frames}/{bucket} frames)", eager)
+        summarize(f"{args.mode} ({frames}/{bucket} frames)", compiled)
+        print(f"  speedup {np.mean(eager) / np.mean(compiled):.2f}x, build {backend.build_seconds[(bucket, 1)]:.1f}s, "
+              f"max |diff| {diff:.2e}")
+
+
+def bench_padding(args):
+    """组批 padding 效率模拟（不加载模型）：按到达顺序直接组批 vs LengthBucketer，用于调整桶边界"""
+    from asr_scheduler import LengthBucketer
+    rng = np.random.default_rng(0)
+    # 语音段时长近似对数正态分布，截断到强制切分上限
+    lengths = np.clip(rng.lognormal(np.log(args.median), 0.7, args.segments), 0.3, args.max_seconds).tolist()
+
+    def report(name, batches, bucketer=None):
+        useful = sum(lengths[i] for b in batches for i in b)
+        padded = sum(max(lengths[i] for i in b) * len(b) for b in batches)
+        print(f"{name:<28} batches={len(batches):4d}  avg_batch={len(lengths) / len(batches):5.2f}  "
+              f"padding_efficiency={useful / padded:.3f}")
+        if bucketer is not None:
+            for b in batches:
+                bucketer.record([lengths[i] for i in b])
+            for label, s in bucketer.stats()["buckets"].items():
+                print(f"  bucket {label:<14} batches={s['batches']:4d}  avg_batch={s['avg_batch_size']:5.2f}  "
+                      f"padding_efficiency={s['padding_efficiency']:.3f}")
+
+    naive = [list(range(i, min(i + args.batch, len(lengths)))) for i in range(0, len(lengths), args.batch)]
+    report("arrival order", naive)
+    for waste in args.waste:
+        bucketer = LengthBucketer(bucket_edges=args.edges, max_padding_waste=waste, max_batch_size=args.batch)
+        # 模拟调度器：每次取 batch 个到达的语音段，再在其中按长度分批
+        batches = []
+        for group in naive:
+            batches += [[group[i] for i in b] for b in bucketer.plan([lengths[i] for i in group])]
+        report(f"bucketed (waste<={waste})", batches, bucketer)
+
+
+def bench_sdpa(args):
+    """编码器自注意力：手写 matmul/softmax 与 scaled_dot_product_attention 的一致性和耗时对比"""
+    import torch
+    import server_wss_split as server
+    attn = server.model_asr.model.encoder.encoders[0].self_attn
+    dim = attn.linear_q_k_v.in_features
+    torch.manual_seed(0)
+    with torch.no_grad():
+        for frames in args.frames:
+            x = torch.randn(args.batch, frames, dim)
+            # 批内第二条起逐条缩短，覆盖 padding 掩码
+            lengths = torch.tensor([frames - i * frames // (2 * args.batch) for i in range(args.batch)])
+            mask = (torch.arange(frames)[None, :] < lengths[:, None]).float()[:, None, :]
+            results = {}
+            for use_sdpa in (False, True):
+                attn.use_sdpa = use_sdpa
+                results[use_sdpa] = attn(x, mask)
+                summarize(f"{'sdpa' if use_sdpa else 'manual'} ({args.batch} x {frames} frames)",
+                          timeit(lambda: attn(x, mask), args.repeat))
+            diff = (results[False] - results[True]).abs().max().item()
+            print(f"  max |diff| {diff:.2e}")
+            assert diff < 1e-4, f"SDPA 与手写注意力结果不一致: {diff}"
+    attn.use_sdpa = server.config.asr_sdpa
+
+
+def bench_maskfree(args):
+    """单条无 padding 输入：编码器跳过掩码的快速路径与带掩码路径的一致性和耗时对比"""
+    import torch
+    import server_wss_split as server
+    encoder = server.model_asr.model.encoder
+    dim = server.model_asr.model.embed.embedding_dim
+    default = encoder.mask_free_fast_path
+    torch.manual_seed(0)
+    with torch.no_grad():
+        for frames in args.frames:
+            speech = torch.randn(1, frames, dim)
+            lengths = torch.tensor([frames], dtype=torch.int32)
+            outputs = {}
+            for fast in (False, True):
+                encoder.mask_free_fast_path = fast
+                outputs[fast] = encoder(speech.clone(), lengths)
+                summarize(f"{'mask-free' if fast else 'masked'} ({frames} frames)",
+                          timeit(lambda: encoder(speech.clone(), lengths), args.repeat))
+            diff = (outputs[False][0] - outputs[True][0]).abs().max().item()
+            print(f"  max |diff| {diff:.2e}")
+            assert diff < 1e-4 and torch.equal(outputs[False][1], outputs[True][1]), "快速路径与带掩码路径结果不一致"
+    encoder.mask_free_fast_path = default
+
+
+def bench_ctc(args):
+    """CTC 头 + 贪心解码：log_softmax + 逐条解码 与 融合解码（logits argmax + logsumexp）的对比"""
+    import torch
+    import server_wss_split as server
+    model = server.model_asr.model
+    tokenizer = server.model_asr.kwargs["tokenizer"]
+    dim = model.encoder.output_size()
+    torch.manual_seed(0)
+    with torch.no_grad():
+        for seconds in args.seconds:
+            frames = int(seconds * 1000 / 60) + 4  # LFR 帧移 60ms，加上 4 帧 prompt
+            encoder_out = torch.randn(args.batch, frames, dim)
+            lens = torch.tensor([frames - i * frames // (2 * args.batch) for i in range(args.batch)], dtype=torch.int32)
+            keys = [f"segment_{i}" for i in range(args.batch)]
+
+            def reference():
+                return model.decode_ctc(model.ctc.log_softmax(encoder_out), lens, keys, tokenizer)
+
+            def fused():
+                return model.decode_ctc_fused(model.ctc.ctc_lo(encoder_out), lens, keys, tokenizer)
+
+            expected, actual = reference(), fused()
+            diff = max(abs(e["avg_logprob"] - a["avg_logprob"]) for e, a in zip(expected, actual))
+            assert all(e["text"] == a["text"] for e, a in zip(expected, actual)), "融合解码文本与逐条解码不一致"
+            assert diff < 1e-4, f"avg_logprob 偏差过大: {diff}"
+            summarize(f"log_softmax + decode_ctc ({args.batch} x {seconds:.1f}s)", timeit(reference, args.repeat))
+            summarize(f"decode_ctc_fused ({args.batch} x {seconds:.1f}s)", timeit(fused, args.repeat))
+            print(f"  max |avg_logprob diff| {diff:.2e}")
+
+
+def bench_bf16(args):
+    """编码器 bf16 autocast 与 fp32 的识别一致性（CER）和吞吐对比"""
+    import torch
+    import server_wss_split as server
+    from quantization import cpu_supports_bf16
+    model = server.model_asr.model
+    kwargs = {**server.model_asr.kwargs, "language": "auto", "use_itn": True}
+    print(f"native bf16: {cpu_supports_bf16()}")
+    fixtures = load_labelled_fixtures(args.fixtures)
+    audio_seconds = sum(len(audio) for audio, _ in fixtures) / SAMPLE_RATE
+
+    texts = {}
+    default = model.encoder_autocast_dtype
+    for name, dtype in (("fp32", None), ("bf16", torch.bfloat16)):
+        model.encoder_autocast_dtype = dtype
+        texts[name] = [server.strip_asr_tags(server.asr_runner([audio], **kwargs)[0][0]["text"]) for audio, _ in fixtures]
+        times = timeit(lambda: [server.asr_runner([audio], **kwargs) for audio, _ in fixtures], args.repeat)
+        summarize(f"{name} ({len(fixtures)} segments, {audio_seconds:.1f}s audio)", times)
+        print(f"  throughput {audio_seconds / (np.mean(times) / 1000):.1f}x realtime")
+    model.encoder_autocast_dtype = default
+
+    refs = [ref for _, ref in fixtures]
+    for name in ("fp32", "bf16"):
+        print(f"CER {name} vs reference: {np.mean([cer(r, h) for r, h in zip(refs, texts[name])]):.4f}")
+    print(f"CER bf16 vs fp32 output: {np.mean([cer(r, h) for r, h in zip(texts['fp32'], texts['bf16'])]):.4f}")
+
+
+def bench_threads(args):
+    """识别与翻译同时进行时的 ASR 尾延迟：各库默认线程数 vs 线程预算（captions+translation）"""
+    import threading
+    import torch
+    import ctranslate2
+    import server_wss_split as server
+    from threads import ThreadBudget, available_cores
+    from warmup import WARMUP_TEXTS
+    cores = args.cores or available_cores()
+    segments = load_segments(args.wav, lengths=tuple(args.seconds), count=args.count)
+    assert server.load_translation_model(), "翻译模型加载失败"
+    texts = WARMUP_TEXTS["zh"]
+
+    def run(name, budget):
+        if budget is None:
+            # 各库默认：torch 每个线程按全部核心，ctranslate2 使用自身默认线程数
+            torch.set_num_threads(cores)
+            server.translator = ctranslate2.Translator(server.translate_model_path, device="cpu")
+        else:
+            budget.set_translation(True)
+            server.translator = ctranslate2.Translator(server.translate_model_path, device="cpu", **budget.translator_kwargs())
+        server.thread_budget = budget
+        stop = threading.Event()
+        translated = [0]
+
+        def translate_loop():
+            # 翻译持续占用 CPU，模拟上一段字幕翻译与下一段识别重叠；绕过译文缓存，每次都真实解码
+            while not stop.is_set():
+                server.translate_text(texts[translated[0] % len(texts)], "zh", "en", use_cache=False)
+                translated[0] += 1
+
+        worker = threading.Thread(target=translate_loop, daemon=True)
+        worker.start()
+        times = []
+        try:
+            for _ in range(args.repeat):
+                for seg in segments:
+                    start = time.perf_counter()
+                    server.asr_batch([seg], "auto", True)
+                    times.append((time.perf_counter() - start) * 1000)
+        finally:
+            stop.set()
+            worker.join()
+        times = np.asarray(times)
+        print(f"{name:<28} asr p50={np.percentile(times, 50):8.2f}ms  p95={np.percentile(times, 95):8.2f}ms  "
+              f"p99={np.percentile(times, 99):8.2f}ms  max={times.max():8.2f}ms  translations={translated[0]}")
+
+    print(f"cores: {cores}")
+    run("default threads", None)
+    budget = ThreadBudget("captions+translation", cores, stream=False)
+    print(f"budget: {budget.stats()}")
+    run("thread budget", budget)
+
+
+def bench_translate_cache(args):
+    """按会议字幕的重复比例回放一串句子：无缓存 vs 译文 LRU 缓存的平均翻译耗时与命中率"""
+    import server_wss_split as server
+    from translation_cache import TranslationCache
+    assert server.load_translation_model(), "翻译模型加载失败"
+    stock = ["好的。", "是的。", "谢谢大家。", "大家好。", "可以。", "对，没问题。", "下一页。", "张经理，请您说一下。"]
+    unique = [f"第{i}项议题是关于下个季度的预算安排和人员调整。" for i in range(args.sentences)]
+    rng = np.random.default_rng(0)
+    stream = [stock[rng.integers(len(stock))] if rng.random() < args.repeat_ratio else unique[i % len(unique)]
+              for i in range(args.sentences)]
+
+    def replay():
+        return [server.translate_text(text, "zh", "en") for text in stream]
+
+    saved = server.translation_cache
+    server.translation_cache = None
+    baseline = timeit(replay, 1, warmup=0)[0]
+    server.translation_cache = TranslationCache(max_entries=args.cache_size)
+    server.translation_cache.bind_model(server.translate_model_path)
+    cached = timeit(replay, 1, warmup=0)[0]
+    stats = server.translation_cache.stats()
+    server.translation_cache = saved
+    print(f"{len(stream)} sentences, repeat ratio {args.repeat_ratio:.0%}")
+    print(f"no cache: {baseline / len(stream):8.2f} ms/sentence")
+    print(f"cache:    {cached / len(stream):8.2f} ms/sentence  {stats}")
+
+
+def bench_codec(args):
+    """上传编码对比：网络字节数（含帧头）与服务端逐帧解码 CPU 开销"""
+    from audio_frame import SUPPORTED_CODECS, pack_frame, parse_frame
+    audio = np.concatenate(load_segments(args.wav, lengths=(args.seconds,)))
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    frame_samples = int(args.frame_ms * SAMPLE_RATE / 1000)
+    chunks = [pcm[i:i + frame_samples] for i in range(0, len(pcm), frame_samples)]
+    audio_seconds = len(pcm) / SAMPLE_RATE
+
+    print(f"audio: {audio_seconds:.1f}s, {len(chunks)} frames x {args.frame_ms}ms")
+    for codec in SUPPORTED_CODECS:
+        frames = [pack_frame(i, i * frame_samples, chunk, codec=codec) for i, chunk in enumerate(chunks)]
+        wire_bytes = sum(len(f) for f in frames)
+
+        def decode():
+            for f in frames:
+                parse_frame(f, codec).samples()
+
+        decoded = np.concatenate([parse_frame(f, codec).samples() for f in frames])
+        assert np.array_equal(decoded, pcm), f"{codec} 解码结果与原始 PCM 不一致"
+        cpu_start = time.process_time()
+        times = timeit(decode, args.repeat)
+        cpu_ms = (time.process_time() - cpu_start) / (args.repeat + 1) * 1000
+        summarize(f"decode {codec}", times)
+        print(f"  wire: {wire_bytes / 1024:.1f} KiB ({wire_bytes * 8 / audio_seconds / 1000:.1f} kbit/s), "
+              f"server CPU: {cpu_ms / audio_seconds:.3f} ms per audio second")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="a4s 后端性能基准")
+    parser.add_argument("--wav", type=str, default=None, help="测试音频（默认使用合成信号）")
+    parser.add_argument("--repeat", type=int, default=5)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("asr-batch", help="跨会话 ASR 批处理吞吐")
+    p.add_argument("--streams", type=int, default=4)
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.add_argument("--batch", type=int, default=4)
+    p.set_defaults(func=bench_asr_batch)
+
+    p = sub.add_parser("asr-vad", help="已切分语音段跳过内置 VAD 的延迟与内存收益")
+    p.add_argument("--seconds", type=float, nargs="+", default=[1.5, 3.0, 6.0])
+    p.set_defaults(func=bench_asr_vad)
+
+    p = sub.add_parser("asr-runner", help="轻量推理入口与 AutoModel 调用链的耗时拆分")
+    p.add_argument("--seconds", type=float, nargs="+", default=[1.0, 2.0, 3.0])
+    p.set_defaults(func=bench_asr_runner)
+
+    p = sub.add_parser("fbank", help="增量 fbank 对语音段结束后特征提取耗时的影响")
+    p.add_argument("--seconds", type=float, nargs="+", default=[2.0, 5.0, 10.0])
+    p.set_defaults(func=bench_fbank)
+
+    p = sub.add_parser("prompt", help="prompt query / 位置编码缓存对短语音段固定开销的影响")
+    p.add_argument("--seconds", type=float, nargs="+", default=[0.5, 1.0, 2.0])
+    p.set_defaults(func=bench_prompt)
+
+    p = sub.add_parser("onnx", help="ONNX Runtime 后端的一致性检查与延迟对比")
+    p.add_argument("--seconds", type=float, nargs="+", default=[1.0, 3.0, 6.0])
+    p.add_argument("--onnx", type=str, default=None, help="ONNX 模型路径（默认同 Config.onnx_model_path）")
+    p.add_argument("--fixtures", type=str, default=DEFAULT_FIXTURES, help="一致性检查用的测试集目录（默认 fixtures/asr）")
+    p.add_argument("--export", action="store_true", help="先重新导出 ONNX 模型")
+    p.set_defaults(func=bench_onnx)
+
+    p = sub.add_parser("quantize", help="int8 动态量化的 CER、延迟与内存对比")
+    p.add_argument("--seconds", type=float, nargs="+", default=[1.0, 3.0, 6.0])
+    p.add_argument("--fixtures", type=str, default=DEFAULT_FIXTURES, help="测试集目录：*.wav 与同名 *.txt 参考文本（默认 fixtures/asr）")
+    p.set_defaults(func=bench_quantize)
+
+    p = sub.add_parser("compiled", help="编码器编译模式各长度桶的加速比")
+    p.add_argument("--mode", choices=["compile", "trace"], default="compile")
+    p.add_argument("--buckets", type=int, nargs="+", default=[64, 128, 256, 512])
+    p.set_defaults(func=bench_compiled)
+
+    p = sub.add_parser("padding", help="长度分桶组批的 padding 效率模拟（不加载模型）")
+    p.add_argument("--segments", type=int, default=2000)
+    p.add_argument("--batch", type=int, default=8, help="调度器每次收集的语音段数")
+    p.add_argument("--median", type=float, default=3.0, help="语音段时长中位数（秒）")
+    p.add_argument("--max-seconds", type=float, default=15.0)
+    p.add_argument("--edges", type=float, nargs="*", default=[3.0, 6.0, 12.0], help="长度桶上界（秒）")
+    p.add_argument("--waste", type=float, nargs="+", default=[0.1, 0.3, 0.5], help="padding 浪费上限")
+    p.set_defaults(func=bench_padding)
+
+    p = sub.add_parser("sdpa", help="自注意力 SDPA 路径的一致性与加速比")
+    p.add_argument("--frames", type=int, nargs="+", default=[100, 250, 500, 1000])
+    p.add_argument("--batch", type=int, default=2)
+    p.set_defaults(func=bench_sdpa)
+
+    p = sub.add_parser("maskfree", help="单条无 padding 输入跳过掩码的快速路径")
+    p.add_argument("--frames", type=int, nargs="+", default=[30, 60, 120, 250])
+    p.set_defaults(func=bench_maskfree)
+
+    p = sub.add_parser("ctc", help="融合 CTC 解码与 log_softmax + 逐条解码的对比")
+    p.add_argument("--seconds", type=float, nargs="+", default=[1.0, 3.0, 6.0, 15.0])
+    p.add_argument("--batch", type=int, default=1)
+    p.set_defaults(func=bench_ctc)
+
+    p = sub.add_parser("bf16", help="编码器 bf16 autocast 的 CER 与吞吐对比")
+    p.add_argument("--fixtures", type=str, default=DEFAULT_FIXTURES, help="测试集目录：*.wav 与同名 *.txt 参考文本（默认 fixtures/asr）")
+    p.set_defaults(func=bench_bf16)
+
+    p = sub.add_parser("threads", help="识别与翻译并发时，线程预算对 ASR 尾延迟的影响")
+    p.add_argument("--seconds", type=float, nargs="+", default=[1.5, 3.0, 6.0])
+    p.add_argument("--count", type=int, default=4)
+    p.add_argument("--cores", type=int, default=None, help="参与分配的核心数（默认取 CPU 亲和性）")
+    p.set_defaults(func=bench_threads)
+
+    p = sub.add_parser("translate-cache", help="译文 LRU 缓存在重复字幕上的命中率与翻译耗时")
+    p.add_argument("--sentences", type=int, default=200)
+    p.add_argument("--repeat-ratio", type=float, default=0.4, help="回放中常用短句所占比例")
+    p.add_argument("--cache-size", type=int, default=4096)
+    p.set_defaults(func=bench_translate_cache)
+
+    p = sub.add_parser("codec", help="上传音频编码的网络流量与解码开销")
+    p.add_argument("--seconds", type=float, default=60.0)
+    p.add_argument("--frame-ms", type=int, default=500, help="采集端每帧时长（毫秒）")
+    p.set_defaults(func=bench_codec)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
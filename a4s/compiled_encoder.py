@@ -0,0 +1,101 @@
+# a4s/compiled_encoder.py
+# 编码器 + CTC 头的编译模式（torch.compile 或 TorchScript trace）
+# 输入按帧数补齐到少量固定的长度桶，只在启动预热时编译（桶数 × 预热批大小数 份图）；
+# 超出最大桶、批大小未预热、编译或运行失败时回退到 eager，识别不中断
+import time
+from collections import Counter
+import torch
+from loguru import logger
+from onnx_backend import EncoderCtc
+
+# 含 4 帧 prompt 的 LFR 帧数（60ms/帧）：约 3.6s / 7.4s / 15s / 30s
+DEFAULT_BUCKETS = (64, 128, 256, 512)
+SUPPORTED_MODES = ("compile", "trace")
+
+
+class CompiledEncoderBackend:
+    """可赋给 SenseVoiceSmall.encode_backend 的编译版编码器 + CTC 头
+
+    - mode="compile": torch.compile(dynamic=False)，每个 (桶, 批大小) 一份图
+    - mode="trace":   每个 (桶, 批大小) 一份 torch.jit.trace + optimize_for_inference
+    补齐的帧由长度掩码屏蔽（与批内 padding 相同），输出截回原帧数，结果与 eager 一致。
+    编译一个形状要数秒到数分钟，推理时从不现场编译：未经 warmup() 的形状直接走 eager。
+    """
+
+    def __init__(self, model, buckets=DEFAULT_BUCKETS, mode="compile"):
+        if mode not in SUPPORTED_MODES:
+            raise ValueError(f"不支持的编译模式: {mode}")
+        self.wrapper = EncoderCtc(model).eval()
+        self.dim = model.embed.embedding_dim
+        self.buckets = sorted(buckets)
+        self.mode = mode
+        self._compiled = {}     # (桶, 批大小) → 编译后的可调用对象；None 表示编译/运行失败，该形状走 eager
+        self._compile_fn = torch.compile(self.wrapper, dynamic=False) if mode == "compile" else None
+        self.calls = Counter()  # 桶 → 调用次数，"eager" 为回退次数
+        self.build_seconds = {}
+
+    def bucket(self, frames):
+        for b in self.buckets:
+            if frames <= b:
+                return b
+        return None
+
+    def _build(self, bucket, batch_size):
+        speech = torch.zeros(batch_size, bucket, self.dim)
+        speech_lengths = torch.full((batch_size,), bucket, dtype=torch.int32)
+        with torch.no_grad():
+            if self.mode == "trace":
+                fn = torch.jit.optimize_for_inference(torch.jit.trace(self.wrapper, (speech.clone(), speech_lengths)))
+            else:
+                fn = self._compile_fn
+            # trace 的前几次调用还会做图优化，compile 首次调用才真正编译，都在这里完成
+            for _ in range(2):
+                fn(speech.clone(), speech_lengths)
+        return fn
+
+    def build(self, bucket, batch_size):
+        key = (bucket, batch_size)
+        if key not in self._compiled:
+            start_time = time.time()
+            try:
+                self._compiled[key] = self._build(bucket, batch_size)
+                self.build_seconds[key] = time.time() - start_time
+                logger.info(f"[compiled] {self.mode} 桶 {bucket} 帧 x {batch_size} 编译完成: {self.build_seconds[key]:.1f}s")
+            except Exception as e:
+                logger.warning(f"[compiled] {self.mode} 桶 {bucket} 帧 x {batch_size} 编译失败，该形状回退 eager: {e}")
+                self._compiled[key] = None
+        return self._compiled[key]
+
+    def warmup(self, batch_sizes=(1,)):
+        """启动时编译各长度桶，返回编译成功的形状数"""
+        if self.mode == "compile":
+            # 每个形状一份图，放宽 dynamo 的重编译上限，避免超过后静默退回 eager
+            limit = len(self.buckets) * len(batch_sizes)
+            for name in ("recompile_limit", "cache_size_limit"):
+                if hasattr(torch._dynamo.config, name):
+                    setattr(torch._dynamo.config, name, max(getattr(torch._dynamo.config, name), limit))
+        return sum(self.build(b, n) is not None for b in self.buckets for n in batch_sizes)
+
+    def __call__(self, speech, speech_lengths):
+        batch_size, frames, _ = speech.size()
+        bucket = self.bucket(frames)
+        fn = self._compiled.get((bucket, batch_size)) if bucket is not None else None
+        if fn is not None:
+            try:
+                padded = torch.nn.functional.pad(speech, (0, 0, 0, bucket - frames))
+                ctc_logits, encoder_out_lens = fn(padded, speech_lengths.to(torch.int32))
+                self.calls[bucket] += 1
+                return ctc_logits[:, :frames], encoder_out_lens
+            except Exception as e:
+                logger.warning(f"[compiled] 桶 {bucket} 帧 x {batch_size} 运行失败，该形状改用 eager: {e}")
+                self._compiled[(bucket, batch_size)] = None
+        self.calls["eager"] += 1
+        return self.wrapper(speech, speech_lengths)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "compiled": sorted(k for k, v in self._compiled.items() if v is not None),
+            "failed": sorted(k for k, v in self._compiled.items() if v is None),
+            "calls": dict(self.calls),
+        }
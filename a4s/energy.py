@@ -0,0 +1,77 @@
+# a4s/energy.py
+# 基于短时能量的轻量音频分析（纯 numpy 向量化，不调用模型）
+import numpy as np
+
+
+def frame_rms(samples, frame_size):
+    """按 frame_size 分帧计算 RMS，末尾不足一帧的部分丢弃"""
+    n = len(samples) // frame_size
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[:n * frame_size], dtype=np.float32).reshape(n, frame_size)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def lowest_energy_offset(samples, frame_size):
+    """返回 samples 中能量最低的一帧的中心位置（相对 samples 起点的样本数）"""
+    rms = frame_rms(samples, frame_size)
+    if len(rms) == 0:
+        return len(samples) // 2
+    return int(np.argmin(rms)) * frame_size + frame_size // 2
+
+
+class EnergyGate:
+    """VAD 之前的 RMS/峰值能量门，带滞回
+
+    - 块内最大帧 RMS 低于 close_dbfs 且峰值低于 peak_dbfs 视为明显静音
+    - 连续 hangover 个静音块后关门（gated），之后的静音块可以跳过 VAD
+    - 任意帧 RMS 高于 open_dbfs 或峰值高于 peak_dbfs 立即开门；介于两个阈值之间保持原状态
+    update(chunk) 返回该块是否需要送入 VAD。
+    """
+
+    def __init__(self, open_dbfs=-45.0, close_dbfs=-55.0, peak_dbfs=-35.0, hangover=3, frame_size=320):
+        self.open_rms = 10 ** (open_dbfs / 20)
+        self.close_rms = 10 ** (close_dbfs / 20)
+        self.peak = 10 ** (peak_dbfs / 20)
+        self.hangover = hangover
+        self.frame_size = frame_size
+        self.gated = False
+        self.silent_run = 0
+        self.chunks = 0
+        self.skipped = 0
+        self.opened = 0
+        self.closed = 0
+
+    def update(self, chunk):
+        self.chunks += 1
+        rms = frame_rms(chunk, self.frame_size)
+        level = float(rms.max()) if len(rms) else 0.0
+        peak = float(np.abs(chunk).max()) if len(chunk) else 0.0
+
+        if level > self.open_rms or peak > self.peak:
+            self.silent_run = 0
+            if self.gated:
+                self.gated = False
+                self.opened += 1
+            return True
+        if level < self.close_rms:
+            self.silent_run += 1
+            if not self.gated and self.silent_run >= self.hangover:
+                self.gated = True
+                self.closed += 1
+        else:
+            self.silent_run = 0
+        if self.gated:
+            self.skipped += 1
+            return False
+        return True
+
+    def stats(self):
+        return {
+            "gated": self.gated,
+            "chunks": self.chunks,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.chunks, 3) if self.chunks else 0.0,
+            "opened": self.opened,
+            "closed": self.closed,
+        }
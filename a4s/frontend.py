@@ -0,0 +1,104 @@
+# a4s/frontend.py
+# 增量 fbank 前端：音频到达时就计算 fbank 帧并按环形缓冲区位置缓存，
+# VAD 切出语音段后只需做 LFR 拼帧和 CMVN，特征提取不再压在“语音结束 → 出字幕”的关键路径上
+import numpy as np
+import torch
+from funasr.utils import fbank as kaldi
+from funasr.frontends.wav_frontend import apply_cmvn, apply_lfr
+
+
+class IncrementalFbank:
+    """与 AudioRingBuffer 绑定的增量 fbank 计算与缓存
+
+    - 帧网格以环形缓冲区绝对序号 0 为原点：第 k 帧覆盖 [k * shift, k * shift + win)。
+      kaldi fbank（snip_edges=True）的每一帧只依赖自己窗口内的样本，所以起点落在网格上的语音段，
+      其特征正好是缓存中的连续若干帧，与整段重新计算一致
+    - advance() 计算所有窗口已完整到达的新帧；features(beg, end) 取出一段的帧，
+      缺失的部分（例如能量门跳过、已被淘汰的区间）当场从环形缓冲区补算
+    - 参数（窗长、帧移、梅尔数、LFR、CMVN 等）全部取自 ASR 模型的 frontend 对象
+
+    非线程安全：advance() 和 features() 应在同一个线程（VAD 执行器）中调用。
+    """
+
+    def __init__(self, frontend, ring, capacity_frames=None):
+        self.frontend = frontend
+        self.ring = ring
+        self.shift = int(frontend.fs * frontend.frame_shift / 1000)
+        self.win = int(frontend.fs * frontend.frame_length / 1000)
+        self.capacity = capacity_frames or ring.capacity // self.shift
+        self._frames = np.zeros((self.capacity, frontend.n_mels), dtype=np.float32)
+        self.first = 0      # 缓存中最早的有效帧号
+        self.next = 0       # 下一个待计算的帧号
+        self.computed = 0   # 增量计算的帧数
+        self.recomputed = 0 # features() 时补算的帧数
+
+    def aligned(self, pos):
+        return pos % self.shift == 0
+
+    def _fbank(self, k0, k1):
+        """直接从环形缓冲区计算第 [k0, k1) 帧"""
+        wav = self.ring.view(k0 * self.shift, (k1 - 1) * self.shift + self.win)
+        if len(wav) < (k1 - k0 - 1) * self.shift + self.win:
+            return None
+        waveform = torch.from_numpy(np.array(wav, dtype=np.float32))
+        if self.frontend.upsacle_samples:
+            waveform = waveform * (1 << 15)
+        mat = kaldi.fbank(
+            waveform[None, :],
+            num_mel_bins=self.frontend.n_mels,
+            frame_length=self.frontend.frame_length,
+            frame_shift=self.frontend.frame_shift,
+            dither=self.frontend.dither,
+            energy_floor=0.0,
+            window_type=self.frontend.window,
+            sample_frequency=self.frontend.fs,
+            snip_edges=True,
+        )
+        return mat.numpy()
+
+    def advance(self):
+        """计算窗口已完整写入的所有新帧，返回新增帧数"""
+        base_frame = -(-self.ring.base // self.shift)
+        if self.next < base_frame:
+            # 静音期间缓冲区已丢弃的部分不再计算
+            self.next = self.first = base_frame
+        end_frame = (self.ring.write_pos - self.win) // self.shift + 1
+        if end_frame <= self.next:
+            return 0
+        mat = self._fbank(self.next, end_frame)
+        if mat is None:
+            return 0
+        for i, k in enumerate(range(self.next, end_frame)):
+            self._frames[k % self.capacity] = mat[i]
+        self.next = end_frame
+        self.first = max(self.first, self.next - self.capacity)
+        self.computed += len(mat)
+        return len(mat)
+
+    def _fbank_frames(self, k0, k1):
+        if k0 >= self.first and k1 <= self.next:
+            idx = np.arange(k0, k1) % self.capacity
+            return self._frames[idx]
+        mat = self._fbank(k0, k1)
+        if mat is not None:
+            self.recomputed += len(mat)
+        return mat
+
+    def features(self, beg, end):
+        """语音段 [beg, end) 的 LFR + CMVN 特征 (T, D)；起点不在帧网格上或音频已不可用时返回 None"""
+        if not self.aligned(beg) or end - beg < self.win:
+            return None
+        k0 = beg // self.shift
+        k1 = k0 + (end - beg - self.win) // self.shift + 1
+        mat = self._fbank_frames(k0, k1)
+        if mat is None:
+            return None
+        feats = torch.from_numpy(np.array(mat, dtype=np.float32))
+        if self.frontend.lfr_m != 1 or self.frontend.lfr_n != 1:
+            feats = apply_lfr(feats, self.frontend.lfr_m, self.frontend.lfr_n)
+        if self.frontend.cmvn is not None:
+            feats = apply_cmvn(feats, self.frontend.cmvn)
+        return feats
+
+    def stats(self):
+        return {"computed_frames": self.computed, "recomputed_frames": self.recomputed}
@@ -46,10 +46,48 @@ class SinusoidalPositionEncoder(torch.nn.Module):
         encoding = torch.cat([torch.sin(scaled_time), torch.cos(scaled_time)], dim=2)
         return encoding.type(dtype)
 
+    # Initial size of the cached table, in frames (1024 LFR frames ~ 61 s of audio)
+    table_size = 1024
+
+    def table(self, end, depth, dtype, device):
+        """Encodings of positions 1..end as a (1, end, depth) view of a cached table.
+
+        The table is built once per (depth, dtype, device) with encode() and doubled when
+        a longer input arrives, so each row equals what encode() gives for that position.
+        """
+        cached = getattr(self, "_table", None)
+        if (
+            cached is None
+            or cached.size(1) < end
+            or cached.size(2) != depth
+            or cached.dtype != dtype
+            or cached.device != torch.device(device)
+        ):
+            size = self.table_size
+            if cached is not None and cached.size(2) == depth:
+                size = max(size, cached.size(1))
+            while size < end:
+                size *= 2
+            positions = torch.arange(1, size + 1, device=device)[None, :]
+            cached = self.encode(positions, depth, dtype).to(device)
+            self._table = cached
+        return cached[:, :end]
+
     def forward(self, x):
         batch_size, timesteps, input_dim = x.size()
-        positions = torch.arange(1, timesteps + 1, device=x.device)[None, :]
-        position_encoding = self.encode(positions, input_dim, x.dtype).to(x.device)
+        if torch.jit.is_tracing():
+            # A cached table would be baked into the traced graph as a fixed-size constant
+            positions = torch.arange(1, timesteps + 1, device=x.device)[None, :]
+            position_encoding = self.encode(positions, input_dim, x.dtype).to(x.device)
+        else:
+            position_encoding = self.table(timesteps, input_dim, x.dtype, x.device)
+
+        return x + position_encoding
+
+    def forward_chunk(self, x, start_idx=0):
+        """Add position encoding to a chunk whose first frame is at absolute index start_idx."""
+        batch_size, timesteps, input_dim = x.size()
+        position_encoding = self.table(start_idx + timesteps, input_dim, x.dtype, x.device)[:, start_idx:]
 
         return x + position_encoding
 
@@ -87,6 +125,10 @@ class MultiHeadedAttentionSANM(nn.Module):
 
     """
 
+    # Use torch's fused scaled_dot_product_attention instead of matmul/masked_fill/softmax/matmul
+    # (no materialized (B, H, T, T) scores on the fused kernels); can be turned off per instance
+    use_sdpa = hasattr(torch.nn.functional, "scaled_dot_product_attention")
+
     def __init__(
         self,
         n_head,
@@ -210,6 +252,24 @@ class MultiHeadedAttentionSANM(nn.Module):
 
         return self.linear_out(x)  # (batch, time1, d_model)
 
+    def forward_attention_sdpa(self, q_h, k_h, v_h, mask, mask_att_chunk_encoder=None):
+        """Same as scaling q, matmul and forward_attention, through scaled_dot_product_attention.
+
+        Masked keys get zero weight either way; a query row has at least one valid key unless
+        its utterance is empty, so the -inf + masked_fill(0) of the manual path never differs.
+        """
+        n_batch = v_h.size(0)
+        attn_mask = None
+        if mask is not None:
+            if mask_att_chunk_encoder is not None:
+                mask = mask * mask_att_chunk_encoder
+            attn_mask = mask.unsqueeze(1).bool()  # (batch, 1, *, time2), True = attend
+        x = torch.nn.functional.scaled_dot_product_attention(
+            q_h, k_h, v_h, attn_mask=attn_mask, dropout_p=self.dropout.p if self.training else 0.0
+        )  # (batch, head, time1, d_k)
+        x = x.transpose(1, 2).reshape(n_batch, -1, self.h * self.d_k)  # (batch, time1, d_model)
+        return self.linear_out(x)
+
     def forward(self, x, mask, mask_shfit_chunk=None, mask_att_chunk_encoder=None):
         """Compute scaled dot product attention.
 
@@ -226,6 +286,9 @@ class MultiHeadedAttentionSANM(nn.Module):
         """
         q_h, k_h, v_h, v = self.forward_qkv(x)
         fsmn_memory = self.forward_fsmn(v, mask, mask_shfit_chunk)
+        if self.use_sdpa:
+            att_outs = self.forward_attention_sdpa(q_h, k_h, v_h, mask, mask_att_chunk_encoder)
+            return att_outs + fsmn_memory
         q_h = q_h * self.d_k ** (-0.5)
         scores = torch.matmul(q_h, k_h.transpose(-2, -1))
         att_outs = self.forward_attention(v_h, scores, mask, mask_att_chunk_encoder)
@@ -247,9 +310,11 @@ class MultiHeadedAttentionSANM(nn.Module):
         """
         q_h, k_h, v_h, v = self.forward_qkv(x)
         if chunk_size is not None and look_back > 0 or look_back == -1:
+            # frames in the right look-ahead (chunk_size[2]) are recomputed with the next chunk
+            stride = k_h.size(2) - chunk_size[2]
             if cache is not None:
-                k_h_stride = k_h[:, :, : -(chunk_size[2]), :]
-                v_h_stride = v_h[:, :, : -(chunk_size[2]), :]
+                k_h_stride = k_h[:, :, :stride, :]
+                v_h_stride = v_h[:, :, :stride, :]
                 k_h = torch.cat((cache["k"], k_h), dim=2)
                 v_h = torch.cat((cache["v"], v_h), dim=2)
 
@@ -260,8 +325,8 @@ class MultiHeadedAttentionSANM(nn.Module):
                     cache["v"] = cache["v"][:, :, -(look_back * chunk_size[1]) :, :]
             else:
                 cache_tmp = {
-                    "k": k_h[:, :, : -(chunk_size[2]), :],
-                    "v": v_h[:, :, : -(chunk_size[2]), :],
+                    "k": k_h[:, :, :stride, :],
+                    "v": v_h[:, :, :stride, :],
                 }
                 cache = cache_tmp
         fsmn_memory = self.forward_fsmn(v, None)
@@ -286,6 +351,11 @@ class LayerNorm(nn.LayerNorm):
         return output.type_as(input)
 
 
+def is_compiling():
+    compiler = getattr(torch, "compiler", None)
+    return compiler is not None and hasattr(compiler, "is_compiling") and compiler.is_compiling()
+
+
 def sequence_mask(lengths, maxlen=None, dtype=torch.float32, device=None):
     if maxlen is None:
         maxlen = lengths.max()
@@ -546,16 +616,31 @@ class SenseVoiceEncoderSmall(nn.Module):
 
         self.tp_norm = LayerNorm(output_size)
 
+    # Skip building/applying masks when no utterance in the batch is padded (live captions:
+    # batch 1); masks of all ones change nothing in fsmn or attention
+    mask_free_fast_path = True
+
     def output_size(self) -> int:
         return self._output_size
 
+    def is_unpadded(self, xs_pad, ilens):
+        if not self.mask_free_fast_path or torch.jit.is_tracing() or is_compiling():
+            # A traced/compiled graph must keep the masked path for padded batches
+            return False
+        return bool((ilens == xs_pad.size(1)).all())
+
     def forward(
         self,
         xs_pad: torch.Tensor,
         ilens: torch.Tensor,
     ):
         """Embed positions in tensor."""
-        masks = sequence_mask(ilens, device=ilens.device)[:, None, :]
+        if self.is_unpadded(xs_pad, ilens):
+            masks = None
+        else:
+            # Mask sized to the input (not ilens.max()) so inputs padded past the longest utterance
+            # (e.g. to a compiled length bucket) stay consistent
+            masks = sequence_mask(ilens, maxlen=xs_pad.size(1), device=ilens.device)[:, None, :]
 
         xs_pad *= self.output_size() ** 0.5
 
@@ -573,7 +658,7 @@ class SenseVoiceEncoderSmall(nn.Module):
         xs_pad = self.after_norm(xs_pad)
 
         # forward encoder2
-        olens = masks.squeeze(1).sum(1).int()
+        olens = ilens.int() if masks is None else masks.squeeze(1).sum(1).int()
 
         for layer_idx, encoder_layer in enumerate(self.tp_encoders):
             encoder_outs = encoder_layer(xs_pad, masks)
@@ -582,6 +667,46 @@ class SenseVoiceEncoderSmall(nn.Module):
         xs_pad = self.tp_norm(xs_pad)
         return xs_pad, olens
 
+    def init_chunk_cache(self, chunk_size=(0, 10, 0), look_back=-1):
+        """Create the streaming state used by forward_chunk.
+
+        Args:
+            chunk_size: (left, chunk, right) frames; right frames are treated as look-ahead.
+            look_back: number of previous chunks kept in the k/v cache, -1 keeps all.
+        """
+        num_layers = len(self.encoders0) + len(self.encoders) + len(self.tp_encoders)
+        return {
+            "start_idx": 0,
+            "chunk_size": list(chunk_size),
+            "look_back": look_back,
+            "layers": [None] * num_layers,
+        }
+
+    def forward_chunk(self, xs_pad: torch.Tensor, cache: dict):
+        """Encode one chunk of features, attending to previous chunks through the k/v cache.
+
+        The FSMN memory only sees the current chunk, so outputs near chunk borders are an
+        approximation of the full-utterance forward; use forward for the final result.
+        """
+        xs_pad = xs_pad * self.output_size() ** 0.5
+        xs_pad = self.embed.forward_chunk(xs_pad, cache["start_idx"])
+        cache["start_idx"] += xs_pad.size(1)
+
+        layers = list(self.encoders0) + list(self.encoders)
+        for layer_idx, encoder_layer in enumerate(layers):
+            xs_pad, cache["layers"][layer_idx] = encoder_layer.forward_chunk(
+                xs_pad, cache["layers"][layer_idx], cache["chunk_size"], cache["look_back"]
+            )
+        xs_pad = self.after_norm(xs_pad)
+
+        for layer_idx, encoder_layer in enumerate(self.tp_encoders, start=len(layers)):
+            xs_pad, cache["layers"][layer_idx] = encoder_layer.forward_chunk(
+                xs_pad, cache["layers"][layer_idx], cache["chunk_size"], cache["look_back"]
+            )
+
+        xs_pad = self.tp_norm(xs_pad)
+        return xs_pad
+
 
 @tables.register("model_classes", "SenseVoiceSmall")
 class SenseVoiceSmall(nn.Module):
@@ -644,6 +769,15 @@ class SenseVoiceSmall(nn.Module):
         self.embed = torch.nn.Embedding(
             7 + len(self.lid_dict) + len(self.textnorm_dict), input_size
         )
+        # Optional replacement for encoder + CTC head at inference (e.g. onnx_backend.OnnxEncoderBackend):
+        # called as backend(speech_with_prompt, lengths) -> (ctc log-probs, encoder_out_lens)
+        self.encode_backend = None
+        # Reduced-precision autocast for the encoder at inference (e.g. torch.bfloat16 on CPU);
+        # the CTC head and decoding stay fp32
+        self.encoder_autocast_dtype = None
+        # prompt_query results for inference, keyed by (language id, textnorm id, device)
+        self._prompt_cache = {}
+        self._prompt_cache_version = None
         self.emo_dict = {
             "unk": 25009,
             "happy": 25001,
@@ -847,42 +981,124 @@ class SenseVoiceSmall(nn.Module):
         speech = speech.to(device=kwargs["device"])
         speech_lengths = speech_lengths.to(device=kwargs["device"])
 
-        language = kwargs.get("language", "auto")
-        language_query = self.embed(
-            torch.LongTensor([[self.lid_dict[language] if language in self.lid_dict else 0]]).to(
-                speech.device
-            )
-        ).repeat(speech.size(0), 1, 1)
+        ctc_logits, encoder_out_lens = self.encode_with_prompt(speech, speech_lengths, **kwargs)
+
+        ibest_writer = None
+        if kwargs.get("output_dir") is not None:
+            if not hasattr(self, "writer"):
+                self.writer = DatadirWriter(kwargs.get("output_dir"))
+            ibest_writer = self.writer[f"1best_recog"]
+        results = self.decode_ctc(ctc_logits, encoder_out_lens, key, tokenizer, ibest_writer)
+        return results, meta_data
+
+    def prompt_query(self, language="auto", use_itn=False, device="cpu", text_norm=None):
+        """The (1, 4, D) query prepended to the fbank frames: language, event, emotion, textnorm.
 
-        use_itn = kwargs.get("use_itn", False)
-        textnorm = kwargs.get("text_norm", None)
+        Under no_grad the result is cached per (language, textnorm, device); the cache is
+        dropped whenever the embedding weights change (in-place updates such as
+        load_state_dict bump the tensor version, .to()/.half() change device/dtype).
+        """
+        lid = self.lid_dict[language] if language in self.lid_dict else 0
+        textnorm = text_norm
         if textnorm is None:
             textnorm = "withitn" if use_itn else "woitn"
-        textnorm_query = self.embed(
-            torch.LongTensor([[self.textnorm_dict[textnorm]]]).to(speech.device)
-        ).repeat(speech.size(0), 1, 1)
-        speech = torch.cat((textnorm_query, speech), dim=1)
-        speech_lengths += 1
-
-        event_emo_query = self.embed(torch.LongTensor([[1, 2]]).to(speech.device)).repeat(
-            speech.size(0), 1, 1
+        textnorm_id = self.textnorm_dict[textnorm]
+        if torch.is_grad_enabled():
+            return self.build_prompt_query(lid, textnorm_id, device)
+
+        weight = self.embed.weight
+        version = (weight._version, weight.dtype, weight.device)
+        if self._prompt_cache_version != version:
+            self._prompt_cache.clear()
+            self._prompt_cache_version = version
+        key = (lid, textnorm_id, str(torch.device(device)))
+        prompt = self._prompt_cache.get(key)
+        if prompt is None:
+            prompt = self.build_prompt_query(lid, textnorm_id, device)
+            self._prompt_cache[key] = prompt
+        return prompt
+
+    def build_prompt_query(self, lid, textnorm_id, device="cpu"):
+        ids = torch.LongTensor([[lid, 1, 2, textnorm_id]]).to(device)
+        return self.embed(ids)
+
+    def encode_with_prompt(self, speech, speech_lengths, log_probs=True, **kwargs):
+        """Prepend the prompt query, run the encoder and return (ctc log-probs, lengths).
+
+        log_probs=False skips the full-vocabulary log_softmax and ban_emo_unk and returns raw
+        CTC logits for decode_ctc_fused (an encode_backend always returns log-probs, which
+        decode_ctc_fused accepts as well).
+        """
+        prompt = self.prompt_query(
+            kwargs.get("language", "auto"),
+            kwargs.get("use_itn", False),
+            speech.device,
+            kwargs.get("text_norm", None),
         )
-        input_query = torch.cat((language_query, event_emo_query), dim=1)
-        speech = torch.cat((input_query, speech), dim=1)
-        speech_lengths += 3
+        speech = torch.cat((prompt.repeat(speech.size(0), 1, 1), speech), dim=1)
+        speech_lengths = speech_lengths + prompt.size(1)
 
-        # Encoder
-        encoder_out, encoder_out_lens = self.encoder(speech, speech_lengths)
-        if isinstance(encoder_out, tuple):
-            encoder_out = encoder_out[0]
+        if self.encode_backend is not None:
+            ctc_logits, encoder_out_lens = self.encode_backend(speech, speech_lengths)
+        else:
+            # Encoder
+            if self.encoder_autocast_dtype is not None:
+                with torch.autocast(speech.device.type, dtype=self.encoder_autocast_dtype):
+                    encoder_out, encoder_out_lens = self.encoder(speech, speech_lengths)
+            else:
+                encoder_out, encoder_out_lens = self.encoder(speech, speech_lengths)
+            if isinstance(encoder_out, tuple):
+                encoder_out = encoder_out[0]
+            encoder_out = encoder_out.float()
+
+            # c. Passed the encoder result and the beam search
+            if log_probs or self.ctc.ctc_lo is None:
+                ctc_logits = self.ctc.log_softmax(encoder_out)
+            else:
+                ctc_logits = self.ctc.ctc_lo(encoder_out)
+        if log_probs and kwargs.get("ban_emo_unk", False):
+            ctc_logits[:, :, self.emo_dict["unk"]] = -float("inf")
+        return ctc_logits, encoder_out_lens
 
-        # c. Passed the encoder result and the beam search
-        ctc_logits = self.ctc.log_softmax(encoder_out)
-        if kwargs.get("ban_emo_unk", False):
+    def decode_ctc_fused(self, ctc_logits, encoder_out_lens, key, tokenizer, ban_emo_unk=False):
+        """Vectorized greedy CTC decoding straight from logits; same results as decode_ctc.
+
+        argmax of the logits equals argmax of log_softmax, and the best frame log-prob is
+        max - logsumexp, so the (B, T, V) log_softmax output is never materialized. Repeat
+        collapsing, blank removal and avg_logprob are computed for the whole batch at once.
+        """
+        b, t, _ = ctc_logits.size()
+        if isinstance(key[0], (list, tuple)):
+            key = key[0]
+        if len(key) < b:
+            key = key * b
+        lse = torch.logsumexp(ctc_logits, dim=-1)  # (B, T), includes a banned token like log_softmax does
+        if ban_emo_unk:
+            ctc_logits = ctc_logits.clone()
             ctc_logits[:, :, self.emo_dict["unk"]] = -float("inf")
+        best, yseq = ctc_logits.max(dim=-1)  # (B, T)
+        lens = encoder_out_lens.to(yseq.device).long()
+        valid = torch.arange(t, device=yseq.device)[None, :] < lens[:, None]
+        avg_logprob = ((best - lse) * valid).sum(dim=1) / lens.clamp(min=1)
+
+        changed = torch.ones_like(valid)
+        changed[:, 1:] = yseq[:, 1:] != yseq[:, :-1]
+        keep = changed & valid & (yseq != self.blank_id)
+        tokens = yseq[keep].tolist()
+        counts = keep.sum(dim=1).tolist()
+        avg_logprob = avg_logprob.tolist()
+
+        results, offset = [], 0
+        for i in range(b):
+            token_int = tokens[offset : offset + counts[i]]
+            offset += counts[i]
+            results.append({"key": key[i], "text": tokenizer.decode(token_int), "avg_logprob": avg_logprob[i]})
+        return results
 
+    def decode_ctc(self, ctc_logits, encoder_out_lens, key, tokenizer, ibest_writer=None):
+        """Greedy CTC decoding of each utterance in the batch."""
         results = []
-        b, n, d = encoder_out.size()
+        b = ctc_logits.size(0)
         if isinstance(key[0], (list, tuple)):
             key = key[0]
         if len(key) < b:
@@ -892,12 +1108,6 @@ class SenseVoiceSmall(nn.Module):
             yseq = x.argmax(dim=-1)
             yseq = torch.unique_consecutive(yseq, dim=-1)
 
-            ibest_writer = None
-            if kwargs.get("output_dir") is not None:
-                if not hasattr(self, "writer"):
-                    self.writer = DatadirWriter(kwargs.get("output_dir"))
-                ibest_writer = self.writer[f"1best_recog"]
-
             mask = yseq != self.blank_id
             token_int = yseq[mask].tolist()
 
@@ -913,7 +1123,52 @@ class SenseVoiceSmall(nn.Module):
             if ibest_writer is not None:
                 ibest_writer["text"][key[i]] = text
 
-        return results, meta_data
+        return results
+
+    def runner(self, frontend, tokenizer, device="cpu"):
+        """A SenseVoiceRunner sharing this model's weights, frontend and tokenizer."""
+        return SenseVoiceRunner(self, frontend, tokenizer, device)
+
+    def init_stream_cache(self, language="auto", use_itn=False, device="cpu", **kwargs):
+        """Create the state for inference_chunk (one per utterance being streamed)."""
+        return {
+            "prompt": self.prompt_query(language, use_itn, device, kwargs.get("text_norm", None)),
+            "encoder": self.encoder.init_chunk_cache(
+                kwargs.get("chunk_size", (0, 10, 0)), kwargs.get("look_back", -1)
+            ),
+            "yseq": [],
+            "fed_frames": 0,
+            "device": device,
+        }
+
+    def inference_chunk(self, speech, cache, tokenizer=None, **kwargs):
+        """Streaming greedy CTC decoding of newly arrived fbank frames.
+
+        Args:
+            speech: (1, T, D) LFR fbank frames that follow the frames already fed.
+            cache: state from init_stream_cache, updated in place.
+
+        Returns:
+            dict with the partial hypothesis of everything fed so far.
+        """
+        # cache["prompt"] is consumed by the first chunk, so the device lives in the state
+        speech = speech.to(device=kwargs.get("device") or cache["device"])
+        if len(speech.shape) < 3:
+            speech = speech[None, :, :]
+        cache["fed_frames"] += speech.size(1)
+        if cache["prompt"] is not None:
+            speech = torch.cat((cache["prompt"], speech), dim=1)
+            cache["prompt"] = None
+
+        encoder_out = self.encoder.forward_chunk(speech, cache["encoder"])
+        ctc_logits = self.ctc.ctc_lo(encoder_out)
+        if kwargs.get("ban_emo_unk", False):
+            ctc_logits[:, :, self.emo_dict["unk"]] = -float("inf")
+        cache["yseq"].append(ctc_logits[0].argmax(dim=-1))
+
+        yseq = torch.unique_consecutive(torch.cat(cache["yseq"]), dim=-1)
+        token_int = yseq[yseq != self.blank_id].tolist()
+        return {"text": tokenizer.decode(token_int) if tokenizer is not None else token_int}
 
     def export(self, **kwargs):
         from .export_meta import export_rebuild_model
@@ -927,3 +1182,70 @@ class SenseVoiceSmall(nn.Module):
         from funasr import AutoModel
         model, kwargs = AutoModel.build_model(model=model_dir, device=device, trust_remote_code=True)
         return model
+
+
+class SenseVoiceRunner:
+    """Lean inference entry for already-segmented live audio.
+
+    Skips AutoModel.generate / load_audio_text_image_video type dispatch: float32 numpy
+    segments go straight to the frontend one by one (no waveform padding); precomputed
+    features (a (B, T, D) tensor, or (T, D) tensors mixed into the list) are used as is.
+    Returns the same (results, meta_data) as SenseVoiceSmall.inference, with a per-stage
+    timing breakdown in meta_data.
+    """
+
+    def __init__(self, model, frontend, tokenizer, device="cpu"):
+        self.model = model
+        self.frontend = frontend
+        self.tokenizer = tokenizer
+        self.device = device
+
+    def extract(self, audios):
+        """fbank + LFR + CMVN for a list of segments -> padded (B, T, D), lengths.
+
+        Each item is either a float32 numpy waveform or its precomputed (T, D) features
+        (e.g. from the incremental frontend), which are used as is.
+        """
+        feats, lens = [], []
+        for audio in audios:
+            if isinstance(audio, torch.Tensor):
+                feat = audio if audio.dim() == 3 else audio[None, :, :]
+            else:
+                wav = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))[None, :]
+                feat, _ = self.frontend(wav, [wav.size(1)])
+            feats.append(feat[0])
+            lens.append(feat.size(1))
+        speech = torch.nn.utils.rnn.pad_sequence(feats, batch_first=True)
+        return speech, torch.tensor(lens, dtype=torch.int32)
+
+    def __call__(self, data, data_lengths=None, key=None, **kwargs):
+        meta_data = {}
+        time1 = time.perf_counter()
+        with torch.no_grad():
+            if isinstance(data, torch.Tensor):
+                speech = data if data.dim() == 3 else data[None, :, :]
+                speech_lengths = data_lengths
+                if speech_lengths is None:
+                    speech_lengths = torch.full((speech.size(0),), speech.size(1), dtype=torch.int32)
+            else:
+                if isinstance(data, np.ndarray):
+                    data = [data]
+                speech, speech_lengths = self.extract(data)
+            time2 = time.perf_counter()
+            meta_data["extract_feat"] = f"{time2 - time1:0.3f}"
+
+            speech = speech.to(device=self.device)
+            speech_lengths = speech_lengths.to(device=self.device)
+            ctc_logits, encoder_out_lens = self.model.encode_with_prompt(
+                speech, speech_lengths, log_probs=False, **kwargs
+            )
+            time3 = time.perf_counter()
+            meta_data["encode"] = f"{time3 - time2:0.3f}"
+
+            if key is None:
+                key = [f"segment_{i}" for i in range(speech.size(0))]
+            results = self.model.decode_ctc_fused(
+                ctc_logits, encoder_out_lens, key, self.tokenizer, kwargs.get("ban_emo_unk", False)
+            )
+            meta_data["decode"] = f"{time.perf_counter() - time3:0.3f}"
+        return results, meta_data
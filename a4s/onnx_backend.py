@@ -0,0 +1,102 @@
+# a4s/onnx_backend.py
+# SenseVoice 编码器 + CTC 头的 ONNX 导出与 onnxruntime CPU 推理后端
+# 只替换 encoder → ctc.log_softmax 这一段：前端（fbank/LFR/CMVN）、prompt query 和 CTC 解码仍走 model.py，
+# 因此后处理（贪心解码、去重、avg_logprob、ban_emo_unk）与 PyTorch 路径完全相同
+import inspect
+import os
+import time
+import numpy as np
+import torch
+from loguru import logger
+
+ONNX_FILENAME = "encoder_ctc.onnx"
+INPUT_NAMES = ["speech", "speech_lengths"]
+OUTPUT_NAMES = ["ctc_logits", "encoder_out_lens"]
+
+
+class EncoderCtc(torch.nn.Module):
+    """导出用的包装：已拼接 prompt query 的特征 (B, T, D) → (CTC log-probs, 编码长度)"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.encoder
+        self.ctc = model.ctc
+
+    def forward(self, speech, speech_lengths):
+        encoder_out, encoder_out_lens = self.encoder(speech, speech_lengths)
+        return self.ctc.log_softmax(encoder_out), encoder_out_lens
+
+
+def default_onnx_path(model_dir):
+    return os.path.join(model_dir, ONNX_FILENAME)
+
+
+def export_encoder_ctc(model, path, opset_version=17):
+    """把 SenseVoiceSmall 的编码器 + CTC 头导出为 ONNX（batch 和帧数为动态维度）"""
+    start_time = time.time()
+    wrapper = EncoderCtc(model).eval()
+    dim = model.embed.embedding_dim
+    speech = torch.randn(2, 40, dim)
+    speech_lengths = torch.tensor([40, 25], dtype=torch.int32)
+    dynamic_axes = {
+        "speech": {0: "batch", 1: "frames"},
+        "speech_lengths": {0: "batch"},
+        "ctc_logits": {0: "batch", 1: "frames"},
+        "encoder_out_lens": {0: "batch"},
+    }
+    # torch >= 2.5 的 export 才有 dynamo 参数（新版本默认走 dynamo 导出器）；这里固定用 TorchScript 导出器
+    export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, (speech, speech_lengths), tmp_path,
+            input_names=INPUT_NAMES, output_names=OUTPUT_NAMES,
+            dynamic_axes=dynamic_axes, opset_version=opset_version, **export_kwargs,
+        )
+    # 先写临时文件再改名，导出中断时不会留下半个模型
+    os.replace(tmp_path, path)
+    logger.info(f"[onnx] 编码器 + CTC 导出完成: {path}, {(time.time() - start_time) * 1000:.0f} ms")
+    return path
+
+
+class OnnxEncoderBackend:
+    """用 onnxruntime（CPU，全部图优化）执行导出的编码器 + CTC 头
+
+    可赋给 SenseVoiceSmall.encode_backend，之后 inference() / SenseVoiceRunner 都走 ORT。
+    """
+
+    def __init__(self, path, intra_op_threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, speech, speech_lengths):
+        ctc_logits, encoder_out_lens = self.session.run(OUTPUT_NAMES, {
+            "speech": speech.detach().cpu().numpy().astype(np.float32, copy=False),
+            "speech_lengths": speech_lengths.cpu().numpy().astype(np.int32, copy=False),
+        })
+        return torch.from_numpy(ctc_logits), torch.from_numpy(encoder_out_lens)
+
+
+def is_stale(onnx_path, model_dir):
+    """ONNX 文件不存在，或比模型权重旧（模型更新过）时需要重新导出"""
+    if not os.path.exists(onnx_path):
+        return True
+    weights = os.path.join(model_dir, "model.pt")
+    return os.path.exists(weights) and os.path.getmtime(weights) > os.path.getmtime(onnx_path)
+
+
+def load_onnx_backend(model, model_dir, path=None, intra_op_threads=0):
+    """按需导出并加载 ORT 后端，返回 OnnxEncoderBackend（尚未挂到模型上）"""
+    path = path or default_onnx_path(model_dir)
+    if is_stale(path, model_dir):
+        export_encoder_ctc(model, path)
+    start_time = time.time()
+    backend = OnnxEncoderBackend(path, intra_op_threads)
+    logger.info(f"[onnx] onnxruntime 会话加载完成: {path}, {(time.time() - start_time) * 1000:.0f} ms")
+    return backend
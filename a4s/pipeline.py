@@ -0,0 +1,178 @@
+# a4s/pipeline.py
+# 上传音频的分阶段处理流水线：ingest → VAD → ASR → translate → publish
+# 各阶段之间用有界队列衔接，耗时的模型调用放到专用线程池，asyncio 事件循环只负责调度和收发
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+# 每类模型一个单线程执行器：同一模型的调用串行执行，不同阶段之间可以并行
+# （例如第 N 段的翻译与第 N+1 段的识别同时进行）
+# ASR 由 asr_scheduler.AsrBatchScheduler 的工作线程负责，跨会话凑批后执行
+vad_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vad")
+translate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="translate")
+# 流式中间结果（partial）的增量编码，与批量 ASR 分开，避免互相排队
+stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream")
+
+_STOP = object()
+
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    """在指定线程池中执行阻塞函数，不占用事件循环"""
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        return await loop.run_in_executor(executor, lambda: fn(*args, **kwargs))
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+class StagedPipeline:
+    """由若干阶段串联而成的异步流水线
+
+    每个阶段是一个 async 处理函数，在独立协程中按顺序消费上游队列：
+    - 返回 None 表示该条数据到此为止（例如 VAD 块没有切出语音段）
+    - fan_out=True 的阶段返回列表，列表中的每一项分别送入下游
+    队列都是有界的，下游处理不过来时上游的 put 会等待，形成自然的反压。
+    """
+
+    def __init__(self, name, queue_size=4):
+        self.name = name
+        self.queue_size = queue_size
+        self._stages = []
+        self._queues = []
+        self._tasks = []
+        self.processed = {}
+
+    def add_stage(self, name, handler, fan_out=False):
+        self._stages.append((name, handler, fan_out))
+        self.processed[name] = 0
+        return self
+
+    def start(self):
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self._stages]
+        self._tasks = [
+            asyncio.create_task(self._run_stage(i), name=f"{self.name}:{stage[0]}")
+            for i, stage in enumerate(self._stages)
+        ]
+        logger.info(f"[pipeline] {self.name} 启动: {' → '.join(s[0] for s in self._stages)}")
+        return self
+
+    async def put(self, item):
+        """送入第一个阶段；队列已满时等待"""
+        await self._queues[0].put(item)
+
+    def take_ready(self, stage_name, max_items):
+        """不等待地取出某阶段输入队列中已就绪的数据（用于过载时合并处理）"""
+        idx = [stage[0] for stage in self._stages].index(stage_name)
+        q = self._queues[idx]
+        items = []
+        while len(items) < max_items and not q.empty():
+            item = q.get_nowait()
+            if item is _STOP:
+                # 停止标记总是最后入队，放回队尾不会打乱顺序
+                q.put_nowait(item)
+                break
+            items.append(item)
+        return items
+
+    def depths(self):
+        """各阶段输入队列的当前长度"""
+        return {stage[0]: q.qsize() for stage, q in zip(self._stages, self._queues)}
+
+    async def _run_stage(self, idx):
+        name, handler, fan_out = self._stages[idx]
+        inq = self._queues[idx]
+        outq = self._queues[idx + 1] if idx + 1 < len(self._queues) else None
+        while True:
+            item = await inq.get()
+            if item is _STOP:
+                if outq is not None:
+                    await outq.put(_STOP)
+                break
+            try:
+                out = await handler(item)
+            except Exception as e:
+                logger.error(f"[pipeline] {self.name}:{name} 处理异常: {e}")
+                continue
+            self.processed[name] += 1
+            if out is None or outq is None:
+                continue
+            for o in (out if fan_out else (out,)):
+                await outq.put(o)
+
+    async def close(self, drain=True):
+        """停止流水线；drain=True 时等待已入队的数据全部处理完"""
+        if not self._tasks:
+            return
+        if drain:
+            await self._queues[0].put(_STOP)
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        else:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"[pipeline] {self.name} 已停止, 处理计数: {self.processed}")
+
+
+class RealtimeMonitor:
+    """跟踪单路音频流的实时率（RTF）和积压，判断是否过载
+
+    - 每个阶段维护一个处理耗时 / 音频时长的指数滑动平均；各阶段并行执行，整体 RTF 取最大值
+    - 同时记录各阶段输入在队列中的等待时间（指数滑动平均，秒），用于定位瓶颈阶段
+    - backlog_seconds 为已接收但尚未完成识别和翻译的音频时长
+    - 过载判定带滞回：RTF > enter_rtf 或积压超过 max_lag 时进入过载，
+      RTF < exit_rtf 且积压低于 max_lag 的一半时退出
+    """
+
+    def __init__(self, max_lag_seconds=10.0, alpha=0.2, enter_rtf=1.0, exit_rtf=0.8):
+        self.max_lag = max_lag_seconds
+        self.alpha = alpha
+        self.enter_rtf = enter_rtf
+        self.exit_rtf = exit_rtf
+        self.stage_rtf = {}
+        self.stage_wait = {}
+        self.backlog_seconds = 0.0
+        self.overloaded = False
+        self.shed = {}  # 各降载策略的触发次数
+
+    def update(self, stage, elapsed, audio_seconds, wait=None):
+        if audio_seconds <= 0:
+            return
+        self.stage_rtf[stage] = self._smooth(self.stage_rtf.get(stage), elapsed / audio_seconds)
+        if wait is not None:
+            self.stage_wait[stage] = self._smooth(self.stage_wait.get(stage), max(0.0, wait))
+
+    def _smooth(self, prev, value):
+        return value if prev is None else prev + self.alpha * (value - prev)
+
+    @property
+    def rtf(self):
+        return max(self.stage_rtf.values()) if self.stage_rtf else 0.0
+
+    def set_backlog(self, seconds):
+        self.backlog_seconds = max(0.0, seconds)
+
+    def over_lag(self):
+        return self.backlog_seconds > self.max_lag
+
+    def check(self):
+        """重新评估过载状态，状态发生变化时返回 True"""
+        if self.overloaded:
+            state = not (self.rtf < self.exit_rtf and self.backlog_seconds < self.max_lag / 2)
+        else:
+            state = self.rtf > self.enter_rtf or self.over_lag()
+        changed = state != self.overloaded
+        self.overloaded = state
+        return changed
+
+    def record_shed(self, policy):
+        self.shed[policy] = self.shed.get(policy, 0) + 1
+
+    def snapshot(self):
+        return {
+            "rtf": round(self.rtf, 3),
+            "stage_rtf": {k: round(v, 3) for k, v in self.stage_rtf.items()},
+            "stage_wait_seconds": {k: round(v, 3) for k, v in self.stage_wait.items()},
+            "backlog_seconds": round(self.backlog_seconds, 3),
+            "overloaded": self.overloaded,
+            "shed": dict(self.shed),
+        }
@@ -0,0 +1,82 @@
+# a4s/quantization.py
+# SenseVoice 编码器的 CPU 低精度推理
+# - int8 动态量化：注意力与前馈层中的 Linear 权重存为 int8，激活在运行时按批动态量化。
+#   FSMN 卷积、LayerNorm、CTC 输出层保持 fp32
+# - bf16 autocast：编码器在 torch.autocast 下以 bf16 计算，需要 CPU 原生 bf16 指令
+import time
+import torch
+from loguru import logger
+
+# 原生 bf16 指令（/proc/cpuinfo 中的标志）；没有这些指令时 bf16 只能软件模拟，比 fp32 更慢
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+# 只量化这两类子模块中的 Linear（按类名匹配：model.py 由 funasr 以 remote_code 方式加载，模块名不固定）
+QUANTIZE_MODULES = ("MultiHeadedAttentionSANM", "PositionwiseFeedForward")
+
+
+def linear_weight_bytes(module):
+    """模块中 Linear 权重占用的字节数（fp32 或打包后的 int8）"""
+    total = 0
+    for m in module.modules():
+        if isinstance(m, torch.nn.Linear):
+            total += m.weight.numel() * m.weight.element_size()
+        elif hasattr(m, "_packed_params") and hasattr(m, "weight") and callable(m.weight):
+            w = m.weight()
+            total += w.numel() * w.element_size()
+    return total
+
+
+def quantize_encoder(model):
+    """原地把 model.encoder 中注意力/前馈层的 Linear 替换为 int8 动态量化版本，返回量化的层数"""
+    start_time = time.time()
+    fp32_bytes = linear_weight_bytes(model.encoder)
+    targets = [m for m in model.encoder.modules() if type(m).__name__ in QUANTIZE_MODULES]
+    count = 0
+    for module in targets:
+        count += sum(isinstance(m, torch.nn.Linear) for m in module.children())
+        torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    int8_bytes = linear_weight_bytes(model.encoder)
+    logger.info(
+        f"[quantize] 编码器 int8 动态量化完成: {count} 个 Linear, "
+        f"权重 {fp32_bytes / 2**20:.1f} MB → {int8_bytes / 2**20:.1f} MB, "
+        f"{(time.time() - start_time) * 1000:.0f} ms"
+    )
+    return count
+
+
+def cpu_supports_bf16():
+    """CPU 是否有原生 bf16 指令（AVX512-BF16 / AMX-BF16）"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set()
+            for line in f:
+                if line.startswith("flags"):
+                    flags.update(line.split(":", 1)[1].split())
+                    break
+        return any(flag in flags for flag in BF16_CPU_FLAGS)
+    except OSError:
+        pass
+    # 非 Linux：退回 oneDNN 自己的检测
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def enable_bf16_autocast(model):
+    """编码器切换到 bf16 autocast；CPU 不支持或试跑失败时保持 fp32，返回是否启用"""
+    if not cpu_supports_bf16():
+        logger.warning("[bf16] CPU 没有原生 bf16 指令（AVX512-BF16/AMX），保持 fp32")
+        return False
+    model.encoder_autocast_dtype = torch.bfloat16
+    dim = model.embed.embedding_dim
+    try:
+        with torch.no_grad():
+            speech = torch.zeros(1, 16, dim)
+            model.encode_with_prompt(speech, torch.tensor([16], dtype=torch.int32))
+    except Exception as e:
+        logger.warning(f"[bf16] bf16 autocast 试跑失败，保持 fp32: {e}")
+        model.encoder_autocast_dtype = None
+        return False
+    logger.info("[bf16] 编码器已启用 bf16 autocast")
+    return True
@@ -2,6 +2,7 @@
 # ✅ 基于 server_wss_original.py 重构，采用上传者/订阅者分离架构
 from download_model import ModelDownloader
 from threading import Thread
+import threading
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -15,6 +16,17 @@ import asyncio  # 修复未定义asyncio
 import os
 from collections import deque
 import struct
+from audio_buffer import AudioRingBuffer
+from audio_frame import SUPPORTED_CODECS, FrameError, FrameSequencer, decode_payload, is_framed, parse_frame
+from session import SessionRegistry, session_id_from_query
+from pipeline import StagedPipeline, RealtimeMonitor, run_blocking, vad_executor, translate_executor, stream_executor
+from asr_scheduler import AsrBatchScheduler, LengthBucketer
+from energy import EnergyGate, lowest_energy_offset
+from stitch import stitch_text
+from frontend import IncrementalFbank
+from warmup import WARMUP_TEXTS, WarmupStatus, synthetic_speech
+from threads import ThreadBudget
+from translation_cache import TranslationCache, normalize_text
 
 
 # 初始化下载器
@@ -78,6 +90,43 @@ class Config:
     channels = 1
     avg_logprob_thr = -0.5
     sv_thr = 0.3
+    ring_buffer_seconds = 90   # 每个上传连接的环形缓冲区容量（秒）
+    vad_keep_ms = 3000         # 无语音时保留的回看音频（毫秒），覆盖 VAD 起点回溯
+    pipeline_queue_size = 4    # 流水线各阶段之间的队列长度
+    asr_max_batch_size = 8     # 跨会话 ASR 批处理的最大批大小
+    asr_max_wait_ms = 30       # 凑批的最长等待时间（毫秒）
+    asr_batch_bucket_edges = (3.0, 6.0, 12.0)  # 组批长度桶的上界（秒），不同桶的语音段不放进同一批
+    asr_batch_max_padding_waste = 0.3  # 批内 padding 占比上限，超过则拆成多个批（/asr/stats 中查看 padding 效率）
+    stream_partials = True     # 语音进行中按 VAD 块推送中间识别结果（partial），段结束时推送 final
+    overload_policy = "drop_oldest"  # 处理跟不上实时(RTF>1)时的降载策略: drop_oldest / skip_translation / merge_segments
+    max_lag_seconds = 10.0     # 允许的最大积压（秒），drop_oldest 超过后丢弃最旧的待识别语音段
+    merge_max_segments = 4     # merge_segments 策略下一次最多合并的语音段数
+    max_gap_fill_seconds = 5.0 # 帧协议检测到采集缺口时最多补的静音时长，更长的缺口只记入采集时间偏移
+    max_segment_seconds = 15.0 # 语音段最长时长，连续讲话超过后在接近上限的最低能量处强制切分（0 表示不限制）
+    segment_cut_search_ms = 2000  # 在上限之前多长的范围内寻找切分点
+    segment_overlap_ms = 300   # 强制切分后下一段向前重叠的时长，识别后按文本去重拼接
+    energy_gate = True         # VAD 前的能量门：没有进行中的语音段时，明显静音的块跳过 VAD 推理
+    gate_open_dbfs = -45.0     # 帧 RMS 高于该值立即开门
+    gate_close_dbfs = -55.0    # 块内所有帧 RMS 低于该值（且峰值低于 gate_peak_dbfs）视为静音
+    gate_peak_dbfs = -35.0
+    gate_hangover_chunks = 3   # 连续多少个静音块后才开始跳过
+    incremental_fbank = True   # 语音进行中随 VAD 块增量计算 fbank，语音段结束后直接用缓存特征识别
+    asr_backend = "torch"      # ASR 编码器 + CTC 头的推理后端: torch / onnx（onnxruntime，仅 CPU；流式 partial 仍用 torch）
+    onnx_model_path = None     # ONNX 模型路径，默认 <ASR 模型目录>/encoder_ctc.onnx，不存在或比权重旧时自动导出
+    asr_sdpa = True            # 编码器自注意力使用 torch 的 scaled_dot_product_attention（torch 不支持时自动关闭）
+    asr_quantize = False       # CPU 上把编码器注意力/前馈层的 Linear 做 int8 动态量化（启用前先用 benchmark.py quantize 核对 CER）
+    asr_bf16 = False           # CPU 上编码器以 bf16 autocast 推理（需要 AVX512-BF16/AMX，不支持时自动保持 fp32；与 asr_quantize、onnx 后端和编译模式互斥）
+    asr_compile = None         # 编码器编译模式: None(eager) / "compile"(torch.compile) / "trace"(TorchScript)，与 onnx 后端互斥
+    asr_compile_buckets = (64, 128, 256, 512)  # 编译长度桶（含 prompt 的 LFR 帧数，60ms/帧），更长的输入走 eager
+    asr_compile_batch_sizes = (1,)  # 启动时为哪些批大小编译（每个桶各一份图），其余批大小走 eager
+    warmup = True              # 启动时（ASR/VAD）和翻译模型加载后用合成输入预热，预热完成后才报告就绪
+    warmup_seconds = (1.0, 3.0, 8.0)  # ASR/VAD 预热语音段时长（秒），覆盖短应答到长句
+    warmup_rounds = 3          # 每个预热用例的调用次数：第 1 次为冷启动，其余为预热后（日志和 /status 中对比）
+    warmup_translate_pairs = (("zh", "en"), ("en", "zh"))  # 翻译预热的 (源, 目标) 语言对
+    thread_profile = "auto"    # CPU 线程预算场景: auto（随翻译模型加载/卸载切换）/ captions / captions+translation / None（各库默认线程数）
+    thread_cores = None        # 参与分配的核心数，默认取进程的 CPU 亲和性
+    translate_cache_size = 4096  # 译文 LRU 缓存条目数（0 关闭），键为 (规范化文本, 源语言, 目标语言)，/translation/status 中查看命中率
+    translate_cache_path = None  # 译文缓存持久化文件（JSON）：加载翻译模型时读入，卸载和服务退出时写入；None 不持久化
 config = Config()
 
 import ctranslate2
@@ -87,7 +136,9 @@ import re
 from modelscope.pipelines import pipeline
 from modelscope.utils.constant import Tasks
 from funasr import AutoModel
+from funasr.utils.load_utils import extract_fbank
 import soundfile as sf
+import torch
 
 # 设备检测函数
 def get_device():
@@ -108,6 +159,19 @@ def get_device():
         logger.warning(f"设备检测失败: {e}，默认使用CPU")
         return "cpu"
 
+# 各组件的预热状态（/status）：启动时预热 ASR/VAD，翻译模型加载后预热翻译
+warmup_status = WarmupStatus()
+
+# 线程预算在加载模型之前设置：inter-op 线程池只能在首次并行计算前设置
+thread_budget = ThreadBudget(config.thread_profile, config.thread_cores, stream=config.stream_partials) if config.thread_profile else None
+if thread_budget is not None:
+    thread_budget.apply_global()
+
+def use_threads(role):
+    """在当前线程中按角色应用 torch 线程预算（未启用线程预算时不做任何事）"""
+    if thread_budget is not None:
+        thread_budget.apply(role)
+
 # ASR与VAD模型加载
 asr_model_path = ensure_model_ready("sensevoice_small")
 vad_model_path = ensure_model_ready("fsmn_vad")
@@ -115,32 +179,27 @@ vad_model_path = ensure_model_ready("fsmn_vad")
 # 自动选择设备
 device = get_device()
 
-try:
-    model_asr = AutoModel(
+# 实时链路的语音段已由 model_vad 切好，ASR 模型不再内置 VAD（避免每段重复跑一遍 VAD、常驻两份 VAD 模型）
+# 整文件识别需要的 VAD 在 asr() 首次调用时才加载，见 ensure_file_vad()
+def load_asr_model(device):
+    return AutoModel(
         model=asr_model_path,
         trust_remote_code=True,
         remote_code="./model.py",
         device=device,
         disable_update=True,
-        vad_model="fsmn-vad"
         # 暂时移除说话人分离功能，避免punc_model依赖问题
-        # spk_model="cam++"  
+        # spk_model="cam++"
     )
+
+try:
+    model_asr = load_asr_model(device)
     logger.info(f"ASR模型加载成功，使用设备: {device}")
 except Exception as e:
     if device == "cuda:0":
         logger.warning(f"GPU加载失败: {e}，尝试使用CPU")
         try:
-            model_asr = AutoModel(
-                model=asr_model_path,
-                trust_remote_code=True,
-                remote_code="./model.py",
-                device="cpu",
-                disable_update=True,
-                vad_model="fsmn-vad"
-                # 暂时移除说话人分离功能，避免punc_model依赖问题
-                # spk_model="cam++"  
-            )
+            model_asr = load_asr_model("cpu")
             device = "cpu"
             logger.info("ASR模型CPU加载成功")
         except Exception as cpu_error:
@@ -149,6 +208,85 @@ except Exception as e:
     else:
         logger.error(f"ASR模型加载失败: {e}")
         raise
+for module in model_asr.model.modules():
+    if hasattr(module, "use_sdpa"):
+        module.use_sdpa = config.asr_sdpa and hasattr(torch.nn.functional, "scaled_dot_product_attention")
+
+# 实时链路的轻量推理入口：numpy 语音段直接经 frontend → encoder → CTC，不经过 AutoModel.generate 的通用分发
+asr_runner = model_asr.model.runner(
+    model_asr.kwargs["frontend"], model_asr.kwargs["tokenizer"], model_asr.kwargs["device"]
+)
+batch_bucketer = LengthBucketer(
+    bucket_edges=config.asr_batch_bucket_edges,
+    max_padding_waste=config.asr_batch_max_padding_waste,
+    max_batch_size=config.asr_max_batch_size,
+)
+
+def enable_onnx_backend():
+    """把编码器 + CTC 头切换到 onnxruntime（asr() / asr_batch() 都生效），失败时保持 PyTorch"""
+    if device != "cpu":
+        logger.warning(f"[onnx] ONNX 后端只支持 CPU，当前设备 {device}，继续使用 PyTorch")
+        return False
+    try:
+        from onnx_backend import load_onnx_backend
+        model_asr.model.encode_backend = load_onnx_backend(
+            model_asr.model, asr_model_path, config.onnx_model_path,
+            intra_op_threads=thread_budget.threads("asr") if thread_budget is not None else 0,
+        )
+    except Exception as e:
+        logger.warning(f"[onnx] ONNX 后端加载失败，继续使用 PyTorch: {e}")
+        model_asr.model.encode_backend = None
+        return False
+    logger.info("[onnx] ASR 编码器已切换到 onnxruntime")
+    return True
+
+if config.asr_backend == "onnx":
+    enable_onnx_backend()
+
+# 量化放在 ONNX 导出之后：ONNX 后端从 fp32 权重导出，量化后的 torch 编码器仍用于流式 partial
+if config.asr_quantize:
+    if device != "cpu":
+        logger.warning(f"[quantize] int8 动态量化只支持 CPU，当前设备 {device}，保持 fp32")
+    else:
+        from quantization import quantize_encoder
+        quantize_encoder(model_asr.model)
+
+def enable_compiled_encoder():
+    """编码器切换到编译模式并在启动时预热各长度桶；全部编译失败时保持 eager"""
+    if model_asr.model.encode_backend is not None:
+        logger.warning(f"[compiled] 已启用其他编码器后端，忽略 asr_compile={config.asr_compile}")
+        return False
+    try:
+        from compiled_encoder import CompiledEncoderBackend
+        backend = CompiledEncoderBackend(
+            model_asr.model, buckets=config.asr_compile_buckets, mode=config.asr_compile,
+        )
+        warmed = backend.warmup(config.asr_compile_batch_sizes)
+    except Exception as e:
+        logger.warning(f"[compiled] 编译模式初始化失败，继续使用 eager: {e}")
+        return False
+    if not warmed:
+        logger.warning("[compiled] 没有任何长度桶编译成功，继续使用 eager")
+        return False
+    model_asr.model.encode_backend = backend
+    logger.info(f"[compiled] 编码器已切换到 {config.asr_compile} 模式: {backend.stats()}")
+    return True
+
+if config.asr_compile:
+    enable_compiled_encoder()
+
+# bf16 放在编码器后端（onnx / 编译模式）之后判断：启用了后端时编码走 encode_backend，autocast 不起作用
+if config.asr_bf16:
+    if device != "cpu":
+        logger.warning(f"[bf16] bf16 autocast 模式只用于 CPU，当前设备 {device}，保持 fp32")
+    elif config.asr_quantize:
+        logger.warning("[bf16] 已启用 int8 量化，忽略 asr_bf16")
+    elif model_asr.model.encode_backend is not None:
+        logger.warning(f"[bf16] 编码器已使用 {type(model_asr.model.encode_backend).__name__} 后端，bf16 autocast 不生效，忽略 asr_bf16")
+    else:
+        from quantization import enable_bf16_autocast
+        enable_bf16_autocast(model_asr.model)
+
 model_vad = AutoModel(
     model=vad_model_path,
     model_revision="v2.0.4",
@@ -157,8 +295,33 @@ model_vad = AutoModel(
     disable_update=True,
 )
 
+def vad_generate(**kwargs):
+    """流式 VAD 推理（vad 执行器中调用）"""
+    use_threads("vad")
+    return model_vad.generate(**kwargs)
+
+file_vad_lock = threading.Lock()
+
+def ensure_file_vad():
+    """整文件识别用的 VAD：首次需要时才加载并挂到 model_asr 上，之后 generate() 走 inference_with_vad"""
+    if model_asr.vad_model is not None:
+        return
+    with file_vad_lock:
+        if model_asr.vad_model is None:
+            start_time = time.time()
+            vad_model, vad_kwargs = AutoModel.build_model(
+                model=vad_model_path,
+                device=model_asr.kwargs["device"],
+                ncpu=model_asr.kwargs.get("ncpu", 4),
+                disable_update=True,
+            )
+            model_asr.vad_kwargs = vad_kwargs
+            model_asr.vad_model = vad_model
+            logger.info(f"整文件识别 VAD 加载完成: {(time.time() - start_time) * 1000:.0f} ms")
+
 def asr(audio, lang, cache, use_itn=False):
-    import time
+    """整文件/长音频识别：先用 VAD 切分再识别（VAD 按需加载）。已切分好的语音段请用 asr_segment()"""
+    ensure_file_vad()
     start_time = time.time()
     result = model_asr.generate(
         input           = audio,
@@ -172,6 +335,63 @@ def asr(audio, lang, cache, use_itn=False):
     logger.debug(f"asr elapsed: {elapsed_time * 1000:.2f} milliseconds")
     return result
 
+def asr_segment(audio, lang, use_itn=False):
+    """识别一个已切分好的语音段：直接推理，不经过 VAD"""
+    return asr_batch([audio], lang, use_itn)[0]
+
+def segment_seconds(segment):
+    """语音段时长（秒）：numpy 音频按采样点，IncrementalFbank 特征按 LFR 帧数"""
+    if isinstance(segment, torch.Tensor):
+        frontend = model_asr.kwargs["frontend"]
+        return segment.size(0) * frontend.frame_shift * frontend.lfr_n / 1000
+    return len(segment) / config.sample_rate
+
+def asr_batch(audios, lang, use_itn=False):
+    """对多个已切分好的语音段做 padding 批量识别，返回与 audios 等长的结果列表
+
+    先由 batch_bucketer 按长度分成 padding 浪费受限的子批，再经 asr_runner（SenseVoiceRunner）
+    直接推理，结果按输入顺序返回，每个元素的格式与 asr() 的返回值相同。
+    """
+    use_threads("asr")
+    kwargs = {**model_asr.kwargs, "language": lang.strip(), "use_itn": use_itn}
+
+    def run(batch):
+        start_time = time.time()
+        keys = [f"segment_{i}" for i in range(len(batch))]
+        results, meta_data = asr_runner(batch, key=keys, **kwargs)
+        logger.debug(f"asr batch({len(batch)}) elapsed: {(time.time() - start_time) * 1000:.2f} milliseconds, {meta_data}")
+        return results
+
+    return [[result] for result in batch_bucketer.run(list(audios), run, segment_seconds)]
+
+def asr_partial(audio, state):
+    """流式识别：只把上次之后新增的特征帧送入编码器（forward_chunk + k/v 缓存），返回中间结果
+
+    audio 为语音段起点到当前的音频，或 IncrementalFbank 给出的 (T, D) 特征。
+    state 由 model_asr.model.init_stream_cache() 创建，每个语音段一个。
+    最后一个 LFR 帧会随后续音频变化，留到下次再送入；没有新帧时返回 None。
+    """
+    use_threads("stream")
+    if isinstance(audio, torch.Tensor):
+        feats = audio[None, :, :]
+    else:
+        feats, feats_len = extract_fbank(audio, data_type="sound", frontend=model_asr.kwargs["frontend"])
+    stable_frames = feats.size(1) - 1
+    if stable_frames <= state["fed_frames"]:
+        return None
+    with torch.no_grad():
+        result = model_asr.model.inference_chunk(
+            feats[:, state["fed_frames"]:stable_frames, :],
+            state,
+            tokenizer=model_asr.kwargs["tokenizer"],
+            device=model_asr.kwargs["device"],
+        )
+    return result["text"]
+
+def new_partial_state(lang, use_itn=True):
+    with torch.no_grad():
+        return model_asr.model.init_stream_cache(language=lang.strip(), use_itn=use_itn, device=model_asr.kwargs["device"])
+
 def format_str_v3(s):
     # 精简版，保留原有多语种符号过滤逻辑
     def get_emo(s):
@@ -207,6 +427,9 @@ translate_model_path = None
 translation_device = None
 translation_enabled = False
 translation_loading = False  # 新增：标记是否正在加载中
+translation_cache = TranslationCache(
+    max_entries=config.translate_cache_size, path=config.translate_cache_path,
+) if config.translate_cache_size else None
 
 # 获取翻译模型设备（翻译模型通常在CPU上运行更稳定）
 def get_translation_device():
@@ -240,19 +463,32 @@ def load_translation_model():
         translate_model_path = ensure_model_ready("nllb200")
         translation_device = get_translation_device()
         
-        translator = ctranslate2.Translator(translate_model_path, device=translation_device)
+        translator_kwargs = {}
+        if thread_budget is not None:
+            # auto 场景下加载翻译模型即切换到 captions+translation，ASR/partial 线程数随之下调
+            thread_budget.set_translation(True)
+            translator_kwargs = thread_budget.translator_kwargs()
+        translator = ctranslate2.Translator(translate_model_path, device=translation_device, **translator_kwargs)
         logger.info(f"翻译模型加载成功，使用设备: {translation_device} (路径: {translate_model_path})")
         
         sp = spm.SentencePieceProcessor()
         sp.Load(os.path.join(translate_model_path, "sentencepiece.bpe.model"))
         logger.info("分词器加载成功")
+        if translation_cache is not None:
+            translation_cache.bind_model(translate_model_path)
+            translation_cache.load()
         
         translation_enabled = True
+        # 预热期间 translation_loading 仍为 True，/translation/status 在预热完成后才显示就绪
+        if config.warmup:
+            warmup_translation()
         return True
     except Exception as e:
         translator = None
         sp = None
         translation_enabled = False
+        if thread_budget is not None:
+            thread_budget.set_translation(False)
         logger.error(f"翻译模型加载失败: {e}")
         return False
     finally:
@@ -261,12 +497,24 @@ def load_translation_model():
 def unload_translation_model():
     """卸载翻译模型以释放内存"""
     global translator, sp, translation_enabled
+    save_translation_cache()
     translator = None
     sp = None
     translation_enabled = False
+    warmup_status.skip("translate")
+    if thread_budget is not None:
+        thread_budget.set_translation(False)
     logger.info("翻译模型已卸载")
 
-def translate_text(text, src_lang="zh", tgt_lang="en"):
+def save_translation_cache():
+    if translation_cache is not None and translation_cache.path:
+        try:
+            translation_cache.save()
+        except OSError as e:
+            logger.warning(f"[translate-cache] 译文缓存保存失败: {e}")
+
+def translate_text(text, src_lang="zh", tgt_lang="en", use_cache=True):
+    """翻译一条字幕；use_cache=False 时绕过译文缓存（预热用，保证每次都真实解码）"""
     # 如果翻译模型未启用或加载，先尝试加载
     if not translation_enabled:
         if not load_translation_model():
@@ -299,12 +547,25 @@ def translate_text(text, src_lang="zh", tgt_lang="en"):
         if not text.strip():
             logger.debug(f"Translate input is empty: {text}")
             return ""
-        tokens = [src] + sp.EncodeAsPieces(text) + ["</s>"]
+        cache = translation_cache if use_cache else None
+        if cache is not None:
+            # 按规范化后的文本翻译，保证缓存的译文与键一一对应
+            text = normalize_text(text)
+            cached = cache.get(text, src, tgt)
+            if cached is not None:
+                return cached
+            pieces = cache.encode(text, sp)
+        else:
+            pieces = sp.EncodeAsPieces(text)
+        tokens = [src] + pieces + ["</s>"]
         logger.debug(f"Translate input: {text}, tokens: {tokens}")
         results = translator.translate_batch([tokens], target_prefix=[[tgt]])
         output_tokens = results[0].hypotheses[0]
         output_tokens = [t for t in output_tokens if t not in [src, tgt, "</s>"]]
-        return sp.DecodePieces(output_tokens)
+        translated = sp.DecodePieces(output_tokens)
+        if cache is not None and translated:
+            cache.put(text, src, tgt, translated)
+        return translated
     except Exception as e:
         logger.error(f"Translation error: {e}")
         return ""
@@ -331,8 +592,8 @@ app.add_middleware(
 # 添加翻译模型控制接口
 @app.post("/translation/load")
 async def load_translation():
-    """加载翻译模型"""
-    success = load_translation_model()
+    """加载翻译模型（在翻译线程中执行，加载期间其他接口仍可响应）"""
+    success = await run_blocking(translate_executor, load_translation_model)
     return {
         "success": success,
         "enabled": translation_enabled,
@@ -356,9 +617,41 @@ async def translation_status():
     return {
         "enabled": translation_enabled,
         "loading": translation_loading,
-        "loaded": translator is not None and sp is not None
+        "loaded": translator is not None and sp is not None,
+        "cache": translation_cache.stats() if translation_cache is not None else None,
     }
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    """服务退出时持久化译文缓存"""
+    save_translation_cache()
+
+@app.get("/status")
+async def server_status():
+    """服务就绪状态：启动预热完成前 ready 为 False；附各组件预热的冷/热耗时"""
+    return {
+        "ready": server_ready and not warmup_status.busy(),
+        "warmup": warmup_status.snapshot(),
+        "translation_loaded": translator is not None and sp is not None,
+    }
+
+@app.get("/asr/stats")
+async def asr_stats():
+    """获取 ASR 批处理统计（批大小分布等）"""
+    stats = asr_scheduler.stats()
+    stats["padding"] = batch_bucketer.stats()
+    backend = model_asr.model.encode_backend
+    if hasattr(backend, "stats"):
+        stats["encoder"] = backend.stats()
+    if thread_budget is not None:
+        stats["threads"] = thread_budget.stats()
+    return stats
+
+@app.get("/sessions")
+async def list_sessions():
+    """列出当前所有字幕会话"""
+    return {"sessions": [s.summary() for s in session_registry.sessions()]}
+
 # ===== 独立录音API =====
 from pydantic import BaseModel
 from fastapi.responses import FileResponse
@@ -450,23 +743,67 @@ async def download_file(filename: str):
             "message": "文件下载异常"
         }
 
-subscribers = set()
-subscriber_langs = dict()  # 记录目标语言
-latest_subscriber = None   # 只保留最新的订阅者
-last_plain_text = None     # 最近一次的纯文本字幕
-last_info_text = None     # 最近一次的 info 字幕
-latest_device_list = []   # 新增：全局缓存最新设备列表
-latest_uploader = None   # 新增：记录最新采集端连接
-current_recording_start_time = None  # 新增：当前录音开始时间（用于时间戳同步）
+# 会话注册表：每个会话（?session=xxx）拥有独立的采集端、订阅端、字幕状态和录音状态
+session_registry = SessionRegistry()
 
-# 音频数据缓存 - 用于录音功能（只在录音时启用）
-recording_audio_buffer = {}  # {session_id: deque(...)}
-recording_timestamps = {}    # {session_id: deque(...)}
-recording_sessions = {}      # 活跃的录音会话 {session_id: {start_time, end_time, filename, is_active}}
-recording_enabled = False    # 全局录音缓存开关
+# 跨会话 ASR 批处理调度器：各会话就绪的语音段合并成批识别
+asr_scheduler = AsrBatchScheduler(
+    asr_batch,
+    max_batch_size=config.asr_max_batch_size,
+    max_wait_ms=config.asr_max_wait_ms,
+    active_streams=lambda: sum(1 for s in session_registry.sessions() if s.stream is not None),
+).start()
 
-# 全局音频处理器引用 - 用于获取精确音频时长
-global_audio_handler = None
+def warmup_cases():
+    return [(f"{s:g}s", synthetic_speech(s, config.sample_rate, seed=i)) for i, s in enumerate(config.warmup_seconds)]
+
+def warmup_asr():
+    """按实时链路的调用方式预热 ASR：整段识别（asr_runner，即 asr_batch 的推理路径）和流式 partial"""
+    kwargs = {**model_asr.kwargs, "language": "auto", "use_itn": True}
+    cases = warmup_cases()
+    # 不经过 asr_batch：预热段不计入 batch_bucketer 的 padding 统计
+    warmup_status.run("asr", lambda audio: asr_runner([audio], **kwargs), cases, config.warmup_rounds)
+    if config.stream_partials:
+        step = int(config.chunk_size_ms * config.sample_rate / 1000)
+
+        def partial(audio):
+            state = new_partial_state("auto")
+            for end in range(step, len(audio) + 1, step):
+                asr_partial(audio[:end], state)
+
+        warmup_status.run("asr_partial", partial, cases, config.warmup_rounds)
+
+def warmup_vad():
+    """按 vad_stage 的方式逐块送入流式 VAD（每轮新的 cache），预热 model_vad.generate"""
+    step = int(config.chunk_size_ms * config.sample_rate / 1000)
+
+    def stream(audio):
+        cache = {}
+        for beg in range(0, len(audio), step):
+            vad_generate(
+                input=audio[beg:beg + step], cache=cache,
+                is_final=beg + step >= len(audio), chunk_size=config.chunk_size_ms,
+            )
+
+    warmup_status.run("vad", stream, warmup_cases(), config.warmup_rounds)
+
+def warmup_translation():
+    """用各语言对的短句和长句预热 translate_text（ctranslate2 + SentencePiece）"""
+    cases = [
+        (f"{src}→{tgt} {len(text)}字", (text, src, tgt))
+        for src, tgt in config.warmup_translate_pairs for text in WARMUP_TEXTS.get(src, ())
+    ]
+    warmup_status.run("translate", lambda c: translate_text(c[0], src_lang=c[1], tgt_lang=c[2], use_cache=False), cases, config.warmup_rounds)
+
+# 启动预热在模块导入阶段完成：uvicorn 在预热结束后才开始监听端口，客户端连上时模型已是热的
+server_ready = False
+if config.warmup:
+    warmup_start = time.time()
+    warmup_vad()
+    warmup_asr()
+    logger.info(f"[warmup] 启动预热完成: {time.time() - warmup_start:.1f}s")
+server_ready = True
+logger.info("[warmup] 服务就绪")
 
 # 音频参数
 SAMPLE_RATE = 16000  # ASR处理用
@@ -502,17 +839,16 @@ class TranscriptionResponse(BaseModel):
 
 @app.websocket("/ws/subscribe")
 async def subtitle_subscriber(websocket: WebSocket):
-    global latest_subscriber, last_plain_text, last_info_text, latest_device_list, latest_uploader, current_recording_start_time
     await websocket.accept()
-    subscribers.add(websocket)
-    latest_subscriber = websocket  # 只保留最新
-    subscriber_langs[websocket] = 'en'  # 默认英语
-    logger.info(f"[subscribe] new client: {websocket.client}")
+    query_params = parse_qs(websocket.scope['query_string'].decode())
+    session = session_registry.get_or_create(session_id_from_query(query_params))
+    session.add_subscriber(websocket, 'en')  # 默认英语，只保留最新的订阅者用于推送
+    logger.info(f"[subscribe] new client: {websocket.client}, session: {session.session_id}")
     # 新增：连接建立后立即推送设备列表（如有）
-    if latest_device_list:
+    if session.device_list:
         try:
-            await websocket.send_json({"device_list": latest_device_list})
-            logger.info(f"[subscribe] 首次推送设备列表: {latest_device_list}")
+            await websocket.send_json({"device_list": session.device_list})
+            logger.info(f"[subscribe] 首次推送设备列表: {session.device_list}")
         except Exception as e:
             logger.warning(f"[subscribe] 首次推送设备列表失败: {e}")
     try:
@@ -536,9 +872,9 @@ async def subtitle_subscriber(websocket: WebSocket):
                 continue
             # 新增：收到 switch_device 指令时转发给采集端
             if isinstance(data, dict) and 'switch_device' in data:
-                if latest_uploader:
+                if session.uploader:
                     try:
-                        await latest_uploader.send_json({'switch_device': data['switch_device']})
+                        await session.uploader.send_json({'switch_device': data['switch_device']})
                         logger.info(f"[subscribe] 已转发切换设备请求到采集端: {data['switch_device']}")
                     except Exception as e:
                         logger.warning(f"[subscribe] 转发切换设备失败: {e}")
@@ -548,9 +884,9 @@ async def subtitle_subscriber(websocket: WebSocket):
             
             # 新增：处理录音命令并转发给采集端
             if isinstance(data, dict) and 'start_recording' in data:
-                if latest_uploader:
+                if session.uploader:
                     try:
-                        await latest_uploader.send_text(json.dumps(data))
+                        await session.uploader.send_text(json.dumps(data))
                         logger.info(f"[subscribe] 已转发录音开始命令到采集端: {data}")
                     except Exception as e:
                         logger.warning(f"[subscribe] 转发录音开始命令失败: {e}")
@@ -559,9 +895,9 @@ async def subtitle_subscriber(websocket: WebSocket):
                 continue
             
             if isinstance(data, dict) and 'stop_recording' in data:
-                if latest_uploader:
+                if session.uploader:
                     try:
-                        await latest_uploader.send_text(json.dumps(data))
+                        await session.uploader.send_text(json.dumps(data))
                         logger.info(f"[subscribe] 已转发录音停止命令到采集端: {data}")
                     except Exception as e:
                         logger.warning(f"[subscribe] 转发录音停止命令失败: {e}")
@@ -571,9 +907,9 @@ async def subtitle_subscriber(websocket: WebSocket):
             
             # 新增：处理录音暂停命令并转发给采集端
             if isinstance(data, dict) and 'pause_recording' in data:
-                if latest_uploader:
+                if session.uploader:
                     try:
-                        await latest_uploader.send_text(json.dumps(data))
+                        await session.uploader.send_text(json.dumps(data))
                         logger.info(f"[subscribe] 已转发录音暂停命令到采集端: {data}")
                     except Exception as e:
                         logger.warning(f"[subscribe] 转发录音暂停命令失败: {e}")
@@ -583,9 +919,9 @@ async def subtitle_subscriber(websocket: WebSocket):
             
             # 新增：处理录音恢复命令并转发给采集端
             if isinstance(data, dict) and 'resume_recording' in data:
-                if latest_uploader:
+                if session.uploader:
                     try:
-                        await latest_uploader.send_text(json.dumps(data))
+                        await session.uploader.send_text(json.dumps(data))
                         logger.info(f"[subscribe] 已转发录音恢复命令到采集端: {data}")
                     except Exception as e:
                         logger.warning(f"[subscribe] 转发录音恢复命令失败: {e}")
@@ -593,24 +929,24 @@ async def subtitle_subscriber(websocket: WebSocket):
                     logger.warning("[subscribe] 没有采集端在线，无法恢复录音")
                 continue
             if isinstance(data, dict) and data.get('get_device_list'):
-                await websocket.send_json({"device_list": latest_device_list})
-                logger.info(f"[subscribe] 已推送设备列表: {latest_device_list}")
+                await websocket.send_json({"device_list": session.device_list})
+                logger.info(f"[subscribe] 已推送设备列表: {session.device_list}")
                 continue
             if isinstance(data, dict) and 'set_target_lang' in data:
-                subscriber_langs[websocket] = data['set_target_lang']
-                logger.info(f"[subscribe] {websocket.client} set target lang: {data['set_target_lang']} 当前 subscriber_langs: {subscriber_langs}")
+                session.subscriber_langs[websocket] = data['set_target_lang']
+                logger.info(f"[subscribe] {websocket.client} set target lang: {data['set_target_lang']} 当前 subscriber_langs: {session.subscriber_langs}")
                 # 新增：切换目标语言后，立即用新目标语言重翻译最近字幕并推送
-                if last_plain_text is not None and last_info_text is not None:
-                    tgt_lang_sub = subscriber_langs.get(websocket, 'en')
+                if session.last_plain_text is not None and session.last_info_text is not None:
+                    tgt_lang_sub = session.subscriber_langs.get(websocket, 'en')
                     try:
-                        translated = translate_text(last_plain_text, tgt_lang=tgt_lang_sub)
+                        translated = await run_blocking(translate_executor, translate_text, session.last_plain_text, tgt_lang=tgt_lang_sub)
                     except Exception as e:
                         logger.error(f"Translate error (on lang switch): {e}")
                         translated = ""
                     response = TranscriptionResponse(
                         code=0,
-                        info=last_info_text,
-                        data=last_info_text,
+                        info=session.last_info_text,
+                        data=session.last_info_text,
                         translated=translated
                     )
                     await websocket.send_json(response.model_dump())
@@ -619,30 +955,581 @@ async def subtitle_subscriber(websocket: WebSocket):
                 await websocket.send_json({'type': 'pong'})
                 continue
     except WebSocketDisconnect:
-        subscribers.discard(websocket)
-        subscriber_langs.pop(websocket, None)
-        if websocket == latest_subscriber:
-            latest_subscriber = None
-        logger.info("[subscribe] client disconnected")
+        logger.info(f"[subscribe] client disconnected, session: {session.session_id}")
+    finally:
+        session.remove_subscriber(websocket)
+        session_registry.release(session)
+
+# 常用语种到 NLLB 语言代码的映射（用于识别结果的源语言）
+ASR_LANG_MAP = {
+    "zh": "zho_Hans",  # 中文简体
+    "en": "eng_Latn",  # 英语
+    "ja": "jpn_Jpan",  # 日语
+    "ko": "kor_Hang",  # 韩语
+    "ru": "rus_Cyrl",  # 俄语
+    "fr": "fra_Latn",  # 法语
+    "de": "deu_Latn",  # 德语
+    "es": "spa_Latn",  # 西班牙语
+    "ar": "ara_Arab",  # 阿拉伯语
+    "vi": "vie_Latn",  # 越南语
+    "th": "tha_Thai",  # 泰语
+    "id": "ind_Latn",  # 印尼语
+    "ms": "msa_Latn",  # 马来语
+    "fil": "fil_Latn", # 菲律宾语
+    "km": "khm_Khmr",  # 高棉语
+    "my": "bur_Mymr",  # 缅甸语
+    "tr": "tur_Latn",  # 土耳其语
+    "it": "ita_Latn",  # 意大利语
+    "pt": "por_Latn",  # 葡萄牙语
+    "hi": "hin_Deva",  # 印地语
+    "bn": "ben_Beng",  # 孟加拉语
+    "ta": "tam_Taml",  # 泰米尔语
+    "ur": "urd_Arab",  # 乌尔都语
+}
+
+def strip_asr_tags(text):
+    text = re.sub(r'<\|.*?\|>', '', text)
+    text = text.replace('withitn', '').replace('woitn', '')
+    return text.strip()
+
+def extract_lang_from_asr(text):
+    m = re.match(r"<\|([a-z]{2,3})\|>", text)
+    if m:
+        return m.group(1)
+    return "zh"  # 默认中文
+
+def compute_recording_relative_time(session, chunk_start_time, ring_pos=None):
+    """计算字幕相对录音开始的时间戳
+
+    返回 (recording_relative_time, session_is_paused)；未在录音时返回 (None, False)
+    采集端使用帧协议时由帧头中的录音样本数精确换算，旧版裸 PCM 采集端回退到按到达时间估算
+    """
+    if session.recording_start_time is None:
+        return None, False
+    stream = session.stream
+    if stream is not None and stream.framed and ring_pos is not None:
+        return stream.recording_time_at(ring_pos)
+    try:
+        # 使用当前时间与录音开始时间的差值
+        base_relative_time = chunk_start_time - session.recording_start_time
+
+        # 从所有活跃录音会话中找到并扣除累积暂停时间
+        total_pause_time = 0
+        for recording_id, recording in session.recordings.items():
+            if recording.get('is_active', False):
+                # 获取该录音的累积暂停时间
+                total_pause_time = recording.get('total_paused_time', 0)
+
+                # 关键检查：如果当前正在暂停中，直接跳过这个字幕
+                if recording.get('pause_start'):
+                    logger.debug(f"[timestamp] 检测到录音{recording_id}正在暂停中，跳过字幕记录")
+                    return None, True
+                break  # 只处理第一个活跃会话
+
+        # 计算去除暂停时间后的有效录音时间
+        recording_relative_time = max(0, base_relative_time - total_pause_time)
+        logger.debug(f"[timestamp] 修复后时间戳计算: 基础时间={base_relative_time:.3f}s, 暂停时间={total_pause_time:.3f}s, 有效时间={recording_relative_time:.3f}s")
+        return recording_relative_time, False
+    except Exception as e:
+        logger.warning(f"[timestamp] 获取音频时长失败，使用最终回退计算: {e}")
+        # 最终回退到基础计算（简化版本）
+        return max(0, chunk_start_time - session.recording_start_time), False
+
+
+class UploadStream:
+    """单个采集端连接的音频处理状态与流水线各阶段
+
+    流水线: ingest(接收 WebSocket 音频) → VAD → ASR → translate → publish
+    VAD/ASR/翻译的模型调用都在 pipeline 中的专用线程池执行，事件循环只做调度，
+    因此识别某一段时订阅端心跳、HTTP 接口和其他连接都不会被阻塞。
+    """
+
+    def __init__(self, session, lang, codec="pcm"):
+        self.session = session
+        self.lang = lang
+        self.codec = codec          # 音频负载编码（?codec=），见 audio_frame.SUPPORTED_CODECS
+        self.chunk_size = int(config.chunk_size_ms * config.sample_rate / 1000)
+        # 预分配环形缓冲区：按绝对采样序号存取，避免每帧整体拷贝
+        self.ring = AudioRingBuffer(int(config.ring_buffer_seconds * config.sample_rate))
+        self.vad_keep_samples = int(config.vad_keep_ms * config.sample_rate / 1000)
+        self.cache, self.cache_asr = {}, {}
+        self.last_vad_beg = self.last_vad_end = -1
+        self.partial_state = None   # 当前语音段的流式识别状态
+        self.partial_beg = -1       # partial_state 对应的语音段起点（绝对采样序号）
+        self.cut_pos = None         # 当前语音段被强制切分后，下一片的起点（绝对采样序号）
+        self.prev_piece_text = None # 上一片（以强制切分结束）的识别文本，用于拼接去重
+        self.max_segment_samples = int(config.max_segment_seconds * config.sample_rate)
+        self.cut_search_samples = int(config.segment_cut_search_ms * config.sample_rate / 1000)
+        self.overlap_samples = int(config.segment_overlap_ms * config.sample_rate / 1000)
+        self.vad_pos = 0            # VAD 已处理到的绝对采样序号
+        # 能量门跳过的样本数：VAD 只看到未跳过的音频，其时间戳加上该偏移才是环形缓冲区序号
+        self.vad_skipped = 0
+        self.gate = EnergyGate(
+            open_dbfs=config.gate_open_dbfs, close_dbfs=config.gate_close_dbfs,
+            peak_dbfs=config.gate_peak_dbfs, hangover=config.gate_hangover_chunks,
+            frame_size=config.sample_rate // 50,
+        ) if config.energy_gate else None
+        # 增量 fbank 缓存（只在 VAD 执行器中访问）：语音段的特征在 VAD 阶段就已备好
+        self.fbank = IncrementalFbank(model_asr.kwargs["frontend"], self.ring) if config.incremental_fbank else None
+        self.pending_asr_samples = 0  # 已切出、尚未完成识别的语音段样本数
+        self.pending_translate_samples = 0  # 已识别、尚未完成翻译的语音段样本数
+        self.monitor = RealtimeMonitor(max_lag_seconds=config.max_lag_seconds)
+        self.framed = None          # 首个二进制消息决定：帧协议(True) 或旧版裸 PCM(False)
+        self.sequencer = FrameSequencer(config.sample_rate)
+        self.capture_offset = 0     # 采集样本序号 - 环形缓冲区绝对序号（大缺口不补静音时增加）
+        self.max_gap_fill = int(config.max_gap_fill_seconds * config.sample_rate)
+        # 每帧起点的 (环形缓冲区序号, 已录制样本数, 是否在录音)，用于换算字幕的录音相对时间
+        self.record_marks = deque(maxlen=int(config.ring_buffer_seconds / 0.1))
+        self.pipeline = (
+            StagedPipeline(f"upload:{session.session_id}", queue_size=config.pipeline_queue_size)
+            .add_stage("vad", self.vad_stage, fan_out=True)
+            .add_stage("asr", self.asr_stage)
+            .add_stage("translate", self.translate_stage)
+            .add_stage("publish", self.publish_stage)
+        )
+
+    def start(self):
+        self.pipeline.start()
+
+    async def close(self):
+        await self.pipeline.close()
+        self.cache.clear()
+
+    async def ingest(self, data):
+        """写入环形缓冲区并把凑满的 VAD 块送入流水线，返回写入的样本数"""
+        if self.framed is None:
+            self.framed = is_framed(data)
+            logger.info(f"[upload] 会话 {self.session.session_id} 音频格式: {'帧协议' if self.framed else '裸 PCM'}")
+        if self.framed:
+            written = self.write_frame(data)
+        elif self.codec == "pcm":
+            written = self.ring.write(data)
+        else:
+            written = self.ring.write_samples(self.decode(data))
+        while True:
+            chunk_start = self.ring.read_pos
+            chunk = self.ring.read_chunk(self.chunk_size)
+            if chunk is None:
+                break
+            # 块是环形缓冲区的视图：队列有界，处理滞后远小于缓冲区容量，不会被覆盖
+            await self.pipeline.put((chunk_start, chunk))
+        return written
+
+    def write_frame(self, data):
+        """解析一帧并按采集样本序号写入环形缓冲区，返回写入的样本数（含补齐的静音）"""
+        try:
+            frame = parse_frame(data, self.codec)
+            samples = frame.samples()
+        except FrameError as e:
+            self.sequencer.bad_frames += 1
+            logger.warning(f"[frame] 丢弃无效帧: {e}")
+            return 0
+        gap = self.sequencer.accept(frame, len(samples))
+        if gap is None:
+            return 0
+        if self.sequencer.frames == 1:
+            self.capture_offset = frame.sample_index - self.ring.write_pos
+        written = 0
+        if gap:
+            fill = min(gap, self.max_gap_fill)
+            written = self.ring.write_samples(np.zeros(fill, dtype=np.int16))
+            self.capture_offset += gap - fill
+        self.record_marks.append((self.ring.write_pos, frame.record_samples, frame.recording))
+        return written + self.ring.write_samples(samples)
+
+    def decode(self, data):
+        """旧版无帧头连接的压缩负载：每条消息是一段独立的编码数据"""
+        try:
+            return decode_payload(self.codec, data)
+        except FrameError as e:
+            logger.warning(f"[upload] 丢弃无法解码的音频消息: {e}")
+            return np.zeros(0, dtype=np.int16)
+
+    def capture_time(self, pos):
+        """环形缓冲区绝对序号 → 采集流中的时间（秒）"""
+        return (pos + self.capture_offset) / config.sample_rate
+
+    def recording_time_at(self, pos):
+        """按帧头中的录音样本数计算 pos 处的录音相对时间，返回 (秒 | None, 是否暂停)"""
+        for mark_pos, record_samples, recording in reversed(self.record_marks):
+            if mark_pos <= pos:
+                if record_samples is None:
+                    return None, False
+                if not recording:
+                    return None, True
+                return (record_samples + pos - mark_pos) / config.sample_rate, False
+        return None, False
+
+    def stats(self):
+        return {
+            "load": self.monitor.snapshot(),
+            "pipeline_depths": self.pipeline.depths(),
+            "frames": self.sequencer.stats() if self.framed else None,
+            "energy_gate": self.gate.stats() if self.gate is not None else None,
+            "fbank": self.fbank.stats() if self.fbank is not None else None,
+        }
+
+    async def vad_stage(self, item):
+        chunk_start, chunk = item
+        chunk_end = chunk_start + len(chunk)
+        if self.gate is not None and not self.gate.update(chunk) and self.last_vad_beg == -1:
+            # 明显静音且没有进行中的语音段：跳过 VAD，VAD 状态停在空闲，后续时间戳整体偏移
+            self.vad_skipped += len(chunk)
+            self.vad_pos = chunk_end
+            self.ring.discard_before(chunk_end - self.vad_keep_samples)
+            await self.update_load()
+            return []
+        vad_start = time.perf_counter()
+        res = await run_blocking(vad_executor, self.vad_chunk, chunk)
+        self.vad_pos = chunk_end
+        segments = []
+        if not len(res[0]["value"]) and self.last_vad_beg == -1:
+            # 没有进行中的语音段时只保留少量回看音频，静音期间缓冲区不再增长
+            self.ring.discard_before(chunk_end - self.vad_keep_samples)
+        for segment in res[0]["value"]:
+            if segment[0] > -1:
+                self.last_vad_beg = segment[0]
+                self.cut_pos = None
+            if segment[1] > -1: self.last_vad_end = segment[1]
+
+            if self.last_vad_beg > -1 and self.last_vad_end > -1:
+                # VAD 时间戳是相对其输入开始的毫秒数，加上能量门跳过的偏移即为环形缓冲区的绝对采样序号
+                beg = self.segment_beg()
+                end = self.vad_to_pos(self.last_vad_end)
+                continues = self.cut_pos is not None
+                self.last_vad_beg = self.last_vad_end = -1
+                self.cut_pos = None
+
+                # 确保end > beg，防止无效音频段
+                if end <= beg:
+                    logger.debug(f"跳过无效音频段: beg={beg}, end={end}")
+                    continue
+                feats = await self.segment_features(beg, end)
+                job = self.make_segment(beg, end, continues=continues, feats=feats)
+                if job is not None:
+                    segments.append(job)
+
+        if self.last_vad_beg > -1 and self.max_segment_samples > 0:
+            beg = self.segment_beg()
+            if chunk_end - beg > self.max_segment_samples:
+                # 连续讲话超过上限：在接近上限处能量最低的位置切一刀，先识别前一片
+                search_beg = max(beg + 1, beg + self.max_segment_samples - self.cut_search_samples)
+                cut = search_beg + lowest_energy_offset(
+                    self.ring.view(search_beg, chunk_end), config.sample_rate // 50)
+                next_beg = max(beg, cut - self.overlap_samples)
+                feats = await self.segment_features(beg, cut)
+                job = self.make_segment(beg, cut, continues=self.cut_pos is not None, cut_tail=True,
+                                        keep_from=next_beg, feats=feats)
+                if job is not None:
+                    segments.append(job)
+                self.cut_pos = next_beg
+                logger.info(f"[vad segment] 语音段超过 {config.max_segment_seconds}s，在 {self.capture_time(cut):.2f}s 处强制切分")
+
+        if config.stream_partials and self.last_vad_beg > -1 and not self.monitor.overloaded:
+            # partial 在 VAD 阶段内发送，必然早于同一段经过 ASR/翻译后的 final
+            await self.publish_partial(chunk_end)
+        # VAD 阶段的耗时包含切段时的特征提取和 partial 的增量编码：它们都在处理下一块之前完成
+        self.monitor.update("vad", time.perf_counter() - vad_start, len(chunk) / config.sample_rate)
+        await self.update_load()
+        return segments
+
+    def segment_beg(self):
+        """进行中语音段的起点：强制切分过则从切分点（含重叠）开始"""
+        if self.cut_pos is not None:
+            return self.cut_pos
+        return self.vad_to_pos(self.last_vad_beg)
+
+    def vad_to_pos(self, ms):
+        """VAD 时间戳（毫秒）→ 环形缓冲区绝对采样序号"""
+        return int(ms * config.sample_rate / 1000) + self.vad_skipped
+
+    def vad_chunk(self, chunk):
+        """VAD 执行器中处理一块：流式 VAD；语音进行中（或本块开始语音）时随即增量计算新到达的 fbank 帧，
+        语音段结束时特征已在缓存中，不再压在出字幕的关键路径上"""
+        res = vad_generate(input=chunk, cache=self.cache, is_final=False, chunk_size=config.chunk_size_ms)
+        if self.fbank is not None and (self.last_vad_beg > -1 or any(s[0] > -1 for s in res[0]["value"])):
+            self.fbank.advance()
+        return res
+
+    async def segment_features(self, beg, end):
+        """从增量 fbank 缓存中取 [beg, end) 的特征（在 VAD 执行器中，缓存缺失的帧当场补算）；不可用时返回 None（回退为送音频）"""
+        if self.fbank is None:
+            return None
+        try:
+            return await run_blocking(vad_executor, self.fbank.features, beg, end)
+        except Exception as e:
+            logger.warning(f"[fbank] 增量特征计算失败，回退为整段提取: {e}")
+            return None
+
+    def make_segment(self, beg, end, continues=False, cut_tail=False, keep_from=None, feats=None):
+        """切出 [beg, end) 作为一个待识别语音段
+
+        continues: 本段从上一次强制切分处开始；cut_tail: 本段以强制切分结束
+        keep_from: 缓冲区从该位置起继续保留（强制切分时保留与下一片的重叠部分），默认为 end
+        feats: 预先算好的特征（IncrementalFbank），ASR 时跳过特征提取
+        """
+        # 语音段会在 ASR 队列中等待，复制出来以免被后续写入覆盖
+        segment_audio = self.ring.view(beg, end).copy()
+        self.ring.discard_before(end if keep_from is None else keep_from)
+        logger.info(f"[vad segment] audio_len: {len(segment_audio)}")
+
+        # 跳过空音频段或过短的音频段
+        if len(segment_audio) <= 0:
+            logger.debug("跳过空音频段")
+            return None
+        self.pending_asr_samples += len(segment_audio)
+        self.partial_state = None
+        return {
+            "audio": segment_audio,
+            "feats": feats,
+            "ring_beg": beg,
+            "audio_chunk_offset": self.capture_time(beg),  # 音频块在采集流中的偏移时间
+            "continues": continues,
+            "cut_tail": cut_tail,
+        }
+
+    async def update_load(self):
+        """更新积压时长并重新评估过载状态，状态变化时通知采集端"""
+        backlog = self.ring.write_pos - self.vad_pos + self.pending_asr_samples + self.pending_translate_samples
+        self.monitor.set_backlog(backlog / config.sample_rate)
+        if not self.monitor.check():
+            return
+        snapshot = self.monitor.snapshot()
+        if self.monitor.overloaded:
+            logger.warning(f"[load] 会话 {self.session.session_id} 处理跟不上实时，启用降载策略 {config.overload_policy}: {snapshot}")
+        else:
+            logger.info(f"[load] 会话 {self.session.session_id} 已恢复实时: {snapshot}")
+        uploader = self.session.uploader
+        if uploader is None:
+            return
+        try:
+            await uploader.send_json({
+                "type": "throttle",
+                "active": self.monitor.overloaded,
+                "policy": config.overload_policy,
+                "rtf": snapshot["rtf"],
+                "backlog_seconds": snapshot["backlog_seconds"],
+            })
+        except Exception as e:
+            logger.warning(f"[load] 通知采集端失败: {e}")
+
+    async def publish_partial(self, chunk_end):
+        subscriber = self.session.latest_subscriber
+        if subscriber is None:
+            return
+        beg = self.segment_beg()
+        if self.partial_state is None or self.partial_beg != beg:
+            self.partial_state = new_partial_state(self.lang)
+            self.partial_beg = beg
+        feats = await self.segment_features(beg, chunk_end)
+        try:
+            text = await run_blocking(
+                stream_executor, asr_partial,
+                self.ring.view(beg, chunk_end) if feats is None else feats, self.partial_state,
+            )
+        except Exception as e:
+            logger.warning(f"[partial] 流式识别失败: {e}")
+            self.partial_state = None
+            return
+        if text is None:
+            return
+        plain_text = strip_asr_tags(text)
+        if not plain_text:
+            return
+        await subscriber.send_json({
+            "type": "partial",
+            "partial": plain_text,
+            "timestamp": time.time(),
+            "audio_chunk_offset": self.capture_time(beg),
+        })
+        logger.debug(f"[partial] 发送中间结果: '{plain_text[:20]}...'")
+
+    async def clear_partial(self, job, reason):
+        """语音段结束但不会推送 final（空文本、丢弃、暂停等）时通知订阅端清除该段的 partial，
+        否则 partial 要等到下一条 final 才消失；audio_chunk_offset 让订阅端不误清后续语音段的 partial"""
+        subscriber = self.session.latest_subscriber
+        if not config.stream_partials or subscriber is None:
+            return
+        try:
+            await subscriber.send_json({
+                "type": "partial_clear",
+                "timestamp": time.time(),
+                "audio_chunk_offset": job["audio_chunk_offset"],
+            })
+        except Exception as e:
+            logger.warning(f"[partial] 通知订阅端清除 partial 失败: {e}")
+            return
+        logger.debug(f"[partial] 语音段无 final（{reason}），清除 partial: offset={job['audio_chunk_offset']:.2f}s")
+
+    async def asr_stage(self, job):
+        audio = job.pop("audio")
+        feats = job.pop("feats", None)
+        pending = len(audio)
+        if self.monitor.overloaded:
+            if config.overload_policy == "drop_oldest" and self.monitor.over_lag():
+                # 积压超过上限：丢弃最旧的待识别段，让字幕追上实时
+                self.pending_asr_samples -= len(audio)
+                self.monitor.record_shed("drop_oldest")
+                self.prev_piece_text = None
+                await self.update_load()
+                logger.warning(f"[load] 丢弃积压语音段: offset={job['audio_chunk_offset']:.2f}s, {len(audio) / config.sample_rate:.2f}s")
+                await self.clear_partial(job, "drop_oldest")
+                return None
+            if config.overload_policy == "merge_segments":
+                # 把队列中已就绪的后续语音段与当前段合并为一次识别，减少逐段调用开销
+                ready = self.pipeline.take_ready("asr", config.merge_max_segments - 1)
+                if ready:
+                    pending += sum(len(j["audio"]) for j in ready)
+                    # 强制切分的后续片段带有重叠音频，合并时去掉
+                    audio = np.concatenate([audio] + [
+                        j["audio"][self.overlap_samples:] if j["continues"] else j["audio"] for j in ready
+                    ])
+                    job["cut_tail"] = ready[-1]["cut_tail"]
+                    feats = None
+                    self.monitor.record_shed("merge_segments")
+                    logger.info(f"[load] 合并 {len(ready) + 1} 个语音段识别, 总长 {len(audio) / config.sample_rate:.2f}s")
+
+        # 计算音频块的精确时间戳
+        job["chunk_start_time"] = time.time()
+        asr_start = time.perf_counter()
+        try:
+            result = await asr_scheduler.submit(audio if feats is None else feats, self.lang, use_itn=True)
+        finally:
+            self.pending_asr_samples -= pending
+        self.monitor.update("asr", time.perf_counter() - asr_start, len(audio) / config.sample_rate)
+        await self.update_load()
+        logger.debug(f"asr result: {result}")
+        if not result:
+            await self.clear_partial(job, "无识别结果")
+            return None
+        # 翻译跟不上时语音段积压在翻译队列中：这部分音频计入积压，等待时间计入翻译阶段
+        job["audio_samples"] = len(audio)
+        job["asr_done"] = time.perf_counter()
+        self.pending_translate_samples += len(audio)
+
+        asr_text = result[0]['text']
+        plain_text = strip_asr_tags(asr_text)
+        piece_text = plain_text
+        if job.get("continues"):
+            # 强制切分的后一片：去掉与前一片重叠音频重复识别的文字
+            plain_text = stitch_text(self.prev_piece_text, plain_text, config.segment_overlap_ms / 1000)
+        self.prev_piece_text = piece_text if job.get("cut_tail") else None
+        self.session.last_plain_text = plain_text
+        self.session.last_info_text = clean_text_for_translate(plain_text)
+        job["plain_text"] = plain_text
+        job["src_lang"] = ASR_LANG_MAP.get(extract_lang_from_asr(asr_text), "zho_Hans")
+        return job
+
+    async def translate_stage(self, job):
+        translate_start = time.perf_counter()
+        try:
+            return await self.translate_job(job)
+        finally:
+            # 按实际执行的耗时计算翻译阶段 RTF（跳过翻译时接近 0，过载因此能够解除）
+            self.pending_translate_samples -= job["audio_samples"]
+            self.monitor.update("translate", time.perf_counter() - translate_start,
+                                job["audio_samples"] / config.sample_rate, wait=translate_start - job["asr_done"])
+            await self.update_load()
+
+    async def translate_job(self, job):
+        # 修复：原声字幕与翻译功能解耦，始终推送原声字幕
+        subscriber = self.session.latest_subscriber
+        if not (subscriber and subscriber in self.session.subscriber_langs):
+            await self.clear_partial(job, "订阅端未设置语言")
+            return None
+        # 只在有有效内容时才发送，避免发送空字幕
+        if not (job["plain_text"] and job["plain_text"].strip()):
+            logger.debug("跳过空字幕，不发送")
+            await self.clear_partial(job, "空文本")
+            return None
+        tgt_lang_sub = self.session.subscriber_langs[subscriber]
+        logger.info(f"推送字幕，当前目标语言: {tgt_lang_sub}")
+
+        # 只有在翻译模型可用时才进行翻译
+        translated = ""
+        if self.monitor.overloaded and config.overload_policy == "skip_translation":
+            # 过载时只推送原声字幕，翻译让位于识别
+            self.monitor.record_shed("skip_translation")
+            logger.debug("[load] 过载中，跳过翻译")
+        elif translation_enabled and translator is not None and sp is not None:
+            try:
+                translated = await run_blocking(
+                    translate_executor, translate_text,
+                    job["plain_text"], src_lang=job["src_lang"], tgt_lang=tgt_lang_sub,
+                )
+                logger.info(f"推送字幕内容 translated: {translated}")
+            except Exception as e:
+                logger.error(f"翻译失败: {e}")
+                translated = ""
+        else:
+            logger.debug("翻译模型未加载，仅推送原声字幕")
+        job["translated"] = translated
+        return job
+
+    async def publish_stage(self, job):
+        subscriber = self.session.latest_subscriber
+        if subscriber is None:
+            return None
+        plain_text = job["plain_text"]
+        chunk_start_time = job["chunk_start_time"]
+
+        # 如果正在录音，计算相对于录音开始的精确时间戳（使用音频数据时长）
+        recording_relative_time, session_is_paused = compute_recording_relative_time(self.session, chunk_start_time, job["ring_beg"])
+        if session_is_paused:
+            logger.debug(f"[subtitle] 录音会话暂停中，跳过字幕: '{plain_text[:20]}...'")
+            await self.clear_partial(job, "录音暂停")
+            return None
+
+        response = TranscriptionResponse(
+            code=0,
+            info=plain_text,  # 直接用原声
+            data=plain_text,  # 直接用原声
+            translated=job["translated"]  # 可能为空字符串
+        )
+
+        # 添加精确时间戳到响应中
+        response_data = response.model_dump()
+        response_data['type'] = 'final'
+        response_data['timestamp'] = chunk_start_time
+        response_data['audio_sync_time'] = chunk_start_time  # 用于音频同步的精确时间戳
+        response_data['audio_chunk_offset'] = job["audio_chunk_offset"]  # 音频块在音频流中的偏移
+
+        # 如果正在录音，添加相对时间戳
+        if recording_relative_time is not None:
+            response_data['recording_relative_time'] = recording_relative_time
+            response_data['recording_start_time'] = self.session.recording_start_time
+
+        await subscriber.send_json(response_data)
+
+        # 记录字幕时间戳用于调试
+        logger.debug(f"[subtitle] 发送字幕: '{plain_text[:20]}...', 时间戳: {chunk_start_time:.3f}")
+        return None
 
 @app.websocket("/ws/upload")
 async def audio_uploader(websocket: WebSocket):
-    global latest_subscriber, last_plain_text, last_info_text, latest_device_list, latest_uploader, current_recording_start_time
     await websocket.accept()
-    latest_uploader = websocket  # 新增：注册采集端连接
+    query_params = parse_qs(websocket.scope['query_string'].decode())
+    codec = query_params.get('codec', ['pcm'])[0].lower()
+    if codec not in SUPPORTED_CODECS:
+        logger.error(f"[upload] 不支持的音频编码: {codec}，支持: {SUPPORTED_CODECS}")
+        await websocket.send_json({"type": "error", "data": f"unsupported codec: {codec}"})
+        await websocket.close(code=1003)
+        return
+    logger.info(f"[upload] 音频编码: {codec}")
+    session = session_registry.get_or_create(session_id_from_query(query_params))
+    if session.uploader is not None:
+        logger.warning(f"[upload] 会话 {session.session_id} 已有采集端，新连接将替换旧连接")
+    session.uploader = websocket  # 新增：注册采集端连接
+    logger.info(f"[upload] new client: {websocket.client}, session: {session.session_id}")
+    stream = None
     try:
-        query_params = parse_qs(websocket.scope['query_string'].decode())
         sv = query_params.get('sv', ['false'])[0].lower() in ['true', '1', 't', 'y', 'yes']
         lang = query_params.get('lang', ['auto'])[0].lower()
         tgt_lang = query_params.get('tgt_lang', ['en'])[0].lower()
 
-        chunk_size = int(config.chunk_size_ms * config.sample_rate / 1000)
-        audio_buffer = np.array([], dtype=np.float32)
-        audio_vad = np.array([], dtype=np.float32)
-        cache, cache_asr = {}, {}
-        last_vad_beg = last_vad_end = -1
-        offset, hit = 0, False
-        buffer = b""
+        stream = UploadStream(session, lang, codec)
+        session.stream = stream
+        stream.start()
 
         while True:
             try:
@@ -652,26 +1539,25 @@ async def audio_uploader(websocket: WebSocket):
                     break
                 elif msg['type'] == 'websocket.receive':
                     if 'bytes' in msg:
-                        data = msg['bytes']
-                        buffer += data
-                        if len(buffer) < 2:
+                        written = await stream.ingest(msg['bytes'])
+                        if written == 0:
                             continue
 
-                        raw_audio_data = buffer[:len(buffer) - (len(buffer) % 2)]
-                        
                         # 只在有活跃录音会话时才缓存音频数据
-                        if recording_enabled and recording_sessions:
+                        if session.recording_enabled and session.recordings:
+                            ring = stream.ring
+                            raw_audio_data = ring.view_int16(ring.write_pos - written, ring.write_pos).tobytes()
                             current_time = time.time()
                             cached_sessions = 0
-                            for session_id, session in recording_sessions.items():
-                                if session.get('is_active', False):
+                            for recording_id, recording in session.recordings.items():
+                                if recording.get('is_active', False):
                                     # 为每个活跃会话缓存音频数据
-                                    if session_id not in recording_audio_buffer:
-                                        recording_audio_buffer[session_id] = deque()
-                                        recording_timestamps[session_id] = deque()
+                                    if recording_id not in session.recording_audio_buffer:
+                                        session.recording_audio_buffer[recording_id] = deque()
+                                        session.recording_timestamps[recording_id] = deque()
                                     
-                                    recording_audio_buffer[session_id].append(raw_audio_data)
-                                    recording_timestamps[session_id].append(current_time)
+                                    session.recording_audio_buffer[recording_id].append(raw_audio_data)
+                                    session.recording_timestamps[recording_id].append(current_time)
                                     cached_sessions += 1
                             
                             # 调试信息：显示缓存状态
@@ -679,218 +1565,6 @@ async def audio_uploader(websocket: WebSocket):
                                 logger.debug(f"[recording] 音频缓存: {cached_sessions}个活跃会话, 时间戳: {current_time:.3f}, 数据大小: {len(raw_audio_data)} bytes")
                             else:
                                 logger.debug(f"[recording] 录音会话已暂停，跳过音频缓存")
-
-                        audio_buffer = np.append(
-                            audio_buffer,
-                            np.frombuffer(raw_audio_data, dtype=np.int16).astype(np.float32) / 32767.0
-                        )
-                        buffer = buffer[len(buffer) - (len(buffer) % 2):]
-
-                        while len(audio_buffer) >= chunk_size:
-                            chunk = audio_buffer[:chunk_size]
-                            audio_buffer = audio_buffer[chunk_size:]
-                            audio_vad = np.append(audio_vad, chunk)
-
-                            res = model_vad.generate(input=chunk, cache=cache, is_final=False, chunk_size=config.chunk_size_ms)
-                            if len(res[0]["value"]):
-                                vad_segments = res[0]["value"]
-                                for segment in vad_segments:
-                                    if segment[0] > -1: last_vad_beg = segment[0]
-                                    if segment[1] > -1: last_vad_end = segment[1]
-
-                                    if last_vad_beg > -1 and last_vad_end > -1:
-                                        # 修复：确保时间戳计算的正确性
-                                        adjusted_beg = max(0, last_vad_beg - offset)  # 防止负值
-                                        adjusted_end = max(0, last_vad_end - offset)  # 防止负值
-                                        
-                                        # 确保end > beg，防止无效音频段
-                                        if adjusted_end <= adjusted_beg:
-                                            logger.debug(f"跳过无效音频段: beg={adjusted_beg}, end={adjusted_end}")
-                                            last_vad_beg = last_vad_end = -1
-                                            continue
-                                        
-                                        offset += adjusted_end
-                                        beg = int(adjusted_beg * config.sample_rate / 1000)
-                                        end = int(adjusted_end * config.sample_rate / 1000)
-                                        audio_len = end - beg
-                                        logger.info(f"[vad segment] audio_len: {audio_len}")
-
-                                        # 跳过空音频段或过短的音频段
-                                        if audio_len <= 0:
-                                            logger.debug("跳过空音频段")
-                                            audio_vad = audio_vad[end:] if end > 0 else audio_vad
-                                            last_vad_beg = last_vad_end = -1
-                                            continue
-
-                                        # 计算音频块的精确时间戳
-                                        chunk_start_time = time.time()
-                                        audio_chunk_offset = beg / config.sample_rate  # 音频块在总音频中的偏移时间
-                                        
-                                        result = asr(audio_vad[beg:end], lang.strip(), cache_asr, True)
-                                        logger.debug(f"asr result: {result}")
-                                        audio_vad = audio_vad[end:]
-                                        last_vad_beg = last_vad_end = -1
-
-                                        if result:
-                                            asr_text = result[0]['text']
-                                            
-                                            formatted_text = format_str_v3(asr_text)
-                                            def strip_asr_tags(text):
-                                                import re
-                                                text = re.sub(r'<\|.*?\|>', '', text)
-                                                text = text.replace('withitn', '').replace('woitn', '')
-                                                return text.strip()
-                                            plain_text = strip_asr_tags(asr_text)
-                                            info_text = clean_text_for_translate(plain_text)
-                                            def extract_lang_from_asr(text):
-                                                import re
-                                                m = re.match(r"<\|([a-z]{2,3})\|>", text)
-                                                if m:
-                                                    return m.group(1)
-                                                return "zh"  # 默认中文
-                                            lang_map = {
-                                                "zh": "zho_Hans",  # 中文简体
-                                                "en": "eng_Latn",  # 英语
-                                                "ja": "jpn_Jpan",  # 日语
-                                                "ko": "kor_Hang",  # 韩语
-                                                "ru": "rus_Cyrl",  # 俄语
-                                                "fr": "fra_Latn",  # 法语
-                                                "de": "deu_Latn",  # 德语
-                                                "es": "spa_Latn",  # 西班牙语
-                                                "ar": "ara_Arab",  # 阿拉伯语
-                                                "vi": "vie_Latn",  # 越南语
-                                                "th": "tha_Thai",  # 泰语
-                                                "id": "ind_Latn",  # 印尼语
-                                                "ms": "msa_Latn",  # 马来语
-                                                "fil": "fil_Latn", # 菲律宾语
-                                                "km": "khm_Khmr",  # 高棉语
-                                                "my": "bur_Mymr",  # 缅甸语
-                                                "tr": "tur_Latn",  # 土耳其语
-                                                "it": "ita_Latn",  # 意大利语
-                                                "pt": "por_Latn",  # 葡萄牙语
-                                                "hi": "hin_Deva",  # 印地语
-                                                "bn": "ben_Beng",  # 孟加拉语
-                                                "ta": "tam_Taml",  # 泰米尔语
-                                                "ur": "urd_Arab",  # 乌尔都语
-                                            }
-                                            asr_lang = extract_lang_from_asr(asr_text)
-                                            src_lang = lang_map.get(asr_lang, "zho_Hans")
-                                            plain_text = strip_asr_tags(asr_text)
-                                            last_plain_text = plain_text
-                                            last_info_text = info_text
-                                            
-                                            # 修复：原声字幕与翻译功能解耦，始终推送原声字幕
-                                            if latest_subscriber and latest_subscriber in subscriber_langs:
-                                                tgt_lang_sub = subscriber_langs[latest_subscriber]
-                                                logger.info(f"推送字幕，当前目标语言: {tgt_lang_sub}")
-                                                
-                                                # 只有在翻译模型可用时才进行翻译
-                                                translated = ""
-                                                if translation_enabled and translator is not None and sp is not None:
-                                                    try:
-                                                        translated = translate_text(plain_text, src_lang=src_lang, tgt_lang=tgt_lang_sub)
-                                                        logger.info(f"推送字幕内容 translated: {translated}")
-                                                    except Exception as e:
-                                                        logger.error(f"翻译失败: {e}")
-                                                        translated = ""
-                                                else:
-                                                    logger.debug("翻译模型未加载，仅推送原声字幕")
-                                                
-                                                # 只在有有效内容时才发送，避免发送空字幕
-                                                if plain_text and plain_text.strip():
-                                                    # 计算精确的音频同步时间戳
-                                                    audio_sync_timestamp = chunk_start_time
-                                                    
-                                                    # 如果正在录音，计算相对于录音开始的精确时间戳（使用音频数据时长）
-                                                    recording_relative_time = None
-                                                    if current_recording_start_time is not None:
-                                                        # 尝试从音频采集器获取精确的音频时长
-                                                        try:
-                                                            # 获取音频采集器的精确音频时长
-                                                            audio_duration = global_audio_handler.get_current_audio_duration() if hasattr(global_audio_handler, 'get_current_audio_duration') else None
-                                                            
-                                                            if audio_duration is not None:
-                                                                # 使用基于音频数据的精确时长作为时间戳
-                                                                recording_relative_time = audio_duration
-                                                                logger.debug(f"[timestamp] 使用音频数据精确时长: {recording_relative_time:.3f}s")
-                                                            else:
-                                                                # 回退到原有逻辑：使用音频块的实际开始时间计算
-                                                                # 修复：简化时间戳计算，直接使用当前时间与录音开始时间的差值
-                                                                base_relative_time = chunk_start_time - current_recording_start_time
-                                                                
-                                                                # 从所有活跃录音会话中找到并扣除累积暂停时间
-                                                                total_pause_time = 0
-                                                                session_is_paused = False
-                                                                for session_id, session in recording_sessions.items():
-                                                                    if session.get('is_active', False):
-                                                                        # 获取该会话的累积暂停时间
-                                                                        total_pause_time = session.get('total_paused_time', 0)
-                                                                        
-                                                                        # 关键检查：如果当前正在暂停中，直接跳过这个字幕
-                                                                        if session.get('pause_start'):
-                                                                            session_is_paused = True
-                                                                            logger.debug(f"[timestamp] 检测到会话{session_id}正在暂停中，跳过字幕记录")
-                                                                            break
-                                                                        
-                                                                        break  # 只处理第一个活跃会话
-                                                                
-                                                                # 如果会话正在暂停，直接跳过后续处理
-                                                                if session_is_paused:
-                                                                    logger.debug(f"[subtitle] 录音会话暂停中，跳过字幕: '{plain_text[:20]}...'")
-                                                                    continue
-                                                                
-                                                                # 计算去除暂停时间后的有效录音时间
-                                                                recording_relative_time = max(0, base_relative_time - total_pause_time)
-                                                                logger.debug(f"[timestamp] 修复后时间戳计算: 基础时间={base_relative_time:.3f}s, 暂停时间={total_pause_time:.3f}s, 有效时间={recording_relative_time:.3f}s")
-                                                        except Exception as e:
-                                                            logger.warning(f"[timestamp] 获取音频时长失败，使用最终回退计算: {e}")
-                                                            # 最终回退到基础计算（简化版本）
-                                                            recording_relative_time = max(0, chunk_start_time - current_recording_start_time)
-                                                        
-                                                        # 获取播放时间同步管理器并添加字幕
-                                                        for session_id, session in recording_sessions.items():
-                                                            if session.get('is_active', False):
-                                                                # 字幕同步功能已迁移到双流音频服务
-                                                                # sync_manager = get_playback_sync_manager(session_id)
-                                                                # sync_manager.add_subtitle(plain_text, translated, chunk_start_time)
-                                                                pass
-                                                    
-                                                    response = TranscriptionResponse(
-                                                        code=0,
-                                                        info=plain_text,  # 直接用原声
-                                                        data=plain_text,  # 直接用原声
-                                                        translated=translated  # 可能为空字符串
-                                                    )
-                                                    
-                                                    # 添加精确时间戳到响应中
-                                                    response_data = response.model_dump()
-                                                    response_data['timestamp'] = chunk_start_time
-                                                    response_data['audio_sync_time'] = audio_sync_timestamp  # 用于音频同步的精确时间戳
-                                                    response_data['audio_chunk_offset'] = audio_chunk_offset  # 音频块在音频流中的偏移
-                                                    
-                                                    # 如果正在录音，添加相对时间戳和播放时间信息
-                                                    if recording_relative_time is not None:
-                                                        response_data['recording_relative_time'] = recording_relative_time
-                                                        response_data['recording_start_time'] = current_recording_start_time
-                                                        
-                                                        # 添加播放时间信息
-                                                        for session_id, session in recording_sessions.items():
-                                                            if session.get('is_active', False):
-                                                                # 播放时间同步功能已迁移到双流音频服务
-                                                                # sync_manager = get_playback_sync_manager(session_id)
-                                                                # playback_time = sync_manager._convert_to_playback_time(chunk_start_time)
-                                                                # if playback_time is not None:
-                                                                #     response_data['playback_time'] = playback_time
-                                                                #     response_data['session_id'] = session_id
-                                                                # break
-                                                                pass
-                                                    
-                                                    await latest_subscriber.send_json(response_data)
-                                                    
-                                                    # 记录字幕时间戳用于调试
-                                                    logger.debug(f"[subtitle] 发送字幕: '{plain_text[:20]}...', 时间戳: {chunk_start_time:.3f}")
-                                                else:
-                                                    logger.debug("跳过空字幕，不发送")
                     elif 'text' in msg:
                         # 处理JSON指令，如设备列表、切换等
                         try:
@@ -898,16 +1572,15 @@ async def audio_uploader(websocket: WebSocket):
                             logger.info(f"[upload] 收到文本消息: {data}")
                             # 新增：收到设备列表时缓存并推送给所有订阅者
                             if isinstance(data, dict) and 'device_list' in data:
-                                latest_device_list = data['device_list']
-                                logger.info(f"[upload] 更新设备列表: {latest_device_list}")
+                                session.device_list = data['device_list']
+                                logger.info(f"[upload] 更新设备列表: {session.device_list}")
                                 # 推送给所有订阅者
-                                for ws in list(subscribers):
+                                for ws in list(session.subscribers):
                                     try:
-                                        await ws.send_json({"device_list": latest_device_list})
+                                        await ws.send_json({"device_list": session.device_list})
                                     except Exception as e:
                                         logger.warning(f"[upload] 推送设备列表失败，移除无效连接: {e}")
-                                        subscribers.discard(ws)
-                                        subscriber_langs.pop(ws, None)
+                                        session.remove_subscriber(ws)
                             
                             # 新增：转发录音相关消息给订阅者
                             elif isinstance(data, dict) and ('recording_started' in data or 'recording_completed' in data):
@@ -915,17 +1588,17 @@ async def audio_uploader(websocket: WebSocket):
                                 
                                 # 如果是录音开始消息，保存录音开始时间用于时间戳同步
                                 if 'recording_started' in data and 'start_time' in data:
-                                    current_recording_start_time = data['start_time']
-                                    logger.info(f"[upload] 录音开始时间已保存: {current_recording_start_time}")
+                                    session.recording_start_time = data['start_time']
+                                    logger.info(f"[upload] 录音开始时间已保存: {session.recording_start_time}")
                                 # 如果是录音结束消息，清除录音开始时间
                                 elif 'recording_completed' in data:
-                                    current_recording_start_time = None
+                                    session.recording_start_time = None
                                     logger.info(f"[upload] 录音开始时间已清除")
                                 
                                 # 推送给最新的订阅者
-                                if latest_subscriber:
+                                if session.latest_subscriber:
                                     try:
-                                        await latest_subscriber.send_json(data)
+                                        await session.latest_subscriber.send_json(data)
                                         logger.debug(f"[upload] 录音消息已转发给订阅者")
                                     except Exception as e:
                                         logger.warning(f"[upload] 转发录音消息失败: {e}")
@@ -941,20 +1614,20 @@ async def audio_uploader(websocket: WebSocket):
                 await asyncio.sleep(0.1)
     except WebSocketDisconnect:
         # 处理WebSocket正常断开连接
-        if websocket == latest_uploader:
-            latest_uploader = None
-        logger.info("[upload] client disconnected")
+        logger.info(f"[upload] client disconnected, session: {session.session_id}")
     except Exception as e:
         logger.error(f"[upload] error: {e}\n{traceback.format_exc()}")
         # 不要主动关闭连接，让客户端处理重连
-        if websocket == latest_uploader:
-            latest_uploader = None
     finally:
-        cache.clear()
-        subscribers.clear()
-        subscriber_langs.clear()
-        latest_subscriber = None
-        logger.info("[upload] Clean up completed")
+        if stream is not None:
+            await stream.close()
+        if session.stream is stream:
+            session.stream = None
+        if session.uploader == websocket:
+            session.uploader = None
+            session.clear_subscribers()
+        session_registry.release(session)
+        logger.info(f"[upload] Clean up completed, session: {session.session_id}")
 
 def generate_wav_header(data_size, use_hq=False):
     """生成WAV文件头"""
@@ -971,20 +1644,20 @@ def generate_wav_header(data_size, use_hq=False):
             SAMPLE_RATE, SAMPLE_RATE * CHANNELS * BYTES_PER_SAMPLE,
             CHANNELS * BYTES_PER_SAMPLE, 16, b'data', data_size)
 
-def extract_audio_segment(session_id, use_hq=False):
+def extract_audio_segment(stream_session, session_id, use_hq=False):
     """从指定会话的缓存中提取音频数据"""
     logger.info(f"[recording] 开始提取音频数据: session_id={session_id}, use_hq={use_hq}")
     
-    if session_id not in recording_audio_buffer:
+    if session_id not in stream_session.recording_audio_buffer:
         logger.warning(f"[recording] 未找到音频缓存: session_id={session_id}")
-        logger.info(f"[recording] 当前缓存的会话: {list(recording_audio_buffer.keys())}")
+        logger.info(f"[recording] 当前缓存的会话: {list(stream_session.recording_audio_buffer.keys())}")
         return None
         
-    if session_id not in recording_timestamps:
+    if session_id not in stream_session.recording_timestamps:
         logger.warning(f"[recording] 未找到时间戳缓存: session_id={session_id}")
         return None
     
-    audio_chunks = list(recording_audio_buffer[session_id])
+    audio_chunks = list(stream_session.recording_audio_buffer[session_id])
     if not audio_chunks:
         logger.warning(f"[recording] 音频缓存为空: session_id={session_id}")
         return None
@@ -1034,10 +1707,11 @@ def extract_audio_segment(session_id, use_hq=False):
 async def recording_controller(websocket: WebSocket):
     """录音控制端点"""
     await websocket.accept()
-    logger.info(f"[recording] new client: {websocket.client}")
+    query_params = parse_qs(websocket.scope['query_string'].decode())
+    stream_session = session_registry.get_or_create(session_id_from_query(query_params))
+    logger.info(f"[recording] new client: {websocket.client}, session: {stream_session.session_id}")
     
     try:
-        global recording_enabled
         while True:
             msg = await websocket.receive_text()
             logger.info(f"[recording] 收到消息: {msg}")
@@ -1055,7 +1729,7 @@ async def recording_controller(websocket: WebSocket):
                 filename = data.get("filename", f"recording_{session_id}.wav")
                 
                 # 创建录音会话
-                recording_sessions[session_id] = {
+                stream_session.recordings[session_id] = {
                     "start_time": start_time,
                     "end_time": None,
                     "filename": filename,
@@ -1065,11 +1739,11 @@ async def recording_controller(websocket: WebSocket):
                 }
                 
                 # 启用全局录音缓存
-                recording_enabled = True
+                stream_session.recording_enabled = True
                 
                 # 初始化此会话的音频缓存
-                recording_audio_buffer[session_id] = deque()
-                recording_timestamps[session_id] = deque()
+                stream_session.recording_audio_buffer[session_id] = deque()
+                stream_session.recording_timestamps[session_id] = deque()
                 
                 await websocket.send_json({
                     "success": True,
@@ -1086,21 +1760,21 @@ async def recording_controller(websocket: WebSocket):
                 session_id = data.get("session_id")
                 if not session_id:
                     # 找到最新的活跃录音会话
-                    active_sessions = {k: v for k, v in recording_sessions.items() if v.get('is_active', False)}
+                    active_sessions = {k: v for k, v in stream_session.recordings.items() if v.get('is_active', False)}
                     if active_sessions:
                         session_id = max(active_sessions.keys(), key=lambda k: active_sessions[k]["start_time"])
                 
-                if session_id in recording_sessions:
-                    session = recording_sessions[session_id]
+                if session_id in stream_session.recordings:
+                    session = stream_session.recordings[session_id]
                     session["is_active"] = False  # 暂停缓存
                     session["pause_time"] = time.time()
                     session["pause_start"] = time.time()  # 记录当前暂停开始时间
                     
                     # 检查是否还有其他活跃会话
-                    active_count = sum(1 for s in recording_sessions.values() if s.get('is_active', False))
+                    active_count = sum(1 for s in stream_session.recordings.values() if s.get('is_active', False))
                     if active_count == 0:
                         # 没有活跃会话了，关闭全局录音缓存
-                        recording_enabled = False
+                        stream_session.recording_enabled = False
                         logger.info("[recording] 所有录音会话已暂停，关闭音频缓存")
                     
                     await websocket.send_json({
@@ -1121,11 +1795,11 @@ async def recording_controller(websocket: WebSocket):
                 session_id = data.get("session_id")
                 if not session_id:
                     # 找到最新的录音会话
-                    if recording_sessions:
-                        session_id = max(recording_sessions.keys(), key=lambda k: recording_sessions[k]["start_time"])
+                    if stream_session.recordings:
+                        session_id = max(stream_session.recordings.keys(), key=lambda k: stream_session.recordings[k]["start_time"])
                 
-                if session_id in recording_sessions:
-                    session = recording_sessions[session_id]
+                if session_id in stream_session.recordings:
+                    session = stream_session.recordings[session_id]
                     
                     # 计算当前暂停时长并累加到总暂停时间
                     if session.get("pause_start"):
@@ -1138,7 +1812,7 @@ async def recording_controller(websocket: WebSocket):
                     session["pause_start"] = None  # 清除暂停开始时间
                     
                     # 启用全局录音缓存
-                    recording_enabled = True
+                    stream_session.recording_enabled = True
                     
                     await websocket.send_json({
                         "success": True,
@@ -1159,22 +1833,22 @@ async def recording_controller(websocket: WebSocket):
                 session_id = data.get("session_id")
                 if not session_id:
                     # 找到最新的活跃录音会话
-                    active_sessions = {k: v for k, v in recording_sessions.items() if v.get('is_active', False)}
+                    active_sessions = {k: v for k, v in stream_session.recordings.items() if v.get('is_active', False)}
                     if active_sessions:
                         session_id = max(active_sessions.keys(), key=lambda k: active_sessions[k]["start_time"])
                         logger.info(f"[recording] 未指定session_id，使用最新活跃会话: {session_id}")
                     else:
                         logger.warning(f"[recording] 未找到活跃会话，检查所有会话...")
-                        if recording_sessions:
-                            session_id = max(recording_sessions.keys(), key=lambda k: recording_sessions[k]["start_time"])
+                        if stream_session.recordings:
+                            session_id = max(stream_session.recordings.keys(), key=lambda k: stream_session.recordings[k]["start_time"])
                             logger.info(f"[recording] 使用最新会话: {session_id}")
                 
                 logger.info(f"[recording] 准备停止会话: {session_id}")
-                logger.info(f"[recording] 当前所有会话: {list(recording_sessions.keys())}")
-                logger.info(f"[recording] 当前音频缓存会话: {list(recording_audio_buffer.keys())}")
+                logger.info(f"[recording] 当前所有会话: {list(stream_session.recordings.keys())}")
+                logger.info(f"[recording] 当前音频缓存会话: {list(stream_session.recording_audio_buffer.keys())}")
                 
-                if session_id in recording_sessions:
-                    session = recording_sessions[session_id]
+                if session_id in stream_session.recordings:
+                    session = stream_session.recordings[session_id]
                     logger.info(f"[recording] 找到会话，当前状态: is_active={session.get('is_active', False)}")
                     
                     # 如果是从暂停状态停止，需要计算最后一次暂停的时长
@@ -1187,14 +1861,14 @@ async def recording_controller(websocket: WebSocket):
                     session["is_active"] = False
                     
                     # 检查是否还有其他活跃会话
-                    active_count = sum(1 for s in recording_sessions.values() if s.get('is_active', False))
+                    active_count = sum(1 for s in stream_session.recordings.values() if s.get('is_active', False))
                     if active_count == 0:
                         # 没有活跃会话了，关闭全局录音缓存
-                        recording_enabled = False
+                        stream_session.recording_enabled = False
                         logger.info("[recording] 所有录音会话结束，已关闭音频缓存")
                     
                     # 提取音频数据（启用高质量音频）
-                    audio_data = extract_audio_segment(session_id, use_hq=True)
+                    audio_data = extract_audio_segment(stream_session, session_id, use_hq=True)
                     
                     if audio_data:
                         # 保存到文件 - 统一使用相对于a4s目录的recordings路径
@@ -1286,11 +1960,11 @@ async def recording_controller(websocket: WebSocket):
                             logger.error(f"[recording] 无法发送失败响应，连接已断开")
                     
                     # 清理会话缓存
-                    if session_id in recording_audio_buffer:
-                        del recording_audio_buffer[session_id]
-                    if session_id in recording_timestamps:
-                        del recording_timestamps[session_id]
-                    del recording_sessions[session_id]
+                    if session_id in stream_session.recording_audio_buffer:
+                        del stream_session.recording_audio_buffer[session_id]
+                    if session_id in stream_session.recording_timestamps:
+                        del stream_session.recording_timestamps[session_id]
+                    del stream_session.recordings[session_id]
                     
                 else:
                     await websocket.send_json({
@@ -1300,12 +1974,12 @@ async def recording_controller(websocket: WebSocket):
             
             elif "get_status" in data:
                 # 获取录音状态
-                active_sessions = {k: v for k, v in recording_sessions.items() if v.get('is_active', False)}
-                total_buffer_size = sum(len(buf) for buf in recording_audio_buffer.values())
+                active_sessions = {k: v for k, v in stream_session.recordings.items() if v.get('is_active', False)}
+                total_buffer_size = sum(len(buf) for buf in stream_session.recording_audio_buffer.values())
                 
                 await websocket.send_json({
                     "success": True,
-                    "recording_enabled": recording_enabled,
+                    "recording_enabled": stream_session.recording_enabled,
                     "active_sessions": len(active_sessions),
                     "total_buffer_size": total_buffer_size,
                     "sessions": list(active_sessions.keys())
@@ -1316,6 +1990,8 @@ async def recording_controller(websocket: WebSocket):
     except Exception as e:
         logger.error(f"[recording] error: {e}\n{traceback.format_exc()}")
         # 不要主动关闭连接，让客户端处理重连
+    finally:
+        session_registry.release(stream_session)
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,108 @@
+# a4s/session.py
+# 字幕会话：一路音频流（一个采集端 + 若干订阅端）的全部运行状态
+# 一个后端进程可以同时服务多个会话（例如同一台机器上的多个会议室），会话之间互不干扰
+import time
+from loguru import logger
+
+DEFAULT_SESSION_ID = "default"
+
+
+class Session:
+    """单个音频流会话
+
+    - 连接：采集端 uploader、订阅端集合及各自的目标语言
+    - 字幕状态：最近一次字幕文本（切换目标语言时重翻译用）、设备列表
+    - 录音状态：录音开始时间、录音缓存和录音会话记录
+    - stream：采集端连接期间的音频处理状态（环形缓冲区、VAD/ASR 缓存、流水线），由服务端创建
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.created_at = time.time()
+
+        self.uploader = None
+        self.stream = None
+        self.subscribers = set()
+        self.subscriber_langs = dict()  # 记录目标语言
+        self.latest_subscriber = None   # 只保留最新的订阅者
+
+        self.last_plain_text = None     # 最近一次的纯文本字幕
+        self.last_info_text = None      # 最近一次的 info 字幕
+        self.device_list = []           # 最新设备列表
+
+        self.recording_start_time = None  # 当前录音开始时间（用于时间戳同步）
+        self.recording_audio_buffer = {}  # {recording_id: deque(...)}
+        self.recording_timestamps = {}    # {recording_id: deque(...)}
+        self.recordings = {}              # 录音会话 {recording_id: {start_time, end_time, filename, is_active}}
+        self.recording_enabled = False    # 录音缓存开关
+
+    def add_subscriber(self, websocket, lang='en'):
+        self.subscribers.add(websocket)
+        self.subscriber_langs[websocket] = lang
+        self.latest_subscriber = websocket
+
+    def remove_subscriber(self, websocket):
+        self.subscribers.discard(websocket)
+        self.subscriber_langs.pop(websocket, None)
+        if websocket == self.latest_subscriber:
+            self.latest_subscriber = None
+
+    def clear_subscribers(self):
+        self.subscribers.clear()
+        self.subscriber_langs.clear()
+        self.latest_subscriber = None
+
+    def is_idle(self):
+        """没有任何连接和录音时，会话可以被回收"""
+        return (
+            self.uploader is None
+            and not self.subscribers
+            and not self.recordings
+        )
+
+    def summary(self):
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "uploader_connected": self.uploader is not None,
+            "subscribers": len(self.subscribers),
+            "recording_enabled": self.recording_enabled,
+            "recordings": list(self.recordings.keys()),
+            "stream": self.stream.stats() if self.stream is not None else None,
+        }
+
+
+class SessionRegistry:
+    """按会话 ID 管理所有活跃会话"""
+
+    def __init__(self):
+        self._sessions = {}
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id=None):
+        session_id = session_id or DEFAULT_SESSION_ID
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id)
+            self._sessions[session_id] = session
+            logger.info(f"[session] 创建会话: {session_id} (当前会话数: {len(self._sessions)})")
+        return session
+
+    def release(self, session):
+        """会话空闲时从注册表中移除"""
+        if session.is_idle() and self._sessions.get(session.session_id) is session:
+            del self._sessions[session.session_id]
+            logger.info(f"[session] 回收会话: {session.session_id} (当前会话数: {len(self._sessions)})")
+
+    def sessions(self):
+        return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def session_id_from_query(query_params):
+    """从 WebSocket 查询参数中读取会话 ID（?session=room1），未指定时使用默认会话"""
+    return query_params.get('session', [DEFAULT_SESSION_ID])[0] or DEFAULT_SESSION_ID
@@ -0,0 +1,33 @@
+# a4s/stitch.py
+# 强制切分后相邻两片识别文本的拼接：下一片向前重叠了一小段音频，重叠部分会被前后两片都识别到
+import re
+
+# 重叠音频中最多能容纳的识别单元数按较快语速估计：中日文约 6 字/秒，有空格分词的语言约 3 词/秒
+CHARS_PER_SECOND = 6
+WORDS_PER_SECOND = 3
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]")
+
+
+def stitch_text(prev, cur, overlap_seconds=0.3):
+    """去掉 cur 开头与 prev 结尾重复识别的部分
+
+    含中日文字符时按字比较（至少 2 字才算重复），否则按词比较；忽略标点和大小写。
+    去掉的长度不超过 overlap_seconds 的音频能说出的字/词数（300ms 约 2 字或 1 词），
+    且至少保留 cur 的一个字/词：更长的重复是真实的重复说话（如“好的好的”），不能删掉。
+    """
+    if not prev or not cur:
+        return cur
+    by_char = bool(_CJK.search(cur))
+    pattern = r"[^\W_]" if by_char else r"[^\W_]+"
+    min_overlap = 2 if by_char else 1
+    rate = CHARS_PER_SECOND if by_char else WORDS_PER_SECOND
+    max_overlap = max(min_overlap, int(overlap_seconds * rate + 0.5))
+    prev_tokens = [m.group().lower() for m in re.finditer(pattern, prev)]
+    cur_matches = list(re.finditer(pattern, cur))
+    cur_tokens = [m.group().lower() for m in cur_matches]
+    for k in range(min(max_overlap, len(prev_tokens), len(cur_tokens) - 1), min_overlap - 1, -1):
+        if prev_tokens[-k:] == cur_tokens[:k]:
+            rest = cur[cur_matches[k - 1].end():]
+            return re.sub(r"^[\W_]+", "", rest)
+    return cur
@@ -0,0 +1,32 @@
+# a4s/tests/conftest.py
+# 测试从 a4s 目录导入模块（与服务运行时相同）；model.py 按 funasr remote_code 的方式以模块名 "model" 加载
+import importlib.util
+import os
+import sys
+import pytest
+import torch
+
+A4S_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, A4S_DIR)
+
+
+@pytest.fixture(scope="session")
+def model_module():
+    pytest.importorskip("funasr")
+    if "model" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("model", os.path.join(A4S_DIR, "model.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["model"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["model"]
+
+
+@pytest.fixture()
+def small_model(model_module):
+    """随机权重的小 SenseVoiceSmall（结构与正式模型相同，只缩小维度和层数）"""
+    torch.manual_seed(0)
+    return model_module.SenseVoiceSmall(
+        encoder="SenseVoiceEncoderSmall",
+        encoder_conf=dict(output_size=64, attention_heads=4, linear_units=128, num_blocks=4, tp_blocks=2),
+        input_size=40, vocab_size=60,
+    ).eval()
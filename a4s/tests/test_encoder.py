@@ -0,0 +1,65 @@
+# a4s/tests/test_encoder.py
+# 编码器各快速路径与原始实现的数值一致性，使用随机权重的小模型
+import pytest
+import torch
+
+
+def padded_batch(frames=(50, 37, 21), dim=40, seed=1):
+    """按最长一条补零的批：(speech, lengths)"""
+    torch.manual_seed(seed)
+    speech = torch.zeros(len(frames), max(frames), dim)
+    for i, n in enumerate(frames):
+        speech[i, :n] = torch.randn(n, dim)
+    return speech, torch.tensor(frames, dtype=torch.int32)
+
+
+def set_sdpa(model, model_module, enabled):
+    for module in model.modules():
+        if isinstance(module, model_module.MultiHeadedAttentionSANM):
+            module.use_sdpa = enabled
+
+
+@pytest.mark.skipif(not hasattr(torch.nn.functional, "scaled_dot_product_attention"), reason="torch 无 SDPA")
+def test_sdpa_matches_manual_attention_on_padded_batch(small_model, model_module):
+    speech, lengths = padded_batch()
+    outputs = {}
+    with torch.no_grad():
+        for enabled in (False, True):
+            set_sdpa(small_model, model_module, enabled)
+            outputs[enabled] = small_model.encoder(speech.clone(), lengths)
+    assert torch.equal(outputs[False][1], outputs[True][1])
+    for i, n in enumerate(lengths.tolist()):
+        # 有效帧必须一致；补零帧之后会被 CTC 按长度截掉
+        torch.testing.assert_close(outputs[True][0][i, :n], outputs[False][0][i, :n], rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("frames", [(50,), (40, 40, 40)], ids=["single", "equal-length"])
+def test_mask_free_fast_path_matches_masked(small_model, frames):
+    speech, lengths = padded_batch(frames)
+    encoder = small_model.encoder
+    assert encoder.is_unpadded(speech, lengths)
+    outputs = {}
+    with torch.no_grad():
+        for fast in (False, True):
+            encoder.mask_free_fast_path = fast
+            outputs[fast] = encoder(speech.clone(), lengths)
+    assert torch.equal(outputs[False][1], outputs[True][1])
+    torch.testing.assert_close(outputs[True][0], outputs[False][0], rtol=1e-4, atol=1e-5)
+
+
+def test_padded_batch_keeps_masked_path(small_model, model_module, monkeypatch):
+    speech, lengths = padded_batch()
+    encoder = small_model.encoder
+    assert encoder.mask_free_fast_path and not encoder.is_unpadded(speech, lengths)
+    calls = []
+    sequence_mask = model_module.sequence_mask
+
+    def spy(*args, **kwargs):
+        calls.append(args)
+        return sequence_mask(*args, **kwargs)
+
+    monkeypatch.setattr(model_module, "sequence_mask", spy)
+    with torch.no_grad():
+        _, olens = encoder(speech.clone(), lengths)
+    assert calls
+    assert olens.tolist() == lengths.tolist()
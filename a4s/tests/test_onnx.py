@@ -0,0 +1,37 @@
+# a4s/tests/test_onnx.py
+# ONNX 导出与 onnxruntime 后端，使用随机权重的小模型
+import pytest
+import torch
+
+from onnx_backend import OnnxEncoderBackend, export_encoder_ctc
+
+
+def test_export_without_dynamo_parameter(small_model, tmp_path, monkeypatch):
+    # torch < 2.5 的 torch.onnx.export 没有 dynamo 参数，传入会 TypeError
+    calls = []
+
+    def export(model, args, f, input_names=None, output_names=None, dynamic_axes=None, opset_version=None):
+        calls.append(opset_version)
+        open(f, "wb").close()
+
+    monkeypatch.setattr(torch.onnx, "export", export)
+    path = str(tmp_path / "encoder_ctc.onnx")
+    assert export_encoder_ctc(small_model, path) == path
+    assert calls == [17]
+
+
+def test_onnx_backend_matches_torch(small_model, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    path = export_encoder_ctc(small_model, str(tmp_path / "encoder_ctc.onnx"))
+    backend = OnnxEncoderBackend(path)
+    torch.manual_seed(1)
+    speech = torch.randn(2, 50, 40)
+    lengths = torch.tensor([50, 33], dtype=torch.int32)
+    with torch.no_grad():
+        encoder_out, expected_lens = small_model.encoder(speech.clone(), lengths)
+        expected = small_model.ctc.log_softmax(encoder_out)
+    logits, lens = backend(speech, lengths)
+    assert lens.tolist() == expected_lens.tolist()
+    for i, n in enumerate(lengths.tolist()):
+        torch.testing.assert_close(logits[i, :n], expected[i, :n], rtol=1e-3, atol=1e-4)
@@ -0,0 +1,18 @@
+from pipeline import RealtimeMonitor
+
+
+def test_translate_bottleneck_trips_overload():
+    monitor = RealtimeMonitor(max_lag_seconds=10.0)
+    for _ in range(5):
+        monitor.update("vad", 0.05, 1.0)
+        monitor.update("asr", 0.2, 2.0)
+        monitor.update("translate", 3.0, 2.0, wait=1.5)
+    assert monitor.check() and monitor.overloaded
+    snapshot = monitor.snapshot()
+    assert snapshot["stage_rtf"]["translate"] == 1.5
+    assert snapshot["stage_wait_seconds"]["translate"] == 1.5
+
+    # 过载后跳过翻译，翻译阶段耗时接近 0：滑动平均逐步回落，过载解除
+    for _ in range(20):
+        monitor.update("translate", 0.001, 2.0, wait=0.0)
+    assert monitor.check() and not monitor.overloaded
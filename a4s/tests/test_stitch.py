@@ -0,0 +1,38 @@
+# a4s/tests/test_stitch.py
+# 强制切分处的文本拼接：只去掉 300ms 重叠音频能容纳的重复，真实的重复说话保留
+from stitch import stitch_text
+
+
+def test_removes_overlap_chars():
+    assert stitch_text("我们今天主要讨论", "讨论下个季度的预算") == "下个季度的预算"
+
+
+def test_removes_overlap_word():
+    assert stitch_text("so we will start", "Start, the meeting now") == "the meeting now"
+
+
+def test_never_removes_whole_piece():
+    assert stitch_text("好的好的", "好的") == "好的"
+    assert stitch_text("yes yes", "yes") == "yes"
+
+
+def test_repeated_phrase_across_cut_keeps_real_repetition():
+    # 重叠只有约 2 个字：去掉一个“好的”，后面真实说出的“好的”保留
+    assert stitch_text("好的好的好的", "好的好的我们开始") == "好的我们开始"
+    assert stitch_text("谢谢大家谢谢大家", "谢谢大家谢谢大家") == "谢谢大家谢谢大家"
+
+
+def test_repeated_words_across_cut():
+    assert stitch_text("thank you thank you", "thank you very much") == "thank you very much"
+    assert stitch_text("no no no", "no no we can't") == "no we can't"
+
+
+def test_overlap_limit_scales_with_overlap_duration():
+    assert stitch_text("我们今天主要讨论", "主要讨论预算") == "主要讨论预算"
+    assert stitch_text("我们今天主要讨论", "主要讨论预算", overlap_seconds=0.7) == "预算"
+
+
+def test_no_overlap_or_empty():
+    assert stitch_text("今天天气不错", "我们开始吧") == "我们开始吧"
+    assert stitch_text(None, "开始") == "开始"
+    assert stitch_text("开始", "") == ""
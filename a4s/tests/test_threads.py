@@ -0,0 +1,23 @@
+import pytest
+
+from threads import PROFILES, plan_threads
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+@pytest.mark.parametrize("stream", [True, False])
+def test_plan_threads_follows_weights(profile, stream):
+    weights = {role: w for role, w in PROFILES[profile].items() if stream or role != "stream"}
+    for cores in range(1, 33):
+        budget = plan_threads(cores, profile, stream)
+        assert all(n >= 1 for n in budget.values())
+        # 核心数不足以让每个角色独占时各开 1 线程，否则总数不超过核心数
+        used = budget["vad"] + sum(budget[role] for role in weights)
+        assert used <= max(cores, 1 + len(weights)), (cores, budget)
+        for a in weights:
+            for b in weights:
+                if weights[a] > weights[b]:
+                    assert budget[a] >= budget[b], (cores, budget)
+
+
+def test_plan_threads_five_cores():
+    assert plan_threads(5, "captions+translation") == {"vad": 1, "asr": 2, "stream": 1, "translate": 1}
@@ -0,0 +1,42 @@
+import json
+
+from translation_cache import TranslationCache
+
+
+def test_load_skips_malformed_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text(json.dumps({"model": "m", "entries": [
+        ["好的。", "zho_Hans", "eng_Latn", "Okay."],
+        ["缺少译文", "zho_Hans", "eng_Latn"],
+        "not a list",
+        ["数字", "zho_Hans", "eng_Latn", 42],
+        None,
+        ["是的。", "zho_Hans", "eng_Latn", "Yes."],
+    ]}, ensure_ascii=False), encoding="utf-8")
+    cache = TranslationCache(path=str(path))
+    cache.bind_model("m")
+    assert cache.load() == 2
+    assert cache.get("好的。", "zho_Hans", "eng_Latn") == "Okay."
+    assert cache.get("是的。", "zho_Hans", "eng_Latn") == "Yes."
+    assert cache.get("缺少译文", "zho_Hans", "eng_Latn") is None
+
+
+def test_load_ignores_wrong_top_level(tmp_path):
+    path = tmp_path / "cache.json"
+    for content in ("[1, 2, 3]", '{"model": "m", "entries": {"a": 1}}'):
+        path.write_text(content, encoding="utf-8")
+        cache = TranslationCache(path=str(path))
+        cache.bind_model("m")
+        assert cache.load() == 0
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = TranslationCache(path=path)
+    cache.bind_model("m")
+    cache.put("好的。", "zho_Hans", "eng_Latn", "Okay.")
+    assert cache.save() == 1
+    restored = TranslationCache(path=path)
+    restored.bind_model("m")
+    assert restored.load() == 1
+    assert restored.get("好的。", "zho_Hans", "eng_Latn") == "Okay."
@@ -0,0 +1,113 @@
+# a4s/threads.py
+# CPU 线程预算：torch（ASR、流式 partial、VAD）与 ctranslate2（翻译）在同一进程中运行，
+# 各库默认都按全部核心开线程，识别与翻译重叠时核心会被超额订阅。
+# 这里按可用核心数（CPU 亲和性）和使用场景给每个角色分配线程数；
+# 对 ASR 尾延迟的实际影响与机器相关，需在多核部署机上用 benchmark.py threads 测量
+import os
+import threading
+import torch
+from loguru import logger
+
+# 场景 → 各角色分到的核心权重（VAD 模型很小，固定 1 线程，不参与按权重分配）
+PROFILES = {
+    "captions": {"asr": 3, "stream": 1},
+    "captions+translation": {"asr": 2, "stream": 1, "translate": 2},
+}
+
+
+def available_cores():
+    """本进程可用的核心数：优先取 CPU 亲和性（容器/taskset 限制），否则取逻辑核数"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def plan_threads(cores, profile, stream=True):
+    """按场景把 cores 个核心分给各角色，返回 {角色: 线程数}
+
+    VAD 先占 1 核，其余按权重用最大余数法分配，每个角色至少 1 线程；
+    核心数不足以让每个角色独占时（例如单核），各角色都只开 1 线程，把超额订阅降到最低。
+    不在场景中的角色（captions 下的 translate）也给 1 线程，仅作兜底。
+    """
+    weights = {role: w for role, w in PROFILES[profile].items() if stream or role != "stream"}
+    budget = {"vad": 1, "asr": 1, "stream": 1, "translate": 1}
+    remaining = cores - 1
+    if remaining <= len(weights):
+        return budget
+    total = sum(weights.values())
+    shares = {role: remaining * w / total for role, w in weights.items()}
+    for role, share in shares.items():
+        budget[role] = max(1, int(share))
+    # 取整后剩下的核心按小数部分从大到小补给各角色；被抬到 1 线程的角色已经多拿了核心，不再参与，
+    # 否则它的小数部分可能排在权重更大的角色前面，分配结果与权重顺序相反
+    leftover = remaining - sum(budget[role] for role in weights)
+    ranked = [role for role in weights if shares[role] >= 1]
+    for role in sorted(ranked, key=lambda r: shares[r] - int(shares[r]), reverse=True)[:max(leftover, 0)]:
+        budget[role] += 1
+    return budget
+
+
+class ThreadBudget:
+    """各角色线程数的中心配置
+
+    torch 的 intra-op 线程数（OpenMP 后端）按调用线程生效：每个角色的工作线程在推理前调用
+    apply(role)，只在预算变化后第一次调用时真正设置，之后只是一次比较。
+    ctranslate2 的线程数在创建 Translator 时确定，由 translator_kwargs() 提供。
+    profile 为 "auto" 时按翻译模型是否加载在 captions 与 captions+translation 之间切换（set_translation）。
+    """
+
+    def __init__(self, profile="auto", cores=None, stream=True):
+        if profile != "auto" and profile not in PROFILES:
+            raise ValueError(f"未知的线程预算场景: {profile}")
+        self.profile = profile
+        self.cores = cores or available_cores()
+        self.stream = stream
+        self.translation = False
+        self.version = 0
+        self._local = threading.local()
+        self.budget = self._plan()
+
+    def active_profile(self):
+        if self.profile != "auto":
+            return self.profile
+        return "captions+translation" if self.translation else "captions"
+
+    def _plan(self):
+        budget = plan_threads(self.cores, self.active_profile(), self.stream)
+        logger.info(f"[threads] {self.cores} 核, 场景 {self.active_profile()}: {budget}")
+        return budget
+
+    def set_translation(self, loaded):
+        """翻译模型加载/卸载后重新分配（只影响 auto 场景）"""
+        if self.translation == loaded:
+            return
+        self.translation = loaded
+        if self.profile == "auto":
+            self.budget = self._plan()
+            self.version += 1
+
+    def threads(self, role):
+        return self.budget[role]
+
+    def apply(self, role):
+        """在当前线程中按角色设置 torch intra-op 线程数"""
+        if getattr(self._local, "applied", None) == (role, self.version):
+            return
+        torch.set_num_threads(self.budget[role])
+        self._local.applied = (role, self.version)
+
+    def apply_global(self):
+        """进程级设置：inter-op 线程池只能在首次并行计算前设置一次；主线程按 ASR 预算（模型加载、预热）"""
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError as e:
+            logger.debug(f"[threads] inter-op 线程数已固定，跳过: {e}")
+        self.apply("asr")
+
+    def translator_kwargs(self):
+        """ctranslate2.Translator 的线程参数：翻译在单线程执行器中串行执行，inter_threads 取 1"""
+        return {"intra_threads": self.budget["translate"], "inter_threads": 1}
+
+    def stats(self):
+        return {"cores": self.cores, "profile": self.active_profile(), "threads": dict(self.budget)}
@@ -0,0 +1,150 @@
+# a4s/translation_cache.py
+# 翻译结果的 LRU 缓存：会议/直播中大量重复的短句（问候、“好的”、“是的”、固定说法、人名），
+# 以及切换目标语言时对最近一条字幕的重翻译，都不必再经过 SentencePiece 分词和 ctranslate2 解码
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from loguru import logger
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """缓存键用的规范化：去掉首尾空白、连续空白合并为一个空格（大小写和标点会影响译文，保持不变）"""
+    return _SPACES.sub(" ", text).strip()
+
+
+def is_valid_entry(entry):
+    """缓存文件中的一条记录: [文本, 源语言, 目标语言, 译文]，均为字符串"""
+    return isinstance(entry, list) and len(entry) == 4 and all(isinstance(v, str) for v in entry)
+
+
+class TranslationCache:
+    """(规范化文本, 源语言, 目标语言) → 译文 的有界 LRU 缓存，附带 SentencePiece 分词结果的记忆
+
+    - 译文缓存满后淘汰最久未使用的条目；分词缓存与语言无关，按文本单独计数和淘汰
+    - path 不为 None 时可以 save()/load() 到 JSON 文件，跨重启保留译文缓存；
+      文件中记录翻译模型路径，模型变化后旧缓存作废
+    线程安全：翻译在翻译执行器中串行执行，统计接口可能在事件循环中调用，统一加锁。
+    """
+
+    def __init__(self, max_entries=4096, max_pieces=4096, path=None):
+        self.max_entries = max_entries
+        self.max_pieces = max_pieces
+        self.path = path
+        self.model = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (text, src, tgt) → 译文
+        self._pieces = OrderedDict()    # text → SentencePiece 分词结果
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.piece_hits = 0
+        self.piece_misses = 0
+
+    def get(self, text, src, tgt):
+        key = (text, src, tgt)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, text, src, tgt, translated):
+        with self._lock:
+            self._entries[(text, src, tgt)] = translated
+            self._entries.move_to_end((text, src, tgt))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def encode(self, text, sp):
+        """sp.EncodeAsPieces(text) 的记忆版本，返回新列表（调用方会在前后拼接语言标记）"""
+        with self._lock:
+            pieces = self._pieces.get(text)
+            if pieces is not None:
+                self._pieces.move_to_end(text)
+                self.piece_hits += 1
+                return list(pieces)
+            self.piece_misses += 1
+        pieces = sp.EncodeAsPieces(text)
+        with self._lock:
+            self._pieces[text] = tuple(pieces)
+            while len(self._pieces) > self.max_pieces:
+                self._pieces.popitem(last=False)
+        return list(pieces)
+
+    def bind_model(self, model):
+        """翻译模型（重新）加载后调用：分词器可能已变化，清空分词缓存；模型变化时清空译文缓存"""
+        with self._lock:
+            self._pieces.clear()
+            if self.model is not None and self.model != model:
+                self._entries.clear()
+            self.model = model
+
+    def load(self):
+        """从 path 读取译文缓存，返回读入的条目数；文件不存在、损坏或属于其他模型时返回 0"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[translate-cache] 缓存文件读取失败，忽略: {self.path}: {e}")
+            return 0
+        if not isinstance(data, dict) or not isinstance(data.get("entries", []), list):
+            logger.warning(f"[translate-cache] 缓存文件格式不正确，忽略: {self.path}")
+            return 0
+        if self.model is not None and data.get("model") != self.model:
+            logger.info(f"[translate-cache] 缓存文件属于其他翻译模型，忽略: {data.get('model')}")
+            return 0
+        # 逐条校验：文件可能被手工编辑或由旧版本写入，格式不对的条目跳过，不影响翻译模型加载
+        entries = [entry for entry in data.get("entries", []) if is_valid_entry(entry)]
+        skipped = len(data.get("entries", [])) - len(entries)
+        if skipped:
+            logger.warning(f"[translate-cache] 跳过 {skipped} 条格式不正确的缓存条目: {self.path}")
+        entries = entries[-self.max_entries:]
+        with self._lock:
+            for text, src, tgt, translated in entries:
+                self._entries.setdefault((text, src, tgt), translated)
+        logger.info(f"[translate-cache] 从 {self.path} 读入 {len(entries)} 条译文缓存")
+        return len(entries)
+
+    def save(self):
+        """把译文缓存按最近使用顺序写入 path（先写临时文件再改名），返回写入的条目数"""
+        if not self.path:
+            return 0
+        with self._lock:
+            entries = [[text, src, tgt, translated] for (text, src, tgt), translated in self._entries.items()]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        logger.info(f"[translate-cache] 已保存 {len(entries)} 条译文缓存: {self.path}")
+        return len(entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pieces.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "pieces": len(self._pieces),
+                "piece_hits": self.piece_hits,
+                "piece_misses": self.piece_misses,
+            }
@@ -0,0 +1,93 @@
+# a4s/warmup.py
+# 模型预热：启动时和模型（重新）加载后，用合成语音段/固定句子把 ASR、VAD、翻译各跑几遍，
+# 让内存分配器扩容、oneDNN 算子选择、ctranslate2 初始化等一次性开销发生在第一条真实字幕之前
+import threading
+import time
+import numpy as np
+from loguru import logger
+
+# 各源语言的预热句子：短句（问候/应答）+ 长句，覆盖字幕里常见的两种长度
+WARMUP_TEXTS = {
+    "zh": ["好的。", "今天的会议主要讨论下个季度的产品计划，请大家先看一下共享的文档。"],
+    "en": ["Okay.", "Today we will mainly discuss the product plan for next quarter, so please take a look at the shared document first."],
+    "ja": ["はい。", "今日の会議では主に来四半期の製品計画について話し合います。"],
+    "ko": ["네.", "오늘 회의에서는 주로 다음 분기 제품 계획에 대해 논의하겠습니다."],
+    "yue": ["好呀。", "今日個會主要傾下季嘅產品計劃，大家可以先睇下共享文件。"],
+}
+
+
+def synthetic_speech(seconds, sample_rate=16000, seed=0):
+    """类语音的合成信号（float32，[-1, 1]）：基频抖动的谐波 + 4Hz 音节包络 + 少量噪声
+
+    只用于预热：长度决定编码器的帧数和各层张量大小，内容是否能识别出文字无关紧要。
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    audio = 0.2 * envelope * voiced + 0.01 * rng.standard_normal(len(t))
+    return np.clip(audio, -1.0, 1.0).astype(np.float32)
+
+
+def time_calls(fn, cases, rounds=3):
+    """依次对每个用例调用 fn(case)：第 1 次记为冷启动耗时，其余 rounds - 1 次取平均为预热后耗时
+
+    cases 为 (标签, 输入) 列表，返回 {标签: {"cold_ms": ..., "warm_ms": ...}}。
+    """
+    timings = {}
+    for label, case in cases:
+        elapsed = []
+        for _ in range(max(rounds, 1)):
+            start_time = time.perf_counter()
+            fn(case)
+            elapsed.append((time.perf_counter() - start_time) * 1000)
+        timings[label] = {
+            "cold_ms": round(elapsed[0], 1),
+            "warm_ms": round(float(np.mean(elapsed[1:])), 1) if len(elapsed) > 1 else None,
+        }
+    return timings
+
+
+class WarmupStatus:
+    """各组件的预热状态（pending / running / done / failed），供 /status 查询
+
+    预热失败只记录并告警，不阻止服务启动：该组件退化为首次调用时才付出冷启动开销。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.components = {}
+
+    def run(self, name, fn, cases, rounds=3):
+        """预热一个组件并记录冷/热耗时，返回是否成功"""
+        with self._lock:
+            self.components[name] = {"state": "running", "timings": {}}
+        start_time = time.time()
+        try:
+            timings = time_calls(fn, cases, rounds)
+        except Exception as e:
+            logger.warning(f"[warmup] {name} 预热失败，首次调用将承担冷启动开销: {e}")
+            with self._lock:
+                self.components[name] = {"state": "failed", "timings": {}, "error": str(e)}
+            return False
+        with self._lock:
+            self.components[name] = {"state": "done", "timings": timings, "seconds": round(time.time() - start_time, 2)}
+        summary = ", ".join(f"{label}: 冷 {t['cold_ms']:.0f} ms → 热 {t['warm_ms']:.0f} ms"
+                            if t["warm_ms"] is not None else f"{label}: {t['cold_ms']:.0f} ms"
+                            for label, t in timings.items())
+        logger.info(f"[warmup] {name} 预热完成 ({time.time() - start_time:.1f}s): {summary}")
+        return True
+
+    def skip(self, name):
+        with self._lock:
+            self.components.pop(name, None)
+
+    def busy(self):
+        with self._lock:
+            return any(c["state"] == "running" for c in self.components.values())
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(c) for name, c in self.components.items()}
@@ -1726,6 +1726,33 @@ window.addEventListener('DOMContentLoaded', () => {
     subtitleContainer.innerText = 'window.subtitleAPI 未注入，preload.js 可能未生效';
   }
 
+  function renderPartial(text, offset) {
+    if (!subtitleContainer || isStartupMode) return;
+    let partialElement = subtitleContainer.querySelector('.partial');
+    if (!text) {
+      if (partialElement) partialElement.remove();
+      return;
+    }
+    if (!partialElement) {
+      partialElement = document.createElement('div');
+      partialElement.className = 'partial';
+      subtitleContainer.appendChild(partialElement);
+    }
+    partialElement.className = isArabic(text) ? 'partial arabic' : 'partial';
+    partialElement.textContent = text;
+    // 记录 partial 所属语音段的起点，partial_clear 只清除该段及更早语音段的 partial
+    partialElement.dataset.offset = typeof offset === 'number' ? String(offset) : '';
+  }
+
+  function clearPartial(offset) {
+    if (!subtitleContainer) return;
+    const partialElement = subtitleContainer.querySelector('.partial');
+    if (!partialElement) return;
+    const shown = parseFloat(partialElement.dataset.offset);
+    if (typeof offset === 'number' && !isNaN(shown) && shown > offset) return;
+    partialElement.remove();
+  }
+
   function renderSubtitles() {
     if (!subtitleContainer || isStartupMode) return;
     
@@ -1866,6 +1893,18 @@ window.addEventListener('DOMContentLoaded', () => {
       return;
     }
     
+    // 流式识别的中间结果：显示在字幕区域底部，收到该段最终结果后清除
+    if (data.type === 'partial') {
+      renderPartial(data.partial || '', data.audio_chunk_offset);
+      return;
+    }
+
+    // 语音段结束但没有最终结果（空文本、积压丢弃、录音暂停等）：清除该段的中间结果
+    if (data.type === 'partial_clear') {
+      clearPartial(data.audio_chunk_offset);
+      return;
+    }
+    
     // 处理录音相关消息
     if (data.recording_started) {
       console.log('[Recording] ========== 收到录音开始确认 ==========');
@@ -2283,6 +2322,7 @@ window.addEventListener('DOMContentLoaded', () => {
     }
     
     if (data.translated || data.data || data.info) {
+      if (data.type === 'final') renderPartial('');
       const original = (typeof data.data === 'string' && data.data.trim()) ? data.data
                       : (typeof data.info === 'string' ? data.info : '');
       const translated = data.translated || '';
@@ -10,12 +10,24 @@ import wave
 import os
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from audio_frame_client import CapturedFrame, FRAME_FLAG_RECORDING, SUPPORTED_CODECS, pack_frame  # 音频帧协议（与后端共用格式）
 
 SAMPLE_RATE = 16000  # 后端固定要求16kHz
 CHANNELS = 1         # 后端要求单声道
 BIT_DEPTH = 16       # 后端要求16-bit
 CHUNK_DURATION = 0.5 # 0.5秒块大小
 CHUNK_SIZE = int(SAMPLE_RATE * CHUNK_DURATION)  # 8000 samples
+MAX_QUEUE_CHUNKS = 20      # 发送队列上限（块数，约10秒），网络或后端跟不上时丢弃最旧的音频
+THROTTLED_QUEUE_CHUNKS = 4 # 后端通知过载（throttle）期间的发送队列上限，约2秒
+
+
+def with_query_param(url, key, value):
+    """在 WebSocket 地址上追加/覆盖查询参数"""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query[key] = value
+    return urlunsplit(parts._replace(query=urlencode(query)))
 
 # 录音配置 - 高音质设置
 RECORD_SAMPLE_RATE = 44100  # 高质量录音采样率
@@ -438,7 +450,7 @@ def auto_select_audio_device():
     sys.exit(1)
 
 class AudioStreamer:
-    def __init__(self, device_index, output_dir="recordings"):
+    def __init__(self, device_index, output_dir="recordings", codec="pcm"):
         self.device_index = device_index
         self.output_dir = output_dir
         self.ws = None
@@ -449,6 +461,17 @@ class AudioStreamer:
         self.switch_device_event = asyncio.Event()
         self.new_device_index = device_index
         self.device_list = []
+        self.throttled = False     # 后端是否处于过载状态
+        self.dropped_chunks = 0    # 发送队列溢出丢弃的音频块数
+        self.frame_seq = 0         # 音频帧序号
+        self.sample_index = 0      # 已采集的16kHz样本数（帧头中的采集时间基准）
+        self.codec = codec         # 帧负载编码
+        if self.codec == "flac":
+            try:
+                import soundfile  # noqa: F401
+            except ImportError:
+                print("⚠️ 未安装 soundfile，无法使用 FLAC 编码，改为发送 PCM")
+                self.codec = "pcm"
         self.ws_connected = False  # 新增：WebSocket连接状态
         self.current_samplerate = SAMPLE_RATE  # 当前使用的采样率
         self.target_samplerate = SAMPLE_RATE   # 目标采样率（固定16kHz）
@@ -474,6 +497,9 @@ class AudioStreamer:
             print("⚠️ 音频状态警告:", status)
         
         try:
+            # 本块开始时的录音进度（16kHz样本数），写入帧头
+            record_samples = int(self.record_audio_duration * SAMPLE_RATE) if self.recording else None
+
             # 调试信息：显示输入音频的基本信息
             max_amplitude = np.max(np.abs(indata))
             print(f"🎤 原始音频: shape={indata.shape}, max_amp={max_amplitude:.4f}", end=" ")
@@ -517,14 +543,14 @@ class AudioStreamer:
             # 第4步：转换为int16 PCM格式（后端期望的格式）
             audio_normalized = np.clip(audio_resampled, -1.0, 1.0)
             pcm_int16 = (audio_normalized * 32767).astype(np.int16)
-            pcm_bytes = pcm_int16.tobytes()
+            frame = self._capture_frame(pcm_int16, record_samples)
             
             final_amplitude = np.max(np.abs(audio_normalized))
-            print(f"最终: {len(pcm_bytes)}bytes, amp={final_amplitude:.4f}")
+            print(f"最终: {pcm_int16.nbytes}bytes, amp={final_amplitude:.4f}")
             
             # 第5步：发送到队列
             try:
-                self.loop.call_soon_threadsafe(self.audio_queue.put_nowait, pcm_bytes)
+                self.loop.call_soon_threadsafe(self._enqueue_audio, frame)
             except RuntimeError as e:
                 print(f"❌ 无法放入音频数据队列: {e}")
                 
@@ -720,6 +746,24 @@ class AudioStreamer:
             print(f"❌ 停止录音失败: {e}")
             return False, str(e)
 
+    def _capture_frame(self, pcm_int16, record_samples):
+        """音频回调中只记下帧头字段（序号、采集样本序号、录音进度）和 int16 样本；打包与 FLAC 编码在 send_audio 中进行"""
+        flags = FRAME_FLAG_RECORDING if self.recording and not self.recording_paused else 0
+        frame = CapturedFrame(self.frame_seq, self.sample_index, flags, record_samples, pcm_int16)
+        self.frame_seq = (self.frame_seq + 1) & 0xFFFFFFFF
+        self.sample_index += len(pcm_int16)
+        return frame
+
+    def _enqueue_audio(self, frame):
+        """在事件循环中放入发送队列；超过上限时丢弃最旧的块，保证字幕延迟有界"""
+        limit = THROTTLED_QUEUE_CHUNKS if self.throttled else MAX_QUEUE_CHUNKS
+        while self.audio_queue.qsize() >= limit:
+            self.audio_queue.get_nowait()
+            self.dropped_chunks += 1
+            if self.dropped_chunks % 10 == 1:
+                print(f"⚠️ 发送队列积压，丢弃最旧音频块 (累计 {self.dropped_chunks})")
+        self.audio_queue.put_nowait(frame)
+
     async def send_audio(self):
         print("🚀 send_audio() 协程启动 ✅")
         try:
@@ -730,7 +774,8 @@ class AudioStreamer:
                     continue
                 print("⌛ 等待队列音频数据...")
                 try:
-                    pcm_data = await self.audio_queue.get()
+                    frame = await self.audio_queue.get()
+                    pcm_data = pack_frame(frame, SAMPLE_RATE, CHANNELS, self.codec)
                     print(f"📤 取出音频数据，长度: {len(pcm_data)} bytes")
                     await self.ws.send(pcm_data)
                     print(f"📤 Sent audio chunk: {len(pcm_data)} bytes")
@@ -771,6 +816,12 @@ class AudioStreamer:
                             self.new_device_index = idx
                             self.switch_device_event.set()
                             continue
+                        # 后端过载/恢复通知：过载期间收紧发送队列
+                        if data.get('type') == 'throttle':
+                            self.throttled = bool(data.get('active'))
+                            state = "过载，收紧发送队列" if self.throttled else "已恢复"
+                            print(f"🚦 后端{state}: rtf={data.get('rtf')}, backlog={data.get('backlog_seconds')}s")
+                            continue
                         if 'get_device_list' in data:
                             await self.send_device_list()
                             continue
@@ -849,7 +900,9 @@ class AudioStreamer:
     async def run(self, ws_url):
         print("🧪 AudioStreamer.run() 已启动")
         self.loop = asyncio.get_running_loop()
-        self.audio_queue = asyncio.Queue()
+        if self.codec != "pcm":
+            ws_url = with_query_param(ws_url, "codec", self.codec)
+        self.audio_queue = asyncio.Queue(maxsize=MAX_QUEUE_CHUNKS)
 
         while self.running:
             try:
@@ -974,10 +1027,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="音频采集和WebSocket流传输，集成高音质录音功能")
     parser.add_argument('--uri', type=str, default="ws://127.0.0.1:27000/ws/upload", help='WebSocket服务器地址')
     parser.add_argument('--output', type=str, default="recordings", help='录音输出目录')
+    parser.add_argument('--codec', type=str, default="pcm", choices=SUPPORTED_CODECS,
+                       help='上传音频编码（flac 可减少约一半网络流量）')
     args = parser.parse_args()
 
     device_index = auto_select_audio_device()
-    streamer = AudioStreamer(device_index, args.output)
+    streamer = AudioStreamer(device_index, args.output, codec=args.codec)
 
     print(f"\n✅ 音频服务配置完成")
     print(f"   ASR设备: [{device_index}]")
@@ -0,0 +1,37 @@
+# python/audio_frame_client.py
+# 采集端的音频帧协议（与后端 a4s/audio_frame.py 保持一致）：帧头 + 负载（int16 PCM 或 FLAC）
+# audio_capture_websocket.py 与 enhanced_dual_audio_service.py 共用，修改时需与后端同步
+import io
+import struct
+from collections import namedtuple
+
+# magic | version | flags | channels | seq | sample_index | sample_rate | record_samples
+FRAME_HEADER = struct.Struct("<4sBBHIQII")
+FRAME_MAGIC = b"A4SF"
+FRAME_VERSION = 1
+FRAME_FLAG_RECORDING = 0x01   # 正在录音且未暂停
+FRAME_NO_RECORD = 0xFFFFFFFF  # 未在录音
+SUPPORTED_CODECS = ("pcm", "flac")  # 帧负载编码，连接时通过 ?codec= 告知后端
+
+# 音频回调中截取的一帧：序号和采集样本序号在采集时确定（发送队列丢弃旧块后，后端仍能据此发现缺口），
+# 打包和编码留到发送协程中，不占用实时音频回调
+CapturedFrame = namedtuple("CapturedFrame", "seq sample_index flags record_samples pcm")
+
+
+def encode_flac_chunk(pcm_int16, sample_rate):
+    """把一块 int16 样本编码为独立完整的 FLAC 数据（后端逐帧解码）"""
+    import soundfile as sf
+    buf = io.BytesIO()
+    sf.write(buf, pcm_int16, sample_rate, format="FLAC", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def pack_frame(frame, sample_rate, channels, codec="pcm"):
+    """按帧协议打包一帧：帧头携带序号、采集样本序号和录音进度，后端据此检测丢帧并精确对齐时间"""
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, frame.flags, channels, frame.seq, frame.sample_index,
+        sample_rate, FRAME_NO_RECORD if frame.record_samples is None else frame.record_samples,
+    )
+    if codec == "flac":
+        return header + encode_flac_chunk(frame.pcm, sample_rate)
+    return header + frame.pcm.tobytes()